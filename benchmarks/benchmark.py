@@ -0,0 +1,297 @@
+#!/usr/bin/python3
+# Copyright 2023 Francisco Pinto Santos
+# See LICENSE for details.
+# Author: Francisco Pinto Santos (@GandalFran on GitHub)
+
+"""Benchmark of each stage of the generation pipeline over synthetic DBML schemas.
+
+Each scenario (combination of the given numbers of tables, columns, references per table and rows per table) is run
+in its own process, timing the DBML parse, the configuration build, the directives build, the data generation and the
+formatting. The time, the rows per second and the peak RSS after each stage are written as JSON, with the startup
+time of the command line interface and of the import of the pipeline, so the runs can be compared over time (see
+--baseline).
+
+Usage: python benchmarks/benchmark.py --tables 10 100 --rows 1000 100000 --output results.json
+"""
+
+
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+COLUMN_TYPES = ['int', 'float', 'boolean', 'datetime', 'varchar']
+STAGES = ['parse', 'config', 'directives', 'generate', 'format']
+
+# code run in a new interpreter to measure the startup times
+STARTUP_COMMANDS = {
+    'cli_help': 'import sys; sys.argv = ["fakedatagen", "--help"]; from fake_db_datagen.cli import main; main()',
+    'import_pipeline': 'from fake_db_datagen import DataGenerationPiepline',
+}
+
+
+def build_dbml(num_tables: int, num_columns: int, fan_in: int, seed: int = 0
+               ) -> Tuple[str, Dict[str, List[str]]]:
+    """Builds a DBML with num_tables tables of num_columns columns (cycling through the column types), each one
+    referencing up to fan_in of the previous tables. Returns the DBML and the referencing columns of each table.
+    """
+
+    rng = random.Random(seed)
+    tables = []
+    references = {}
+
+    for i in range(num_tables):
+
+        table_name = f'table_{i}'
+        columns = ['  pk int [pk]'] + [f'  col_{j} {COLUMN_TYPES[j % len(COLUMN_TYPES)]}' for j in range(num_columns)]
+        references[table_name] = []
+
+        for referenced in sorted(rng.sample(range(i), min(fan_in, i))):
+            column_name = f'ref_{referenced}'
+            columns.append(f'  {column_name} int [ref: > table_{referenced}.pk]')
+            references[table_name].append(column_name)
+
+        tables.append(f'Table {table_name} {{\n' + '\n'.join(columns) + '\n}')
+
+    return '\n\n'.join(tables), references
+
+
+def build_config(references: Dict[str, List[str]], num_rows: int, seed: int = 0
+                 ) -> Dict[str, Any]:
+    """Builds a configuration generating num_rows rows for each table: all the types generate num_rows samples, and
+    the referencing columns sample num_rows rows of the referenced keys (instead of crossing them).
+    """
+
+    return {
+        'seed': seed,
+        'data_types': {
+            'base_types': {type_: {'samples': num_rows} for type_ in ['int', 'float', 'boolean', 'datetime']},
+            'generables': {'varchar': {'samples': num_rows}},
+        },
+        'schema': {
+            table: {column: {'sampling': {'rows': num_rows}} for column in columns}
+            for table, columns in references.items()
+        }
+    }
+
+
+def _peak_rss_mb() -> float:
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # bytes in macOS and kilobytes in the rest
+    return peak_rss / 1024 ** 2 if sys.platform == 'darwin' else peak_rss / 1024
+
+
+def _time(function: Callable[[], Any]
+          ) -> Tuple[Any, float]:
+
+    start = time.perf_counter()
+    result = function()
+
+    return result, time.perf_counter() - start
+
+
+def run_scenario(num_tables: int, num_columns: int, fan_in: int, num_rows: int, formatter_type: str
+                 ) -> Dict[str, Any]:
+    """Runs the pipeline stage by stage over a synthetic schema, returning the metrics of each stage.
+    """
+
+    from fake_db_datagen import logger
+    from fake_db_datagen.config_builder import ConfigBuilder
+    from fake_db_datagen.data_formatter import DataFormatter, FormatterType
+    from fake_db_datagen.default_config import serve_default_config
+    from fake_db_datagen.directive_builder import DirectiveBuilder
+    from fake_db_datagen.schema import Schema
+
+    logger.setLevel(logging.WARNING)
+
+    dbml, references = build_dbml(num_tables=num_tables, num_columns=num_columns, fan_in=fan_in)
+    user_config = build_config(references=references, num_rows=num_rows)
+    default_config = serve_default_config()
+
+    timings = {}
+
+    schema, timings['parse'] = _time(lambda: Schema.from_str(dbml))
+    parse_rss = _peak_rss_mb()
+
+    config, timings['config'] = _time(lambda: ConfigBuilder().build_config(schema=schema, user_config=user_config, default_config=default_config))
+    config_rss = _peak_rss_mb()
+
+    directives, timings['directives'] = _time(lambda: DirectiveBuilder().build(schema=schema, config=config, seed=user_config['seed']))
+    directives_rss = _peak_rss_mb()
+
+    _, timings['generate'] = _time(lambda: [directive.generate() for directive in directives])
+    generate_rss = _peak_rss_mb()
+
+    formatter = DataFormatter.from_type(formatter_type=FormatterType.from_str(formatter_type))
+    _, timings['format'] = _time(lambda: formatter.format_all(directives=directives))
+    format_rss = _peak_rss_mb()
+
+    total_rows = sum(len(next(iter(directive.fetch().values()))) for directive in directives)
+    peak_rss = dict(zip(STAGES, [parse_rss, config_rss, directives_rss, generate_rss, format_rss]))
+
+    return {
+        'rows': total_rows,
+        'stages': {
+            stage: {'seconds': timings[stage], 'rows_per_second': total_rows / timings[stage] if timings[stage] > 0 else None, 'peak_rss_mb': peak_rss[stage]}
+            for stage in STAGES
+        }
+    }
+
+
+def measure_startup(repeat: int = 5
+                    ) -> Dict[str, float]:
+    """Returns the fastest time of running each startup command in a new interpreter.
+    """
+
+    startup = {}
+
+    for name, code in STARTUP_COMMANDS.items():
+
+        times = []
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start)
+
+        startup[name] = min(times)
+
+    return startup
+
+
+def _run_scenario_in_process(parameters: Dict[str, Any]
+                             ) -> Dict[str, Any]:
+    """Runs the scenario in a new process, so the peak RSS is the one of the scenario.
+    """
+
+    with multiprocessing.get_context('spawn').Pool(processes=1) as pool:
+        return pool.apply(run_scenario, kwds=parameters)
+
+
+def _scenario_key(parameters: Dict[str, Any]) -> str:
+    return ','.join(f'{name}={value}' for name, value in sorted(parameters.items()))
+
+
+def _compare_time(label: str, seconds: float, baseline_seconds: float, max_slowdown: float = None
+                  ) -> bool:
+    """Prints the slowdown against the baseline, returning if it exceeds max_slowdown.
+    """
+
+    slowdown = seconds / baseline_seconds if baseline_seconds > 0 else float('inf')
+    regression = max_slowdown is not None and slowdown > max_slowdown
+
+    print(f'{label}: {baseline_seconds:.4f}s -> {seconds:.4f}s ({slowdown:.2f}x){"  <-- regression" if regression else ""}')
+
+    return regression
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], max_slowdown: float = None
+            ) -> bool:
+    """Prints the slowdown of the startup and of each stage against the baseline, returning if any exceeds
+    max_slowdown.
+    """
+
+    regression = False
+
+    for name, seconds in results['startup'].items():
+        if name in baseline.get('startup', {}):
+            regression |= _compare_time(label=f'startup {name}', seconds=seconds, baseline_seconds=baseline['startup'][name], max_slowdown=max_slowdown)
+
+    baseline_scenarios = {_scenario_key(scenario['parameters']): scenario for scenario in baseline['scenarios']}
+
+    for scenario in results['scenarios']:
+
+        key = _scenario_key(scenario['parameters'])
+        baseline_scenario = baseline_scenarios.get(key)
+
+        if baseline_scenario is None:
+            continue
+
+        for stage in STAGES:
+            regression |= _compare_time(
+                label=f'{key} {stage}', seconds=scenario['stages'][stage]['seconds'], baseline_seconds=baseline_scenario['stages'][stage]['seconds'], max_slowdown=max_slowdown
+            )
+
+    return regression
+
+
+def _package_version() -> str:
+
+    from fake_db_datagen.output_cache import _package_version
+
+    return _package_version()
+
+
+parser = argparse.ArgumentParser(description='Benchmarks each stage of the generation pipeline over synthetic DBML schemas.')
+parser.add_argument('--tables', nargs='+', default=[10, 50], type=int, help='Numbers of tables of the schemas.')
+parser.add_argument('--columns', nargs='+', default=[10], type=int, help='Numbers of columns of each table (besides the keys).')
+parser.add_argument('--fan-in', nargs='+', default=[2], dest='fan_in', type=int, help='Numbers of tables referenced by each table.')
+parser.add_argument('--rows', nargs='+', default=[1000, 10000], type=int, help='Numbers of rows of each table.')
+parser.add_argument('--format', nargs='+', default=['sql'], dest='formats', type=str, help='Formats of the output.')
+parser.add_argument('--repeat', default=1, type=int, help='Number of runs of each scenario, keeping the fastest time of each stage.')
+parser.add_argument('--output', default='benchmark.json', type=str, help='Path of the JSON file with the results.')
+parser.add_argument('--baseline', default=None, type=str, help='Path of the JSON results of a previous run, to compare against.')
+parser.add_argument('--max-slowdown', default=None, dest='max_slowdown', type=float, help='If given with a baseline, exits with an error if any stage is slower than the baseline by more than this factor.')
+
+
+def main():
+
+    args = parser.parse_args()
+
+    results = {
+        'metadata': {
+            'date': datetime.now().isoformat(), 'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(), 'version': _package_version()
+        },
+        'startup': measure_startup(repeat=max(args.repeat, 5)),
+        'scenarios': []
+    }
+
+    print(' '.join(f'{name}={seconds:.4f}s' for name, seconds in results['startup'].items()))
+
+    grid = itertools.product(args.tables, args.columns, args.fan_in, args.rows, args.formats)
+
+    for num_tables, num_columns, fan_in, num_rows, formatter_type in grid:
+
+        parameters = {'num_tables': num_tables, 'num_columns': num_columns, 'fan_in': fan_in, 'num_rows': num_rows, 'formatter_type': formatter_type}
+        runs = [_run_scenario_in_process(parameters) for _ in range(args.repeat)]
+
+        scenario = {
+            'parameters': parameters,
+            'rows': runs[0]['rows'],
+            'stages': {
+                stage: min((run['stages'][stage] for run in runs), key=lambda metrics: metrics['seconds'])
+                for stage in STAGES
+            }
+        }
+
+        print(_scenario_key(parameters) + ' ' + ' '.join(f'{stage}={scenario["stages"][stage]["seconds"]:.4f}s' for stage in STAGES))
+
+        results['scenarios'].append(scenario)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.baseline is not None:
+
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        if compare(results=results, baseline=baseline, max_slowdown=args.max_slowdown):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,22 @@
 # See LICENSE for details.
 # Author: Francisco Pinto Santos (@GandalFran on GitHub)
 
+from typing import Any
+
 from .log import serve_application_logger
 
 logger = serve_application_logger()
 
-from .data_generation_pipeline import (DataGenerationPiepline,
-                                       DataGenerationPipelineFromFiles)
+__all__ = ['DataGenerationPiepline', 'DataGenerationPipelineFromFiles']
+
+
+def __getattr__(name: str) -> Any:
+    """Imports the pipeline (and with it numpy and the generation modules) only when it is first used, so importing
+    the package (i.e. to run `fakedatagen --help`) is fast.
+    """
+
+    if name in __all__:
+        from . import data_generation_pipeline
+        return getattr(data_generation_pipeline, name)
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+# Copyright 2023 Francisco Pinto Santos
+# See LICENSE for details.
+# Author: Francisco Pinto Santos (@GandalFran on GitHub)
+
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import Any, Dict, List
+
+import numpy as np
+
+from . import logger
+from .directive_builder import GeneratorDirective
+from .schema import Schema
+
+
+class ArtifactStore:
+    """Persistent store of the generated data of each directive, so only the directives whose configuration, DBML
+    definition or upstream directives changed are generated again.
+
+    The data of each directive is stored in the work directory as a numpy file, keyed by a fingerprint of the
+    resolved configuration of the table, its DBML definition, its dependencies, its random streams and the
+    fingerprints of the directives it depends on. Only the last artifact of each table is kept.
+
+    Note: the object columns are stored pickled, so only work directories written by this tool must be used.
+    """
+
+    ARTIFACT_EXTENSION = '.npz'
+    NAMES_KEY = 'names'
+
+    def __init__(self, directory: str
+                 ) -> None:
+        self.directory = directory
+        self.fingerprints = {}
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _fingerprint(self, directive: GeneratorDirective, table_config: Dict[str, Any], table_definition: str
+                     ) -> str:
+
+        dependencies = {
+            field: [dependency.referenced_directive.name, dependency.referenced_field, self.fingerprints.get(dependency.referenced_directive.name)]
+            for field, dependency in directive.dependencies.items()
+        }
+
+        seed_sequences = {
+            field: [generator.seed_sequence.entropy, list(generator.seed_sequence.spawn_key)]
+            for field, generator in directive.generators.items() if generator.seeded
+        }
+
+        content = json.dumps({
+            'config': table_config, 'definition': table_definition, 'dependencies': dependencies, 'seed_sequences': seed_sequences
+        }, sort_keys=True, default=str)
+
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def fingerprint_directives(self, directives: List[GeneratorDirective], schema: Schema, config: Dict[str, Any]
+                               ) -> None:
+        """Calculates the fingerprint of each directive, after the ones of the directives it depends on.
+        """
+
+        tables_definitions = {table.name: table.definition for table in schema.tables}
+
+        def _fingerprint_directive(directive):
+
+            if directive.name in self.fingerprints:
+                return
+
+            for dependency in directive.dependencies.values():
+                if dependency.referenced_directive is not directive:
+                    _fingerprint_directive(dependency.referenced_directive)
+
+            self.fingerprints[directive.name] = self._fingerprint(
+                directive=directive, table_config=config.get(directive.name), table_definition=tables_definitions.get(directive.name)
+            )
+
+        self.fingerprints = {}
+
+        for directive in directives:
+            _fingerprint_directive(directive)
+
+    def _table_prefix(self, table: str) -> str:
+        return re.sub(r'[^\w.-]', '_', table) + '-'
+
+    def _artifact_path(self, directive: GeneratorDirective) -> str:
+
+        fingerprint = self.fingerprints.get(directive.name)
+
+        if fingerprint is None:
+            raise ValueError(f'The directive {directive.name} has no fingerprint. Please calculate the fingerprints of the directives with ArtifactStore.fingerprint_directives.')
+
+        return os.path.join(self.directory, self._table_prefix(directive.name) + fingerprint + self.ARTIFACT_EXTENSION)
+
+    def load(self, directive: GeneratorDirective) -> bool:
+        """Loads the stored data of the directive into it, returning if it was stored.
+        """
+
+        path = self._artifact_path(directive)
+
+        if not os.path.exists(path):
+            logger.debug(f'no artifact found for directive {directive.name}')
+            return False
+
+        with np.load(path, allow_pickle=True) as artifact:
+            names = artifact[self.NAMES_KEY].tolist()
+            data = {name: artifact[f'arr_{i}'] for i, name in enumerate(names)}
+
+        logger.info(f'reloaded unchanged directive {directive.name}')
+
+        directive.load_data(data)
+
+        return True
+
+    def save(self, directive: GeneratorDirective) -> None:
+        """Stores the generated data of the directive, removing the previous artifacts of its table.
+        """
+
+        path = self._artifact_path(directive)
+        data = directive.fetch()
+
+        fd, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, *data.values(), **{self.NAMES_KEY: np.array(list(data.keys()), dtype=str)})
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+        logger.debug(f'stored artifact of directive {directive.name}')
+
+        # remove the outdated artifacts of the table
+
+        prefix = self._table_prefix(directive.name)
+        pattern = re.compile(re.escape(prefix) + r'[0-9a-f]{64}' + re.escape(self.ARTIFACT_EXTENSION))
+
+        for file_name in os.listdir(self.directory):
+            if pattern.fullmatch(file_name) and os.path.join(self.directory, file_name) != path:
+                os.remove(os.path.join(self.directory, file_name))
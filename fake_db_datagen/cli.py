@@ -5,33 +5,129 @@
 
 
 import argparse
+import contextlib
+import sys
 
-from .data_generation_pipeline import DataGenerationPipelineFromFiles
+from . import logger
 
 # build argument parser
-parser = argparse.ArgumentParser()
+parser = argparse.ArgumentParser(epilog='Run `fakedatagen serve --help` to see the options of the generation server.')
 parser.add_argument('-d', '--dbml-file', required=True, dest='dbml', type=str, help='Path to the file containing the DBML.')
 parser.add_argument('-c', '--config-file', required=True, dest='config', type=str, help='Path to the file containing the data generation configuration.')
 parser.add_argument('-o', '--output-file', required=False, default='output.sql', dest='output_file', type=str, help='Path file containing the output.')
-parser.add_argument('-f', '--format-type', required=False, default='SQL', dest='format_type', type=str, help='Formatting type, being suitable: SQL.')
+parser.add_argument('-f', '--format-type', required=False, default='SQL', dest='format_type', type=str, help='Formatting type, being suitable: SQL, COPY (PostgreSQL COPY text format) and COPY_BINARY (PostgreSQL COPY binary format), CSV, TSV, PARQUET and ARROW (Arrow IPC file format). The COPY_BINARY, CSV, TSV, PARQUET and ARROW formats are written as a file for each table into the output path, used as a directory.')
+parser.add_argument('-b', '--batch-size', required=False, default=None, dest='batch_size', type=int, help='If given, the data is generated and written in batches of this number of rows instead of all at once (not in parallel, so it can not be given with more than one worker).')
+parser.add_argument('-r', '--rows-per-insert', required=False, default=1000, dest='rows_per_insert', type=int, help='Maximum number of rows of each SQL INSERT statement.')
+parser.add_argument('-w', '--workers', required=False, default=None, dest='workers', type=int, help='Number of processes used to generate the independent tables in parallel.')
+parser.add_argument('-s', '--shard-size', required=False, default=None, dest='shard_size', type=int, help='When generating in parallel, the tables with more rows than this are generated in shards of this size (so it requires more than one worker).')
+parser.add_argument('--seed', required=False, default=None, dest='seed', type=int, help='Seed of the generation, so the same data is generated in each run. It takes precedence over the seed of the configuration file.')
+parser.add_argument('--cache-dir', required=False, default=None, dest='cache_dir', type=str, help='If given, the outputs of the seeded generations are cached in this directory, and reused when generating again with the same DBML, configuration, seed and format.')
+parser.add_argument('--cache-max-size', required=False, default=1024, dest='cache_max_size', type=int, help='Maximum size in megabytes of the cache, removing the least recently used outputs when exceeded.')
+parser.add_argument('--work-dir', required=False, default=None, dest='work_dir', type=str, help='If given, the generated data of each table is stored in this directory, and reused in the next generations if neither the table nor the tables it depends on changed.')
+parser.add_argument('--schema-cache-dir', required=False, default=None, dest='schema_cache_dir', type=str, help='If given, the parsed DBML is stored in this directory, and reused in the next generations with the same DBML instead of parsing it again.')
+parser.add_argument('--stats-json', required=False, default=None, dest='stats_json', type=str, help='If given, the metrics of the generation (wall time, CPU time, rows and peak memory of each stage, table and field) are written into this JSON file.')
+parser.add_argument('--profile', required=False, default=False, dest='profile', action='store_true', help='Profiles the generation, writing a report of the time of each component (generators, formatters and libraries) into the standard error. Only the main process is profiled, so the generation in the worker processes is not.')
+parser.add_argument('--profile-output', required=False, default='profile.pstats', dest='profile_output', type=str, help='Path of the pstats file with the profile of the generation, when profiling.')
+
+# build argument parser of the serve command
+serve_parser = argparse.ArgumentParser(prog='fakedatagen serve', description='Serves the generation through HTTP, keeping the parsed schemas warm among the requests.')
+serve_parser.add_argument('--host', required=False, default='127.0.0.1', dest='host', type=str, help='Host to listen in.')
+serve_parser.add_argument('--port', required=False, default=8080, dest='port', type=int, help='Port to listen in.')
+serve_parser.add_argument('--unix-socket', required=False, default=None, dest='unix_socket', type=str, help='If given, the server listens in this unix socket instead of in the host and port.')
+serve_parser.add_argument('-w', '--workers', required=False, default=4, dest='workers', type=int, help='Number of requests handled at once.')
+serve_parser.add_argument('-c', '--config-file', required=False, default=None, dest='config', type=str, help='Path to the file containing the data generation configuration, overridden by the configuration of each request.')
+serve_parser.add_argument('-b', '--batch-size', required=False, default=10000, dest='batch_size', type=int, help='Number of rows of the batches the output is generated and streamed in, if not given in the request.')
+serve_parser.add_argument('--schema-cache-dir', required=False, default=None, dest='schema_cache_dir', type=str, help='If given, the parsed DBMLs are stored in this directory, and reused after restarting the server.')
+
+
+def serve():
+
+    # retrieve args
+    args = serve_parser.parse_args(sys.argv[2:])
+
+    from .data_generation_pipeline import DataGenerationPipelineFromFiles
+    from .schema import SchemaCache
+    from .server import GenerationServer
+
+    config = DataGenerationPipelineFromFiles()._build_config_handler(file_path=args.config) if args.config is not None else None
+
+    server = GenerationServer(config=config, schema_cache=SchemaCache(directory=args.schema_cache_dir), batch_size=args.batch_size)
+    server.serve(host=args.host, port=args.port, unix_socket=args.unix_socket, workers=args.workers)
 
 
 def main():
 
+    # the generation server has its own command
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        serve()
+        return
+
     # retrieve args
     args = parser.parse_args()
 
+    # reject the options which would be ignored
+    parallel = args.workers is not None and args.workers > 1
+
+    if args.batch_size is not None and parallel:
+        parser.error('the generation in batches is not parallel, so --batch-size can not be given with more than one worker')
+
+    if args.batch_size is not None and args.work_dir is not None:
+        parser.error('the data generated in batches is not kept, so --batch-size can not be given with --work-dir')
+
+    if args.shard_size is not None and not parallel:
+        parser.error('the tables are only split into shards when generating in parallel, so --shard-size requires more than one worker')
+
+    # the pipeline is imported once the arguments are parsed, so the help is shown without importing it
+    from .artifact_store import ArtifactStore
+    from .data_formatter import DataFormatter, FormatterType
+    from .data_generation_pipeline import DataGenerationPipelineFromFiles
+    from .output_cache import OutputCache
+    from .profiler import GenerationProfiler
+    from .schema import SchemaCache
+
     # parse
     dbml_file_path = args.dbml
     config_file_path = args.config
     output_file_path = args.output_file
     format_type = args.format_type
+    batch_size = args.batch_size
+    workers = args.workers
+    shard_size = args.shard_size
+    seed = args.seed
+    formatter_config = {'rows_per_insert': args.rows_per_insert}
+    cache = OutputCache(directory=args.cache_dir, max_size=args.cache_max_size * 1024 ** 2) if args.cache_dir is not None else None
+    artifact_store = ArtifactStore(directory=args.work_dir) if args.work_dir is not None else None
+    schema_cache = SchemaCache(directory=args.schema_cache_dir)
+
+    # generate data, writting it as it is formatted
+    generator = DataGenerationPipelineFromFiles(cache=cache, artifact_store=artifact_store, schema_cache=schema_cache)
+
+    # some formats are written as a file for each table into the output directory
+    formatter_type = FormatterType.from_str(format_type)
+
+    # profile the generation if requested
+    profiler = GenerationProfiler() if args.profile else None
+
+    if profiler is not None and workers is not None and workers > 1:
+        logger.warning('the generation in the worker processes is not profiled')
+
+    with profiler.profiling() if profiler is not None else contextlib.nullcontext():
+
+        if formatter_type is not None and DataFormatter.from_type(formatter_type=formatter_type, config=formatter_config).FILE_PER_DIRECTIVE:
+            generator.generate_to_directory(
+                directory=output_file_path, dbml_file_path=dbml_file_path, config_file_path=config_file_path, formatter_type=format_type, batch_size=batch_size, formatter_config=formatter_config, workers=workers, shard_size=shard_size, seed=seed
+            )
+        else:
+            with open(output_file_path, 'w') as f:
+                generator.generate_to(
+                    fp=f, dbml_file_path=dbml_file_path, config_file_path=config_file_path, formatter_type=format_type, batch_size=batch_size, formatter_config=formatter_config, workers=workers, shard_size=shard_size, seed=seed
+                )
 
-    # generate data
-    generator = DataGenerationPipelineFromFiles()
-    generated_data = generator.generate(
-        dbml_file_path=dbml_file_path, config_file_path=config_file_path, formatter_type=format_type
-    )
+    if profiler is not None:
+        profiler.dump(args.profile_output)
+        sys.stderr.write(profiler.report())
 
-    with open(output_file_path, 'w') as f:
-        f.write(generated_data)
+    # write the metrics of the generation
+    if args.stats_json is not None:
+        with open(args.stats_json, 'w') as f:
+            f.write(generator.metrics.to_json())
@@ -4,14 +4,17 @@
 # Author: Francisco Pinto Santos (@GandalFran on GitHub)
 
 
+import copy
+import json
 import re
-from typing import Any, Dict, List, Optional
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 
-from pydbml import PyDBML
 
 from . import logger
 from .data_types_generator import DataType
 from .distribution import DistributionType
+from .schema import Schema
 
 
 class ConfigurationError(ValueError):
@@ -33,15 +36,103 @@ class ConfigurationError(ValueError):
         return ConfigurationError(config_path=config_path, error=self.error)
 
 
+class TypeMatcher:
+    """Index of type configurations for looking the suitable type of the fields: the type with more priority whose
+    pattern matches the name or the type of the field, or whose name is the name or the type of the field.
+
+    The patterns are sorted and compiled once, the exact names are looked up in a dictionary (so only the patterns
+    with more priority are checked), and the results are memoized for each field name and type.
+    """
+
+    # matchers already built by their type configurations, so they (and their memoized results) are reused
+    MAX_CACHED_MATCHERS = 64
+    _matchers = {}
+    _matchers_lock = threading.Lock()
+
+    def __init__(self, type_configs: Dict[str, Dict[str, Any]]
+                 ) -> None:
+
+        # sort by priority (bigger value = more priority)
+
+        def _fetch_priority(t):
+            return t[1].get('priority') if t[1].get('priority') is not None else 0
+
+        sorted_type_configs = sorted(type_configs.items(), key=_fetch_priority, reverse=True)
+
+        self.types = [type_ for type_, _ in sorted_type_configs]
+        self.positions = {type_: position for position, type_ in enumerate(self.types)}
+        self.patterns = [re.compile(type_config.get('pattern')) for _, type_config in sorted_type_configs]
+        self._matches = {}
+
+    @classmethod
+    def build(cls, type_configs: Dict[str, Dict[str, Any]]
+              ) -> 'TypeMatcher':
+        """Factory method returning the matcher of the type configurations, only building it if it was not built
+        before for the same configurations.
+        """
+
+        key = json.dumps(type_configs, sort_keys=True, default=str)
+
+        with cls._matchers_lock:
+
+            matcher = cls._matchers.get(key)
+
+            if matcher is None:
+
+                # remove the oldest matcher
+                if len(cls._matchers) >= cls.MAX_CACHED_MATCHERS:
+                    cls._matchers.pop(next(iter(cls._matchers)))
+
+                matcher = cls._matchers[key] = cls(type_configs)
+
+        return matcher
+
+    def _first_matching_position(self, value: str, max_position: int
+                                 ) -> int:
+        """Returns the position of the first pattern matching the value, or max_position if there is no one before.
+        """
+
+        for position in range(max_position):
+            if self.patterns[position].match(value):
+                return position
+
+        return max_position
+
+    def match(self, field_name: str, field_type: str
+              ) -> Optional[str]:
+
+        key = (field_name, field_type)
+
+        if key in self._matches:
+            return self._matches[key]
+
+        # the exact names are looked up directly, and the patterns only before them
+
+        values = [value for value in (field_name, field_type) if value is not None]
+        position = min([self.positions.get(value, len(self.types)) for value in values], default=len(self.types))
+
+        for value in values:
+            position = self._first_matching_position(value, max_position=position)
+
+        matching_type = self.types[position] if position < len(self.types) else None
+        self._matches[key] = matching_type
+
+        return matching_type
+
+
 class ConfigBuilder:
 
+    def __init__(self) -> None:
+        self._type_matchers = None
+
     def __merge_dicts(self, default: Dict[str, Any], user: Dict[str, Any]
                       ) -> Dict[str, Any]:
-        """Merges two dictionaries, replacing values of the default if not present in user.
+        """Merges two dictionaries, replacing values of the default if not present in user. The values are copied, so
+        the merged dictionary can be modified without modifying the given ones.
         """
 
         new_dict = {}
-        keywords = list(set(list(default.keys()) + list(user.keys())))
+        keywords = list(dict.fromkeys(list(default.keys()) + list(user.keys())))
 
         for k in keywords:
 
@@ -49,14 +140,14 @@ class ConfigBuilder:
             default_value = default.get(k)
 
             if default_value is None:
-                current_value = user_value
+                current_value = copy.deepcopy(user_value)
             elif user_value is None:
-                current_value = default_value
+                current_value = copy.deepcopy(default_value)
             elif default_value is None and user_value is None:
                 current_value = None
             else:
                 if not isinstance(user_value, dict):
-                    current_value = user_value
+                    current_value = copy.deepcopy(user_value)
                 else:
                     current_value = self.__merge_dicts(
                         default=default_value, user=user_value
@@ -66,7 +157,16 @@ class ConfigBuilder:
 
         return new_dict
 
-    def _build_collections_from_enums(self, config: Dict[str, str], dbml: PyDBML
+    def merge_config(self, user_config: Dict[str, Any], default_config: Dict[str, Any]
+                     ) -> Dict[str, Any]:
+        """Merges the user configuration into the default one, without checking or populating it.
+        """
+
+        return self.__merge_dicts(
+            default=default_config, user=user_config
+        )
+
+    def _build_collections_from_enums(self, config: Dict[str, str], schema: Schema
                                       ) -> None:
 
         # retrieve collections
@@ -85,10 +185,10 @@ class ConfigBuilder:
 
         # build collections
 
-        for dbml_enum in dbml.enums:
+        for dbml_enum in schema.enums:
 
             collection_name = dbml_enum.name
-            collection_values = [item.name for item in dbml_enum.items]
+            collection_values = list(dbml_enum.values)
 
             logger.debug(f'adding collection {collection_name} with {len(collection_values)} values.')
 
@@ -98,32 +198,31 @@ class ConfigBuilder:
 
             config['data_types']['collections'][collection_name] = collection_obj
 
-    def __look_for_suitable_type(self, field_name: str, field_type: str, type_configs: Dict[str, str]
-                                 ) -> Optional[str]:
-
-        # sort by priority (bigger value = more priority)
-
-        def _fetch_priority(t):
-            return t[1].get('priority') if t[1].get('priority') is not None else 0
-
-        type_configs = sorted(type_configs.items(), key=_fetch_priority, reverse=True)
+    def __fetch_type_matchers(self, data_types: Dict[str, Any]
+                              ) -> Tuple[TypeMatcher, TypeMatcher, TypeMatcher]:
+        """Returns the type matchers for the collections, the generables and both of them, built once per
+        configuration.
+        """
 
-        # find type
+        if self._type_matchers is None:
 
-        for type_, type_config in type_configs:
+            logger.debug('building type matchers')
 
-            pattern = type_config.get('pattern')
-            compiled_pattern = re.compile(pattern)
+            collection_types_config = data_types.get('collections')
+            generable_types_config = data_types.get('generables')
 
-            # logger.debug(f'looking type suitable for field {field_name} of type {field_type}: checking type {type_} with pattern {pattern}')
+            self._type_matchers = (
+                TypeMatcher.build(collection_types_config), TypeMatcher.build(generable_types_config), TypeMatcher.build({**collection_types_config, **generable_types_config})
+            )
 
-            if field_name is not None and (compiled_pattern.match(field_name) or field_name == type_):
-                return type_
+        return self._type_matchers
 
-            if field_type is not None and (compiled_pattern.match(field_type) or field_type == type_):
-                return type_
+    def __look_for_suitable_type(self, field_name: str, field_type: str, type_matcher: TypeMatcher
+                                 ) -> Optional[str]:
 
-        return None
+        return type_matcher.match(
+            field_name=field_name, field_type=field_type
+        )
 
     def __check_base_type_consistency(self, type_config: Dict[str, Any], type_: str = None, samples_optional: bool = False) -> None:
 
@@ -267,7 +366,58 @@ class ConfigBuilder:
         if priority is None:
             logger.debug('No priority specified.')
 
-    def __check_field_consistency(self, field_name: str, field_configuration: Dict[str, Any], collection_types_config: Dict[str, Dict[str, Any]], generable_types_config: Dict[str, Dict[str, Any]]) -> None:
+    def __check_sampling_consistency(self, sampling: Dict[str, Any]
+                                     ) -> None:
+
+        if not isinstance(sampling, dict):
+            raise ConfigurationError(config_path=['sampling'], error='The sampling must be an object.')
+
+        # check fan out
+
+        fan_out = sampling.get('fan_out')
+
+        if fan_out is None:
+            logger.debug('No fan out specified.')
+        elif not isinstance(fan_out, (int, float)) or isinstance(fan_out, bool) or fan_out <= 0:
+            raise ConfigurationError(config_path=['sampling', 'fan_out'], error=f'The fan out must be a positive number, but {fan_out} was given.')
+
+        # check rows
+
+        rows = sampling.get('rows')
+
+        if rows is None:
+            logger.debug('No rows specified.')
+        elif not isinstance(rows, int) or isinstance(rows, bool) or rows < 0:
+            raise ConfigurationError(config_path=['sampling', 'rows'], error=f'The rows must be a non negative integer, but {rows} was given.')
+
+        # check distribution
+
+        distribution = sampling.get('distribution')
+
+        if distribution is None:
+            logger.debug('No distribution specified.')
+        else:
+
+            distribution_type = distribution.get('type')
+            formatted_distribution_type = DistributionType.from_str(distribution_type)
+
+            if distribution_type is None or formatted_distribution_type is None:
+                raise ConfigurationError(config_path=['sampling', 'distribution'], error=f'Providen unknown distribution {distribution_type}.')
+
+    def __check_field_consistency(self, field_name: str, field_configuration: Dict[str, Any], collection_matcher: TypeMatcher, generable_matcher: TypeMatcher) -> None:
+
+        # check sampling (only for referencing fields, so the type is not needed)
+
+        sampling = field_configuration.get('sampling')
+
+        if sampling is not None:
+
+            self.__check_sampling_consistency(
+                sampling=sampling
+            )
+
+            if field_configuration.get('type') is None:
+                return
 
         # retrieve type
         type_ = field_configuration.get('type')
@@ -294,7 +444,7 @@ class ConfigBuilder:
             )
         else:
             matching_collection = self.__look_for_suitable_type(
-                field_name=field_name, field_type=type_, type_configs=collection_types_config
+                field_name=field_name, field_type=type_, type_matcher=collection_matcher
             )
 
             if matching_collection is not None:
@@ -302,7 +452,7 @@ class ConfigBuilder:
                 return
 
             matching_generable = self.__look_for_suitable_type(
-                field_name=field_name, field_type=type_, type_configs=generable_types_config
+                field_name=field_name, field_type=type_, type_matcher=generable_matcher
             )
 
             if matching_generable is not None:
@@ -312,11 +462,18 @@ class ConfigBuilder:
             if matching_collection is None and matching_generable is None:
                 raise ConfigurationError(error=f'The given type {type_} is not in the recognized into available types.')
 
-    def _check_config_consistency(self, config: Dict[str, Any], dbml: PyDBML
+    def _check_config_consistency(self, config: Dict[str, Any], schema: Schema
                                   ) -> None:
         """Checks the consistency of the configuration
         """
 
+        # check the seed, if any
+
+        seed = config.get('seed')
+
+        if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+            raise ConfigurationError(config_path=['seed'], error=f'The seed must be a non negative integer, but {seed} was given.')
+
         # check that data_types is in configuration
 
         data_types = config.get('data_types')
@@ -391,7 +548,9 @@ class ConfigBuilder:
         logger.debug('checking tables configuration')
 
         tables = config.get('schema')
-        tables_and_columns = {table.name: [column.name for column in table.columns] for table in dbml.tables}
+        tables_and_columns = {table.name: [column.name for column in table.columns] for table in schema.tables}
+        referencing_columns = {(reference.referencing_table, column) for reference in schema.references for column in reference.referencing_columns}
+        collection_matcher, generable_matcher, _ = self.__fetch_type_matchers(data_types)
 
         if not tables:
             logger.debug('checking tables configuration: no tables configuration providen by user')
@@ -417,11 +576,16 @@ class ConfigBuilder:
                 if field not in tables_and_columns[table]:
                     raise ConfigurationError(config_path=['schema', table, field], error=f'The table {table} has not the field {field} registered in the DBML schema.')
 
+                # only the referencing fields are sampled
+
+                if field_configuration.get('sampling') is not None and (table, field) not in referencing_columns:
+                    raise ConfigurationError(config_path=['schema', table, field, 'sampling'], error=f'The field {table}.{field} does not reference other table, so it can not be sampled.')
+
                 # check field configuration
 
                 try:
                     self.__check_field_consistency(
-                        field_name=field, field_configuration=field_configuration, collection_types_config=collection_types_config, generable_types_config=generable_types_config
+                        field_name=field, field_configuration=field_configuration, collection_matcher=collection_matcher, generable_matcher=generable_matcher
                     )
                 except ConfigurationError as e:
                     raise e.build_from_inner(previous_path=['schema', table, field])
@@ -490,7 +654,9 @@ class ConfigBuilder:
 
         return field_config
 
-    def __build_field_config(self, field_type: str, field_name: str, current_field_config: Dict[str, Any], base_types_config: Dict[str, Any], collection_types_config: Dict[str, Any], generable_types_config: Dict[str, Any]) -> Dict[str, str]:
+    def __build_field_config(self, field_type: str, field_name: str, current_field_config: Dict[str, Any], base_types_config: Dict[str, Any], collection_types_config: Dict[str, Any], generable_types_config: Dict[str, Any], type_matchers: Tuple[TypeMatcher, TypeMatcher, TypeMatcher]) -> Dict[str, str]:
+
+        collection_matcher, generable_matcher, types_matcher = type_matchers
 
         # fetch user type configuration
 
@@ -499,7 +665,7 @@ class ConfigBuilder:
         # look for suitable tyupes
 
         matching_type = self.__look_for_suitable_type(
-            field_name=field_name, field_type=field_type, type_configs={**collection_types_config, **generable_types_config}
+            field_name=field_name, field_type=field_type, type_matcher=types_matcher
         )
 
         # select type with the three posibilities
@@ -547,7 +713,7 @@ class ConfigBuilder:
             logger.debug(f'set field {field_name} (type {field_type}) as unknown. Looking for matching collections and generables.')
 
             matching_collection = self.__look_for_suitable_type(
-                field_name=field_name, field_type=field_type, type_configs=collection_types_config
+                field_name=field_name, field_type=field_type, type_matcher=collection_matcher
             )
 
             if matching_collection is not None:
@@ -563,7 +729,7 @@ class ConfigBuilder:
             else:
 
                 matching_generable = self.__look_for_suitable_type(
-                    field_name=field_name, field_type=field_type, type_configs=generable_types_config
+                    field_name=field_name, field_type=field_type, type_matcher=generable_matcher
                 )
 
                 if matching_generable is not None:
@@ -583,12 +749,13 @@ class ConfigBuilder:
 
                     raise ValueError(f'Unable to find suitable type for field {field_name}. Please, check the configuration and set a suitable configuration, collection or generable information to continue with generation.')
 
-        # add name
+        # add name and sampling of the referenced values
         field_config['name'] = field_name
+        field_config['sampling'] = current_field_config.get('sampling') if current_field_config is not None else None
 
         return field_config
 
-    def _populate_config(self, config: Dict[str, Any], dbml: PyDBML
+    def _populate_config(self, config: Dict[str, Any], schema: Schema
                          ) -> None:
 
         tables_config = config.get('schema')
@@ -596,10 +763,11 @@ class ConfigBuilder:
         base_types_config = data_types_config.get('base_types')
         collection_types_config = data_types_config.get('collections')
         generable_types_config = data_types_config.get('generables')
+        type_matchers = self.__fetch_type_matchers(data_types_config)
 
         final_config = {}
 
-        for table in dbml.tables:
+        for table in schema.tables:
 
             # set initial values
             table_name = table.name
@@ -619,14 +787,11 @@ class ConfigBuilder:
 
                 # logger.debug(f'processing field {table_name}.{field_name}')
 
-                # format type
-                field_type = field_type.name if not isinstance(field_type, str) else field_type
-
                 # get config
                 current_field_config = user_table_config.get(field_name) if user_table_config is not None else None
 
                 field_config = self.__build_field_config(
-                    field_type=field_type, field_name=field_name, current_field_config=current_field_config, base_types_config=base_types_config, collection_types_config=collection_types_config, generable_types_config=generable_types_config
+                    field_type=field_type, field_name=field_name, current_field_config=current_field_config, base_types_config=base_types_config, collection_types_config=collection_types_config, generable_types_config=generable_types_config, type_matchers=type_matchers
                 )
 
                 # aggretate result to table config
@@ -637,31 +802,34 @@ class ConfigBuilder:
 
         return final_config
 
-    def build_config(self, dbml: PyDBML, user_config: Dict[str, Any], default_config: Dict[str, Any]
+    def build_config(self, schema: Schema, user_config: Dict[str, Any], default_config: Dict[str, Any]
                      ) -> Dict[str, Any]:
 
+        # the type matchers are built for each configuration
+        self._type_matchers = None
+
         # build merged config
         logger.debug('mering user and default config')
-        merged_config = self.__merge_dicts(
-            default=default_config, user=user_config
+        merged_config = self.merge_config(
+            user_config=user_config, default_config=default_config
         )
 
         # add dbml enumerations as collections
         logger.debug('add DBML enumerations as collection types')
         self._build_collections_from_enums(
-            config=merged_config, dbml=dbml
+            config=merged_config, schema=schema
         )
 
         # check configuration consistency
         logger.debug('checking generated configuration consistency')
         self._check_config_consistency(
-            config=merged_config, dbml=dbml
+            config=merged_config, schema=schema
         )
 
         # populate configuration object with all tables and columns
         logger.debug('performing configuration object population with config and DBML')
         populated_config = self._populate_config(
-            config=merged_config, dbml=dbml
+            config=merged_config, schema=schema
         )
 
         return populated_config
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+# Copyright 2023 Francisco Pinto Santos
+# See LICENSE for details.
+# Author: Francisco Pinto Santos (@GandalFran on GitHub)
+
+
+from typing import Dict, Iterable, List
+
+
+class CycleError(Exception):
+    """Raised when the dependencies of the graph have a cycle, keeping the nodes of the cycle (the first node is
+    repeated at the end).
+    """
+
+    def __init__(self, cycle: List[str]
+                 ) -> None:
+        self.cycle = cycle
+        super().__init__(f'Generation Error: There is a cycle in the dependencies of the tables: {" -> ".join(cycle)}.')
+
+
+class DependencyGraph:
+    """Directed acyclic graph of the dependencies among nodes, sorted with Kahn's algorithm in O(V+E).
+
+    The nodes are sorted in levels: the nodes without dependencies are in level 0, and the rest are in the level
+    following the deepest of the nodes they depend on, so the nodes in the same level are independent among them.
+    """
+
+    def __init__(self, dependencies: Dict[str, Iterable[str]]
+                 ) -> None:
+        """Builds the graph from the nodes it depends on of each node (the nodes only found as dependencies are
+        added too).
+        """
+
+        self.dependencies = {node: list(dict.fromkeys(node_dependencies)) for node, node_dependencies in dependencies.items()}
+
+        for node_dependencies in list(self.dependencies.values()):
+            for dependency in node_dependencies:
+                self.dependencies.setdefault(dependency, [])
+
+    def _find_cycle(self, pending: Dict[str, int]) -> List[str]:
+        """Returns a cycle among the nodes not sorted by Kahn's algorithm: each of them depends at least on another one
+        of them, so following those dependencies a node is eventually repeated.
+        """
+
+        node = next(node for node, count in pending.items() if count > 0)
+        path = {}
+
+        while node not in path:
+            path[node] = len(path)
+            node = next(dependency for dependency in self.dependencies[node] if pending[dependency] > 0)
+
+        return list(path)[path[node]:] + [node]
+
+    def levels(self) -> List[List[str]]:
+        """Returns the nodes grouped by level, raising a `CycleError` if there is a cycle.
+        """
+
+        dependants = {node: [] for node in self.dependencies}
+        pending = {}
+
+        for node, node_dependencies in self.dependencies.items():
+
+            pending[node] = len(node_dependencies)
+
+            for dependency in node_dependencies:
+                dependants[dependency].append(node)
+
+        levels = []
+        level = [node for node, count in pending.items() if count == 0]
+
+        while level:
+
+            levels.append(level)
+            next_level = []
+
+            for node in level:
+                for dependant in dependants[node]:
+
+                    pending[dependant] -= 1
+
+                    if pending[dependant] == 0:
+                        next_level.append(dependant)
+
+            level = next_level
+
+        if sum(len(level) for level in levels) != len(self.dependencies):
+            raise CycleError(cycle=self._find_cycle(pending))
+
+        return levels
+
+    def sequence(self) -> List[str]:
+        """Returns the nodes sorted so each node is after the nodes it depends on.
+        """
+
+        return [node for level in self.levels() for node in level]
@@ -5,31 +5,96 @@
 
 
 import enum
+import os
+import re
 from datetime import datetime
-from typing import Any, List
+from typing import IO, Any, Dict, Iterator, List, Tuple
+
+import numpy as np
 
 from .directive_builder import GeneratorDirective
 
 
+def _import_pyarrow() -> Any:
+    """Imports pyarrow, only needed by the columnar formats.
+    """
+
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception('The parquet and arrow formats need the pyarrow package. Please install it with `python -m pip install fake_db_datagen[arrow]`.')
+
+    return pyarrow
+
+
 class FormatterType(enum.Enum):
 
     sql = 'sql'
+    copy = 'copy'
+    copy_binary = 'copy_binary'
+    csv = 'csv'
+    tsv = 'tsv'
+    parquet = 'parquet'
+    arrow = 'arrow'
 
     @classmethod
     def from_str(cls, str_: str
                  ) -> 'FormatterType':
 
+        if isinstance(str_, cls):
+            return str_
+
         str_ = str_.lower()
 
         return None if str_ not in [e.value for e in cls] else cls[str_]
 
 
 class DataFormatter:
+    """Formats the generated data of the directives.
+
+    By default, the formatted directives are joined into a single output. The formatters whose output of each
+    directive is an independent file (as the binary ones, which output bytes) must be written into a directory
+    instead (see `DataFormatter.write_all_to_directory`).
+    """
+
+    BINARY = False
+    FILE_PER_DIRECTIVE = False
+    EXTENSION = '.sql'
+
+    def __init__(self, config: Dict[str, Any] = None
+                 ) -> None:
+        self.config = config if config is not None else {}
 
     def format(self, directive: GeneratorDirective) -> None:
 
         raise ValueError('This method must not be used directly')
 
+    def _sort_fields(self, fields: List[str], column_types: Dict[str, str]
+                     ) -> List[str]:
+        """Sorts the fields in the order of the columns in the DBML (the unknown ones are kept at the end).
+        """
+
+        return [field for field in column_types if field in fields] + [field for field in fields if field not in column_types]
+
+    def iter_format(self, directive: GeneratorDirective, batch_size: int = None
+                    ) -> Iterator[Any]:
+        """Formats the directive consuming its data in batches, yielding the formatted chunks.
+
+        Note: formatters without streaming support format the whole directive at once.
+        """
+
+        yield self.format(directive=directive)
+
+    def format_to(self, directive: GeneratorDirective, stream: IO, batch_size: int = None
+                  ) -> None:
+        """Writes the formatted directive into the stream chunk by chunk.
+        """
+
+        for formatted_chunk in self.iter_format(directive=directive, batch_size=batch_size):
+            stream.write(formatted_chunk)
+
     def join_directives(self, formatted_directives: List[str]) -> str:
 
         joined_directives = '\n\n'.join(formatted_directives)
@@ -37,33 +102,121 @@ class DataFormatter:
         return joined_directives
 
     def format_all(self, directives: List[GeneratorDirective]) -> Any:
+        """Formats all the directives, joining them into a single output (or, for the binary formatters, returning the
+        output of each directive by name).
+        """
 
         directives = sorted(directives, key=lambda directive: directive.index)
+
+        if self.FILE_PER_DIRECTIVE:
+            return {directive.name: self.format(directive=directive) for directive in directives}
+
         formatted_directives = [self.format(directive=directive) for directive in directives]
         joined_directives = self.join_directives(formatted_directives=formatted_directives)
 
         return joined_directives
 
+    def iter_format_all(self, directives: List[GeneratorDirective], batch_size: int = None
+                        ) -> Iterator[Any]:
+        """Streaming version of `DataFormatter.format_all`, yielding the formatted chunks of each directive.
+        """
+
+        if self.FILE_PER_DIRECTIVE:
+            raise ValueError('The format outputs an independent file for each directive, so it must be written into a directory.')
+
+        directives = sorted(directives, key=lambda directive: directive.index)
+
+        for i, directive in enumerate(directives):
+
+            if i > 0:
+                yield '\n\n'
+
+            yield from self.iter_format(directive=directive, batch_size=batch_size)
+
+    def write_all(self, directives: List[GeneratorDirective], fp: IO, batch_size: int = None
+                  ) -> None:
+        """Streaming version of `DataFormatter.format_all`, writing the formatted directives into fp.
+        """
+
+        for formatted_chunk in self.iter_format_all(directives=directives, batch_size=batch_size):
+            fp.write(formatted_chunk)
+
+    def write_all_to_directory(self, directives: List[GeneratorDirective], directory: str, batch_size: int = None
+                               ) -> List[str]:
+        """Writes each formatted directive into its own file of the directory (named as the table), returning the
+        paths of the written files.
+        """
+
+        os.makedirs(directory, exist_ok=True)
+
+        paths = []
+
+        for directive in sorted(directives, key=lambda directive: directive.index):
+
+            path = os.path.join(directory, re.sub(r'[^\w.-]', '_', directive.name) + self.EXTENSION)
+
+            with open(path, 'wb') if self.BINARY else open(path, 'w', newline='') as f:
+                self.format_to(directive=directive, stream=f, batch_size=batch_size)
+
+            paths.append(path)
+
+        return paths
+
     @classmethod
-    def from_type(cls, formatter_type: FormatterType) -> 'DataFormatter':
+    def from_type(cls, formatter_type: FormatterType, config: Dict[str, Any] = None
+                  ) -> 'DataFormatter':
 
         if formatter_type == FormatterType.sql:
-            return SQLDataFormatter()
+            return SQLDataFormatter(config=config)
+        elif formatter_type == FormatterType.copy:
+            return CopyDataFormatter(config=config)
+        elif formatter_type == FormatterType.copy_binary:
+            return BinaryCopyDataFormatter(config=config)
+        elif formatter_type == FormatterType.csv:
+            return CSVDataFormatter(config=config)
+        elif formatter_type == FormatterType.tsv:
+            return TSVDataFormatter(config=config)
+        elif formatter_type == FormatterType.parquet:
+            return ParquetDataFormatter(config=config)
+        elif formatter_type == FormatterType.arrow:
+            return ArrowDataFormatter(config=config)
         else:
             raise ValueError(f'There is no recognized data formatter for format {formatter_type}')
 
 
 class SQLDataFormatter(DataFormatter):
+    """Formats the directives as INSERT statements of at most `rows_per_insert` rows each (1000 by default, and
+    a single statement per directive if it is set to None).
+    """
 
-    def format(self, directive: GeneratorDirective
-               ) -> str:
+    DEFAULT_ROWS_PER_INSERT = 1000
 
-        # fetch data and fetch fields and format it into entries
-        data = directive.fetch()
-        table_name = directive.name
-        num_entries = len(data[list(data.keys())[0]])
+    # number of rows formatted at once when the data of the directive is already generated
+    FORMAT_BATCH_SIZE = 10000
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.rows_per_insert = self.config.get('rows_per_insert', self.DEFAULT_ROWS_PER_INSERT)
+
+        if self.rows_per_insert is not None and self.rows_per_insert <= 0:
+            raise ValueError(f'The number of rows per insert must be a positive number, but {self.rows_per_insert} was given.')
+
+    def _format_header(self, table_name: str, fields: List[str]
+                       ) -> str:
+
+        formatted_fields_list = ",".join(fields)
+        formatted_header = f'INSERT INTO {table_name}({formatted_fields_list}) VALUES '
+
+        return formatted_header
+
+    def _format_rows(self, data: Dict[str, Any]
+                     ) -> List[str]:
+
+        # fetch fields and format them into entries
         fields = list(data.keys())
-        data_entries = [[data[k][index] for k in fields] for index in range(num_entries)]
+        num_entries = len(data[fields[0]]) if fields else 0
+        columns = [np.asarray(data[k]).tolist() for k in fields]  # numpy values into python ones (i.e. datetime64 into datetime)
+        data_entries = [[column[index] for column in columns] for index in range(num_entries)]
 
         # format data
         def _format_numer(data):
@@ -81,15 +234,605 @@ class SQLDataFormatter(DataFormatter):
         def _format_row(fields):
             return f"({','.join(fields)})"
 
-        # format header
-        formatted_fields_list = ",".join(fields)
-        formatted_header = f'INSERT INTO {table_name}({formatted_fields_list}) VALUES '
-
         # format fields into rows
         formatted_fields = [[_format_field(field) for field in entry] for entry in data_entries]
-        formatted_rows = '\n\t,'.join([_format_row(row) for row in formatted_fields])
+        formatted_rows = [_format_row(row) for row in formatted_fields]
+
+        return formatted_rows
+
+    def format(self, directive: GeneratorDirective
+               ) -> str:
 
-        # join all
-        formatted_directive = f"{formatted_header}\n\t{formatted_rows};"
+        formatted_directive = ''.join(self.iter_format(directive=directive))
 
         return formatted_directive
+
+    def iter_format(self, directive: GeneratorDirective, batch_size: int = None
+                    ) -> Iterator[str]:
+        """Yields the INSERT statements of the directive, of rows_per_insert rows each (continuing them across the
+        batches, so the output does not depend on batch_size). If batch_size is None, the directive is generated at
+        once and formatted in slices.
+        """
+
+        if batch_size is None:
+            directive.fetch()
+            batch_size = self.FORMAT_BATCH_SIZE
+
+        table_name = directive.name
+        formatted_header = None
+        formatted_separator = ''
+        num_statement_rows = 0
+
+        for batch in directive.iter_batches(batch_size=batch_size):
+
+            if formatted_header is None:
+                formatted_header = self._format_header(table_name=table_name, fields=list(batch.keys()))
+
+            formatted_chunk = []
+
+            for formatted_row in self._format_rows(data=batch):
+
+                # open a new statement (in a new line if it is not the first one), or continue the values list of the current one
+                if num_statement_rows == 0:
+                    formatted_chunk.append(f"{formatted_separator}{formatted_header}\n\t{formatted_row}")
+                    formatted_separator = '\n'
+                else:
+                    formatted_chunk.append(f"\n\t,{formatted_row}")
+
+                num_statement_rows += 1
+
+                # close the statement if it is full
+                if num_statement_rows == self.rows_per_insert:
+                    formatted_chunk.append(';')
+                    yield ''.join(formatted_chunk)
+
+                    formatted_chunk = []
+                    num_statement_rows = 0
+
+            if formatted_chunk:
+                yield ''.join(formatted_chunk)
+
+        if num_statement_rows > 0:
+            yield ';'
+
+
+class CopyDataFormatter(DataFormatter):
+    """Formats the directives in the PostgreSQL COPY text format: a `COPY ... FROM STDIN` statement followed by the
+    tab separated rows and the `\\.` end marker, so the output can be loaded with psql.
+
+    Each column is formatted at once according to its dtype, instead of dispatching value by value.
+    """
+
+    NULL = '\\N'
+
+    # number of rows formatted at once when the data of the directive is already generated
+    FORMAT_BATCH_SIZE = 10000
+
+    # escapes of the special characters of the text format (NUL characters can not be stored by PostgreSQL)
+    ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+    def copy_statement(self, table_name: str, fields: List[str]
+                       ) -> str:
+        """Returns the COPY statement loading the given fields of the table from the standard input.
+        """
+
+        return f'COPY {table_name} ({",".join(fields)}) FROM STDIN'
+
+    def _format_header(self, table_name: str, fields: List[str]
+                       ) -> str:
+
+        return f'{self.copy_statement(table_name=table_name, fields=fields)};\n'
+
+    def _format_strings(self, values: List[str]
+                        ) -> List[str]:
+        """Escapes the values joining them into a single string, so they are escaped at once.
+        """
+
+        joined_values = '\x00'.join(values)
+
+        if joined_values.count('\x00') != len(values) - 1:
+            raise ValueError('The NUL character can not be written in the PostgreSQL COPY format.')
+
+        if not any(character in joined_values for character in '\\\t\n\r'):
+            return values
+
+        return joined_values.translate(self.ESCAPES).split('\x00')
+
+    def _format_column(self, column: np.ndarray
+                       ) -> List[str]:
+
+        column = np.asarray(column)
+        kind = column.dtype.kind
+
+        if kind == 'b':
+            return np.where(column, 't', 'f').tolist()
+
+        if kind in 'iuf':
+            return column.astype(str).tolist()
+
+        if kind == 'M':
+            return np.where(np.isnat(column), self.NULL, np.datetime_as_string(column)).tolist()
+
+        values = self._format_strings(column.astype(str).tolist())
+
+        if kind == 'O':
+
+            nulls = np.equal(column, None)
+
+            if nulls.any():
+                values = np.where(nulls, self.NULL, np.array(values, dtype=object)).tolist()
+
+        return values
+
+    def format_rows(self, data: Dict[str, np.ndarray]
+                    ) -> str:
+        """Returns the rows of the given columns in the COPY text format, without the end marker.
+        """
+
+        columns = [self._format_column(column) for column in data.values()]
+
+        return ''.join(f'{row}\n' for row in map('\t'.join, zip(*columns)))
+
+    def format(self, directive: GeneratorDirective
+               ) -> str:
+
+        return ''.join(self.iter_format(directive=directive))
+
+    def iter_format(self, directive: GeneratorDirective, batch_size: int = None
+                    ) -> Iterator[str]:
+        """Yields the COPY statement of the directive and its rows batch by batch. If batch_size is None, the directive
+        is generated at once and formatted in slices.
+        """
+
+        if batch_size is None:
+            directive.fetch()
+            batch_size = self.FORMAT_BATCH_SIZE
+
+        formatted_header = None
+
+        for batch in directive.iter_batches(batch_size=batch_size):
+
+            if formatted_header is None:
+                formatted_header = self._format_header(table_name=directive.name, fields=list(batch.keys()))
+                yield formatted_header
+
+            yield self.format_rows(data=batch)
+
+        if formatted_header is not None:
+            yield '\\.\n'
+
+
+class BinaryCopyDataFormatter(DataFormatter):
+    """Formats each directive as a PostgreSQL COPY binary stream, to be loaded with
+    `COPY <table> FROM '<file>' WITH (FORMAT binary)`.
+
+    The columns are written in the order of the DBML, encoded as the PostgreSQL type of the column in the DBML (or
+    inferred from the dtype of the values if unknown). Each batch is encoded at once: the encoded values of each
+    column are scattered into a single buffer at the offsets of the rows.
+    """
+
+    BINARY = True
+    FILE_PER_DIRECTIVE = True
+    EXTENSION = '.bin'
+
+    # number of rows formatted at once when the data of the directive is already generated
+    FORMAT_BATCH_SIZE = 10000
+
+    HEADER = b'PGCOPY\n\xff\r\n\x00' + np.array([0, 0], dtype='>i4').tobytes()  # signature, flags and extension length
+    TRAILER = np.array(-1, dtype='>i2').tobytes()
+
+    # the PostgreSQL epoch is 2000-01-01
+    EPOCH_DAYS = 10957
+    EPOCH_MICROSECONDS = EPOCH_DAYS * 86400 * 10 ** 6
+
+    NUMERIC_TYPES = {
+        'smallint': '>i2', 'int2': '>i2', 'smallserial': '>i2',
+        'int': '>i4', 'integer': '>i4', 'int4': '>i4', 'serial': '>i4',
+        'bigint': '>i8', 'int8': '>i8', 'bigserial': '>i8',
+        'real': '>f4', 'float4': '>f4',
+        'float': '>f8', 'float8': '>f8', 'double': '>f8', 'double precision': '>f8',
+    }
+    BOOLEAN_TYPES = {'bool', 'boolean'}
+    TIMESTAMP_TYPES = {'timestamp', 'timestamptz', 'datetime', 'timestamp without time zone', 'timestamp with time zone'}
+    DATE_TYPES = {'date'}
+    UUID_TYPES = {'uuid'}
+    JSONB_TYPES = {'jsonb'}
+    UNSUPPORTED_TYPES = {'numeric', 'decimal', 'money', 'time', 'timetz', 'interval', 'inet', 'cidr', 'macaddr', 'bit', 'varbit'}
+
+    def _resolve_type(self, column_type: str, column: np.ndarray
+                      ) -> str:
+        """Returns the PostgreSQL type of the column without modifiers (i.e. varchar(255) as varchar), inferring it
+        from the dtype if unknown.
+        """
+
+        if column_type is None:
+            kind = column.dtype.kind
+            return {'b': 'bool', 'i': 'bigint', 'u': 'bigint', 'f': 'float8', 'M': 'timestamp'}.get(kind, 'text')
+
+        column_type = re.sub(r'\s+', ' ', re.sub(r'\(.*?\)', '', column_type.lower())).strip()
+
+        if column_type.endswith('[]') or column_type in self.UNSUPPORTED_TYPES:
+            raise ValueError(f'The type {column_type} is not supported by the PostgreSQL COPY binary format formatter. Please use the COPY text format instead.')
+
+        return column_type
+
+    def _encode_text(self, column: np.ndarray
+                     ) -> Tuple[np.ndarray, np.ndarray]:
+        """Encodes the values as UTF-8, taking the character codes directly as bytes if all of them are ASCII.
+        """
+
+        strings = column.astype(str)
+
+        if strings.dtype.itemsize == 0:
+            strings = strings.astype('U1')
+
+        codes = strings.view(np.uint32).reshape(len(strings), -1)
+
+        if not codes.size or codes.max() < 128:
+            return codes.astype(np.uint8), np.char.str_len(strings)
+
+        encoded = np.char.encode(strings, 'utf-8')
+
+        return encoded.view(np.uint8).reshape(len(encoded), encoded.dtype.itemsize), np.char.str_len(encoded)
+
+    def _cast_numeric(self, column: np.ndarray, dtype: np.dtype
+                      ) -> np.ndarray:
+        """Casts the values to the numeric dtype, raising a ValueError if any of them is out of its range (instead of
+        wrapping it).
+        """
+
+        values = column if column.dtype.kind in 'biuf' else column.astype(np.int64 if dtype.kind == 'i' else np.float64)
+        finite = values[np.isfinite(values)] if values.dtype.kind == 'f' else values
+
+        if len(finite):
+
+            limits = np.iinfo(dtype) if dtype.kind == 'i' else np.finfo(dtype)
+            min_value, max_value = finite.min(), finite.max()
+
+            if min_value < limits.min or max_value > limits.max:
+                raise ValueError(f'the values in [{min_value}, {max_value}] are out of the range [{limits.min}, {limits.max}]')
+
+        return values.astype(dtype)
+
+    def _encode_column(self, column: np.ndarray, column_type: str
+                       ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the encoded values of the column as a matrix of bytes (a row for each value) and the length of each
+        value (-1 for the null ones).
+        """
+
+        column = np.asarray(column)
+        nulls = np.equal(column, None) if column.dtype.kind == 'O' else np.zeros(len(column), dtype=bool)
+
+        if column_type in self.TIMESTAMP_TYPES or column_type in self.DATE_TYPES:
+
+            unit, epoch, dtype = ('us', self.EPOCH_MICROSECONDS, '>i8') if column_type in self.TIMESTAMP_TYPES else ('D', self.EPOCH_DAYS, '>i4')
+
+            dates = column.astype(f'datetime64[{unit}]')
+            nulls = np.isnat(dates)
+            column = np.where(nulls, 0, dates.astype(np.int64) - epoch).astype(dtype)
+            column_type = None
+
+        elif nulls.any():
+            column = np.where(nulls, '00000000000000000000000000000000' if column_type in self.UUID_TYPES else 0, column)
+
+        if column_type is None or column_type in self.NUMERIC_TYPES:
+            values = column if column_type is None else self._cast_numeric(column=column, dtype=np.dtype(self.NUMERIC_TYPES[column_type]))
+            matrix = np.ascontiguousarray(values).view(np.uint8).reshape(len(values), values.dtype.itemsize)
+            lengths = np.full(len(values), values.dtype.itemsize)
+
+        elif column_type in self.BOOLEAN_TYPES:
+            matrix = column.astype(bool).astype(np.uint8).reshape(len(column), 1)
+            lengths = np.ones(len(column), dtype=np.int64)
+
+        elif column_type in self.UUID_TYPES:
+            uuids = bytes.fromhex(''.join(column.astype(str).tolist()).replace('-', ''))
+
+            if len(uuids) != 16 * len(column):
+                raise ValueError('the values are not UUIDs')
+
+            matrix = np.frombuffer(uuids, dtype=np.uint8).reshape(len(column), 16)
+            lengths = np.full(len(column), 16)
+
+        else:
+            matrix, lengths = self._encode_text(column)
+
+            if column_type in self.JSONB_TYPES:
+                matrix = np.hstack([np.ones((len(column), 1), dtype=np.uint8), matrix])
+                lengths = lengths + 1
+
+        return matrix, np.where(nulls, -1, lengths)
+
+    def _scatter(self, buffer: np.ndarray, offsets: np.ndarray, matrix: np.ndarray, lengths: np.ndarray
+                 ) -> None:
+        """Writes the first length bytes of each row of the matrix into the buffer, at the offset of the row.
+        """
+
+        width = np.arange(matrix.shape[1])
+        mask = width < lengths[:, None]
+
+        buffer[(offsets[:, None] + width)[mask]] = matrix[mask]
+
+    def _format_rows(self, table_name: str, data: Dict[str, np.ndarray], column_types: Dict[str, str]
+                     ) -> bytes:
+
+        fields = self._sort_fields(fields=list(data.keys()), column_types=column_types)
+        columns = []
+
+        for field in fields:
+
+            column_type = self._resolve_type(column_type=column_types.get(field), column=np.asarray(data[field]))
+
+            try:
+                columns.append(self._encode_column(column=data[field], column_type=column_type))
+            except (OverflowError, ValueError) as e:
+                raise ValueError(f'Unable to encode the values of {table_name}.{field} as {column_type}: {e}')
+
+        # each row is the number of fields and the length and the value of each one
+
+        num_rows = len(data[fields[0]]) if fields else 0
+        row_sizes = 2 + 4 * len(columns) + sum(np.maximum(lengths, 0) for _, lengths in columns)
+        offsets = np.cumsum(row_sizes) - row_sizes
+
+        buffer = np.empty(int(np.sum(row_sizes)) if num_rows else 0, dtype=np.uint8)
+        num_fields = np.frombuffer(np.array(len(columns), dtype='>i2').tobytes(), dtype=np.uint8)
+
+        self._scatter(buffer=buffer, offsets=offsets, matrix=np.tile(num_fields, (num_rows, 1)), lengths=np.full(num_rows, 2))
+        offsets = offsets + 2
+
+        for matrix, lengths in columns:
+
+            self._scatter(buffer=buffer, offsets=offsets, matrix=lengths.astype('>i4').view(np.uint8).reshape(num_rows, 4), lengths=np.full(num_rows, 4))
+            offsets = offsets + 4
+
+            self._scatter(buffer=buffer, offsets=offsets, matrix=matrix, lengths=lengths)
+            offsets = offsets + np.maximum(lengths, 0)
+
+        return buffer.tobytes()
+
+    def format(self, directive: GeneratorDirective
+               ) -> bytes:
+
+        return b''.join(self.iter_format(directive=directive))
+
+    def iter_format(self, directive: GeneratorDirective, batch_size: int = None
+                    ) -> Iterator[bytes]:
+        """Yields the binary stream of the directive batch by batch. If batch_size is None, the directive is generated
+        at once and formatted in slices.
+        """
+
+        if batch_size is None:
+            directive.fetch()
+            batch_size = self.FORMAT_BATCH_SIZE
+
+        yield self.HEADER
+
+        for batch in directive.iter_batches(batch_size=batch_size):
+            yield self._format_rows(table_name=directive.name, data=batch, column_types=directive.column_types)
+
+        yield self.TRAILER
+
+
+class ColumnarDataFormatter(DataFormatter):
+    """Base of the columnar formats, which write each directive as a file of Arrow data.
+
+    The columns of each batch are converted into Arrow arrays directly from the numpy arrays, and written as soon as
+    they are generated (each batch is a row group in parquet and a record batch in arrow). The columns are written in
+    the order of the DBML.
+    """
+
+    BINARY = True
+    FILE_PER_DIRECTIVE = True
+
+    # number of rows written at once when the data of the directive is already generated
+    FORMAT_BATCH_SIZE = 100000
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.pyarrow = _import_pyarrow()
+
+    def _open_writer(self, stream: IO, schema: Any) -> Any:
+
+        raise ValueError('This method must not be used directly')
+
+    def _build_table(self, data: Dict[str, np.ndarray], column_types: Dict[str, str], schema: Any = None
+                     ) -> Any:
+        """Builds the Arrow table of the batch, with the types of the given schema (the ones of the first batch), or
+        inferring them from the dtypes if not given.
+        """
+
+        fields = self._sort_fields(fields=list(data.keys()), column_types=column_types)
+
+        if schema is None:
+            arrays = [self.pyarrow.array(np.asarray(data[field])) for field in fields]
+            return self.pyarrow.Table.from_arrays(arrays, names=fields)
+
+        arrays = [self.pyarrow.array(np.asarray(data[field]), type=schema.field(field).type) for field in fields]
+
+        return self.pyarrow.Table.from_arrays(arrays, schema=schema)
+
+    def format_to(self, directive: GeneratorDirective, stream: IO, batch_size: int = None
+                  ) -> None:
+        """Writes the directive into the stream batch by batch. If batch_size is None, the directive is generated at
+        once and written in slices.
+        """
+
+        if batch_size is None:
+            directive.fetch()
+            batch_size = self.FORMAT_BATCH_SIZE
+
+        writer = None
+        schema = None
+
+        try:
+
+            for batch in directive.iter_batches(batch_size=batch_size):
+
+                table = self._build_table(data=batch, column_types=directive.column_types, schema=schema)
+
+                if writer is None:
+                    schema = table.schema
+                    writer = self._open_writer(stream=stream, schema=schema)
+
+                writer.write_table(table)
+
+            if writer is None:
+                writer = self._open_writer(stream=stream, schema=self.pyarrow.schema([]))
+
+        finally:
+
+            if writer is not None:
+                writer.close()
+
+    def format(self, directive: GeneratorDirective
+               ) -> bytes:
+
+        sink = self.pyarrow.BufferOutputStream()
+        self.format_to(directive=directive, stream=sink)
+
+        return sink.getvalue().to_pybytes()
+
+
+class ParquetDataFormatter(ColumnarDataFormatter):
+    """Writes each directive as a parquet file, compressed with the `compression` of the configuration (snappy by
+    default).
+    """
+
+    EXTENSION = '.parquet'
+    DEFAULT_COMPRESSION = 'snappy'
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.compression = self.config.get('compression', self.DEFAULT_COMPRESSION)
+
+    def _open_writer(self, stream: IO, schema: Any) -> Any:
+        return self.pyarrow.parquet.ParquetWriter(stream, schema, compression=self.compression)
+
+
+class ArrowDataFormatter(ColumnarDataFormatter):
+    """Writes each directive as an Arrow IPC file.
+    """
+
+    EXTENSION = '.arrow'
+
+    def _open_writer(self, stream: IO, schema: Any) -> Any:
+        return self.pyarrow.ipc.new_file(stream, schema)
+
+
+class CSVDataFormatter(DataFormatter):
+    """Writes each directive as a CSV file, with a header with the names of the columns (unless `header` is false in
+    the configuration). The values are quoted only if they contain the delimiter, quotes or line breaks, and the null
+    values are written as the `null` of the configuration (empty by default, set it as `\\N` for MySQL).
+
+    Each column is formatted at once according to its dtype: the booleans as 1 and 0 and the datetimes as ISO strings
+    with a space separator, only escaping the string columns with special characters.
+    """
+
+    FILE_PER_DIRECTIVE = True
+    EXTENSION = '.csv'
+    DELIMITER = ','
+    QUOTE = '"'
+
+    # number of rows formatted at once when the data of the directive is already generated
+    FORMAT_BATCH_SIZE = 10000
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.header = self.config.get('header', True)
+        self.null = self.config.get('null', '')
+        self.special_characters = [self.DELIMITER, self.QUOTE, '\n', '\r']
+
+    def _quote(self, values: np.ndarray
+               ) -> np.ndarray:
+        """Quotes the values with special characters, escaping their quotes by doubling them.
+        """
+
+        joined_values = '\x00'.join(values.tolist())
+
+        if not any(character in joined_values for character in self.special_characters):
+            return values
+
+        needs_quotes = np.zeros(len(values), dtype=bool)
+
+        for character in self.special_characters:
+            needs_quotes |= np.char.find(values, character) >= 0
+
+        quoted_values = np.char.replace(values[needs_quotes], self.QUOTE, self.QUOTE * 2)
+        quoted_values = np.char.add(np.char.add(self.QUOTE, quoted_values), self.QUOTE)
+
+        values = values.astype(object)
+        values[needs_quotes] = quoted_values
+
+        return values
+
+    def _format_column(self, column: np.ndarray
+                       ) -> List[str]:
+
+        column = np.asarray(column)
+        kind = column.dtype.kind
+
+        if kind == 'b':
+            return np.where(column, '1', '0').tolist()
+
+        if kind in 'iu':
+            return column.astype(str).tolist()
+
+        if kind == 'f':
+            return np.where(np.isnan(column), self.null, column.astype(str)).tolist()
+
+        if kind == 'M':
+            return np.where(np.isnat(column), self.null, np.char.replace(np.datetime_as_string(column), 'T', ' ')).tolist()
+
+        values = self._quote(column.astype(str))
+
+        if kind == 'O':
+
+            nulls = np.equal(column, None)
+
+            if nulls.any():
+                values = np.where(nulls, self.null, np.asarray(values, dtype=object))
+
+        return values.tolist()
+
+    def _format_rows(self, data: Dict[str, np.ndarray]
+                     ) -> str:
+
+        columns = [self._format_column(column) for column in data.values()]
+
+        return ''.join(f'{row}\n' for row in map(self.DELIMITER.join, zip(*columns)))
+
+    def format(self, directive: GeneratorDirective
+               ) -> str:
+
+        return ''.join(self.iter_format(directive=directive))
+
+    def iter_format(self, directive: GeneratorDirective, batch_size: int = None
+                    ) -> Iterator[str]:
+        """Yields the header and the rows of the directive batch by batch. If batch_size is None, the directive is
+        generated at once and formatted in slices.
+        """
+
+        if batch_size is None:
+            directive.fetch()
+            batch_size = self.FORMAT_BATCH_SIZE
+
+        formatted_header = None
+
+        for batch in directive.iter_batches(batch_size=batch_size):
+
+            if formatted_header is None:
+
+                fields = np.array(list(batch.keys()), dtype=str)
+                formatted_header = f'{self.DELIMITER.join(self._quote(fields).tolist())}\n'
+
+                if self.header:
+                    yield formatted_header
+
+            yield self._format_rows(data=batch)
+
+
+class TSVDataFormatter(CSVDataFormatter):
+    """Writes each directive as a TSV file, quoted as the CSV files (as the excel-tab dialect of the csv module).
+    """
+
+    EXTENSION = '.tsv'
+    DELIMITER = '\t'
@@ -5,25 +5,98 @@
 
 
 import json
-from typing import Any, Dict
-
-from pydbml import PyDBML
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from . import logger
+from .artifact_store import ArtifactStore
 from .config_builder import ConfigBuilder
 from .default_config import serve_default_config
-from .directive_builder import DirectiveBuilder
+from .directive_builder import DirectiveBuilder, GeneratorDirective
 from .data_formatter import DataFormatter, FormatterType
+from .database_sink import DatabaseSink
+from .metrics import GenerationMetrics, Measurement
+from .output_cache import OutputCache, TeeStream
+from .schema import SchemaCache
 
 
 class DataGenerationPiepline:
+    """Pipeline generating the data of a DBML. The metrics of the last generation (the time, rows and memory of each
+    stage, directive and field generator) are kept in `metrics`, and passed as they are recorded to the given hooks.
+    """
+
+    def __init__(self, cache: OutputCache = None, artifact_store: ArtifactStore = None, schema_cache: SchemaCache = None, hooks: Iterable[Callable[[Measurement], None]] = None) -> None:
+        self.cache = cache
+        self.artifact_store = artifact_store
+        self.schema_cache = schema_cache if schema_cache is not None else SchemaCache()
+        self.hooks = list(hooks) if hooks is not None else []
+        self.metrics = GenerationMetrics(hooks=self.hooks)
+
+    def _start_metrics(self) -> None:
+        self.metrics = GenerationMetrics(hooks=self.hooks)
+
+    def _count_generated_rows(self, directives: List[GeneratorDirective]
+                              ) -> int:
+
+        return sum(directive.measurements[directive.name].rows for directive in directives if directive.name in directive.measurements)
 
     def _load_default_config(self) -> str:
         return serve_default_config()
 
-    def generate(self, dbml: str, user_config: Dict[str, Any], default_config: Dict[str, Any] = None, formatter_type: FormatterType = FormatterType.sql) -> str:
+    def _resolve_seed(self, user_config: Dict[str, Any], seed: int = None
+                      ) -> Optional[int]:
+        """Returns the given seed, or the one in the user configuration if not given.
+        """
 
-        logger.info('started generation')
+        return seed if seed is not None else user_config.get('seed')
+
+    def _check_generation_options(self, batch_size: int = None, workers: int = None, shard_size: int = None) -> None:
+        """Raises a ValueError if the options can not be used together, instead of ignoring some of them: the
+        generation in batches is not parallel nor stored in the artifact store, and the directives are only split into
+        shards when generating in parallel.
+        """
+
+        parallel = workers is not None and workers > 1
+
+        if batch_size is not None and parallel:
+            raise ValueError('The generation in batches is not parallel, so batch_size can not be given with more than one worker. Please give only one of them.')
+
+        if batch_size is not None and self.artifact_store is not None:
+            raise ValueError('The data generated in batches is not kept, so it can not be stored in the artifact store. Please generate without batch_size or without artifact store.')
+
+        if shard_size is not None and not parallel:
+            raise ValueError('The directives are only split into shards when generating in parallel, so shard_size requires more than one worker.')
+
+    def _fingerprint(self, dbml: str, user_config: Dict[str, Any], default_config: Dict[str, Any], formatter_type: FormatterType, formatter_config: Dict[str, Any] = None, seed: int = None
+                     ) -> Optional[str]:
+        """Returns the key of the generation in the output cache, or None if it must not be cached: if there is no
+        cache or the generation is not seeded (so it is not reproducible).
+        """
+
+        if self.cache is None:
+            return None
+
+        seed = self._resolve_seed(user_config=user_config, seed=seed)
+
+        if seed is None:
+            logger.debug('skipping output cache, as the generation is not seeded')
+            return None
+
+        if default_config is None:
+            default_config = self._load_default_config()
+
+        config = ConfigBuilder().merge_config(
+            user_config=user_config, default_config=default_config
+        )
+
+        return OutputCache.fingerprint(
+            dbml=dbml, config=config, seed=seed, formatter_type=formatter_type, formatter_config=formatter_config
+        )
+
+    def _build(self, dbml: str, user_config: Dict[str, Any], default_config: Dict[str, Any], formatter_type: FormatterType, formatter_config: Dict[str, Any] = None, seed: int = None
+               ) -> Tuple[List[GeneratorDirective], DataFormatter]:
+        """Builds the directives and the formatter. The given seed takes precedence over the one in the user
+        configuration, if any.
+        """
 
         # get formatter type
         formatter_type = FormatterType.from_str(formatter_type)
@@ -34,41 +107,275 @@ class DataGenerationPiepline:
         if default_config is None:
             default_config = self._load_default_config()
 
-        # instance DBML object
-        try:
-            dbml = PyDBML(dbml)
-        except:
-            raise Exception('Unable to parse the DBML content due to an unknown reason. Please check the syntax.')
+        # build schema from the DBML, reusing it if already parsed
+        with self.metrics.measure_stage('parse'):
+            schema = self.schema_cache.load(dbml)
 
         # instance pipeline objects
         config_builder = ConfigBuilder()
         directive_builder = DirectiveBuilder()
-        formatter = DataFormatter.from_type(formatter_type=formatter_type)
+        formatter = DataFormatter.from_type(formatter_type=formatter_type, config=formatter_config)
 
         # perform pipeline
         logger.info('building configuration file')
-        config = config_builder.build_config(
-            dbml=dbml, user_config=user_config, default_config=default_config
-        )
+        with self.metrics.measure_stage('config'):
+            config = config_builder.build_config(
+                schema=schema, user_config=user_config, default_config=default_config
+            )
+
+        seed = self._resolve_seed(user_config=user_config, seed=seed)
+
+        if seed is not None:
+            logger.info(f'seeding generation with seed {seed}')
 
         logger.info('building directives')
-        directives = directive_builder.build(
-            dbml=dbml, config=config
+        with self.metrics.measure_stage('directives'):
+            directives = directive_builder.build(
+                schema=schema, config=config, seed=seed
+            )
+
+        # the measurements of the directives are recorded as they are measured
+        self.metrics.watch(directives)
+
+        if self.artifact_store is not None:
+            logger.info('calculating directives fingerprints')
+            with self.metrics.measure_stage('fingerprint'):
+                self.artifact_store.fingerprint_directives(
+                    directives=directives, schema=schema, config=config
+                )
+
+        return directives, formatter
+
+    def _generate_directives(self, directives: List[GeneratorDirective], workers: int = None, shard_size: int = None, seed: int = None
+                             ) -> None:
+        """Generates the data of the directives. If the pipeline has an artifact store, the unchanged directives are
+        reloaded from it, and only the rest are generated (and stored). The directives depending on a generated one
+        are also generated, even if stored, as their stored references may point to values no longer generated.
+        """
+
+        if self.artifact_store is not None:
+
+            stored_directives = directives
+            directives = []
+            generated_names = set()
+
+            with self.metrics.measure_stage('reload'):
+
+                for directive in sorted(stored_directives, key=lambda directive: directive.index):
+
+                    upstream_generated = any(dependency.referenced_directive.name in generated_names for dependency in directive.dependencies.values())
+
+                    if upstream_generated or not self.artifact_store.load(directive):
+                        generated_names.add(directive.name)
+                        directives.append(directive)
+
+            logger.info(f'reloaded {len(stored_directives) - len(directives)} unchanged directives')
+
+        with self.metrics.measure_stage('generate') as measurement:
+
+            if workers is None or workers <= 1:
+
+                logger.info(f'generating data for {len(directives)} directives')
+                for directive in directives:
+                    directive.generate()
+
+            else:
+
+                # imported when needed, as the process pool is slow to import
+                from .directive_scheduler import DirectiveScheduler
+
+                logger.info(f'generating data for {len(directives)} directives with {workers} workers')
+                scheduler = DirectiveScheduler(workers=workers, shard_size=shard_size, seed=seed)
+                scheduler.run(directives=directives)
+
+            measurement.rows = self._count_generated_rows(directives)
+
+        if self.artifact_store is not None:
+            with self.metrics.measure_stage('store'):
+                for directive in directives:
+                    self.artifact_store.save(directive)
+
+    def generate(self, dbml: str, user_config: Dict[str, Any], default_config: Dict[str, Any] = None, formatter_type: FormatterType = FormatterType.sql, formatter_config: Dict[str, Any] = None, workers: int = None, shard_size: int = None, seed: int = None) -> str:
+
+        self._check_generation_options(workers=workers, shard_size=shard_size)
+
+        logger.info('started generation')
+        self._start_metrics()
+
+        cache_key = self._fingerprint(
+            dbml=dbml, user_config=user_config, default_config=default_config, formatter_type=formatter_type, formatter_config=formatter_config, seed=seed
         )
 
-        logger.info(f'generating data for {len(directives)} directives')
-        for directive in directives:
-            directive.generate()
+        if cache_key is not None:
 
-        logger.info('applygin format')
-        formatted_generated_data = formatter.format_all(
-            directives=directives
+            with self.metrics.measure_stage('cache'):
+                formatted_generated_data = self.cache.read(cache_key)
+
+            if formatted_generated_data is not None:
+                logger.info('completed generation from cache')
+                return formatted_generated_data
+
+        directives, formatter = self._build(
+            dbml=dbml, user_config=user_config, default_config=default_config, formatter_type=formatter_type, formatter_config=formatter_config, seed=seed
         )
 
+        self._generate_directives(
+            directives=directives, workers=workers, shard_size=shard_size, seed=seed
+        )
+
+        logger.info('applygin format')
+        with self.metrics.measure_stage('format') as measurement:
+            formatted_generated_data = formatter.format_all(
+                directives=directives
+            )
+            measurement.rows = self._count_generated_rows(directives)
+
+        # the formats outputting a file for each directive are not cached
+        if cache_key is not None and isinstance(formatted_generated_data, str):
+            self.cache.write(cache_key, formatted_generated_data)
+
         logger.info('completed generation')
 
         return formatted_generated_data
 
+    def iter_generate(self, dbml: str, user_config: Dict[str, Any], default_config: Dict[str, Any] = None, formatter_type: FormatterType = FormatterType.sql, batch_size: int = 10000, formatter_config: Dict[str, Any] = None, seed: int = None) -> Iterator[str]:
+        """Streaming version of `DataGenerationPiepline.generate`: the directives are generated in batches of
+        batch_size rows, yielding the formatted chunks as soon as they are available.
+        """
+
+        self._check_generation_options(batch_size=batch_size)
+
+        logger.info('started streaming generation')
+        self._start_metrics()
+
+        directives, formatter = self._build(
+            dbml=dbml, user_config=user_config, default_config=default_config, formatter_type=formatter_type, formatter_config=formatter_config, seed=seed
+        )
+
+        logger.info(f'generating and formatting data for {len(directives)} directives in batches of {batch_size}')
+        yield from formatter.iter_format_all(
+            directives=directives, batch_size=batch_size
+        )
+
+        logger.info('completed generation')
+
+    def generate_to(self, fp: IO, dbml: str, user_config: Dict[str, Any], default_config: Dict[str, Any] = None, formatter_type: FormatterType = FormatterType.sql, batch_size: int = None, formatter_config: Dict[str, Any] = None, workers: int = None, shard_size: int = None, seed: int = None) -> None:
+        """Writes the formatted data into fp as it is formatted. If batch_size is given, the data is also generated
+        in batches instead of generating each directive at once. Otherwise, the independent directives are
+        generated in parallel if more than one worker is given (splitting the directives bigger than shard_size
+        into shards if it is given).
+
+        If the pipeline has an output cache and the generation is seeded, the output is copied from the cache when
+        available, or stored in it otherwise.
+        """
+
+        self._check_generation_options(batch_size=batch_size, workers=workers, shard_size=shard_size)
+
+        logger.info('started generation')
+        self._start_metrics()
+
+        cache_key = self._fingerprint(
+            dbml=dbml, user_config=user_config, default_config=default_config, formatter_type=formatter_type, formatter_config=formatter_config, seed=seed
+        )
+
+        if cache_key is not None:
+
+            with self.metrics.measure_stage('cache'):
+                cached = self.cache.copy_to(cache_key, fp)
+
+            if cached:
+                logger.info('completed generation from cache')
+                return
+
+        directives, formatter = self._build(
+            dbml=dbml, user_config=user_config, default_config=default_config, formatter_type=formatter_type, formatter_config=formatter_config, seed=seed
+        )
+
+        if batch_size is None:
+            self._generate_directives(
+                directives=directives, workers=workers, shard_size=shard_size, seed=seed
+            )
+
+        logger.info('applygin format')
+
+        # when generating in batches, the format stage includes the generation of the batches
+        with self.metrics.measure_stage('format') as measurement:
+
+            if cache_key is None:
+                formatter.write_all(
+                    directives=directives, fp=fp, batch_size=batch_size
+                )
+            else:
+                with self.cache.writer(cache_key) as cache_fp:
+                    formatter.write_all(
+                        directives=directives, fp=TeeStream([fp, cache_fp]), batch_size=batch_size
+                    )
+
+            measurement.rows = self._count_generated_rows(directives)
+
+        logger.info('completed generation')
+
+    def generate_to_directory(self, directory: str, dbml: str, user_config: Dict[str, Any], default_config: Dict[str, Any] = None, formatter_type: FormatterType = FormatterType.sql, batch_size: int = None, formatter_config: Dict[str, Any] = None, workers: int = None, shard_size: int = None, seed: int = None) -> List[str]:
+        """Writes the formatted data of each directive into its own file of the directory (as needed by the formats
+        outputting a file for each directive), returning the paths of the written files. The data is generated as in
+        `DataGenerationPiepline.generate_to`, but the output is not cached.
+        """
+
+        self._check_generation_options(batch_size=batch_size, workers=workers, shard_size=shard_size)
+
+        logger.info('started generation')
+        self._start_metrics()
+
+        directives, formatter = self._build(
+            dbml=dbml, user_config=user_config, default_config=default_config, formatter_type=formatter_type, formatter_config=formatter_config, seed=seed
+        )
+
+        if batch_size is None:
+            self._generate_directives(
+                directives=directives, workers=workers, shard_size=shard_size, seed=seed
+            )
+
+        logger.info(f'applygin format into directory {directory}')
+        with self.metrics.measure_stage('format') as measurement:
+            paths = formatter.write_all_to_directory(
+                directives=directives, directory=directory, batch_size=batch_size
+            )
+            measurement.rows = self._count_generated_rows(directives)
+
+        logger.info('completed generation')
+
+        return paths
+
+    def generate_to_database(self, sink: DatabaseSink, dbml: str, user_config: Dict[str, Any], default_config: Dict[str, Any] = None, batch_size: int = None, workers: int = None, shard_size: int = None, seed: int = None) -> Dict[str, int]:
+        """Inserts the generated data directly into the database of the sink, returning the number of inserted rows
+        of each table. The data is generated as in `DataGenerationPiepline.generate_to`.
+        """
+
+        self._check_generation_options(batch_size=batch_size, workers=workers, shard_size=shard_size)
+
+        logger.info('started generation')
+        self._start_metrics()
+
+        directives, _ = self._build(
+            dbml=dbml, user_config=user_config, default_config=default_config, formatter_type=FormatterType.sql, seed=seed
+        )
+
+        if batch_size is None:
+            self._generate_directives(
+                directives=directives, workers=workers, shard_size=shard_size, seed=seed
+            )
+
+        logger.info('inserting data into the database')
+        with self.metrics.measure_stage('insert') as measurement:
+            inserted_rows = sink.write_all(
+                directives=directives, batch_size=batch_size
+            )
+            measurement.rows = sum(inserted_rows.values())
+
+        logger.info('completed generation')
+
+        return inserted_rows
+
 
 class DataGenerationPipelineFromFiles(DataGenerationPiepline):
 
@@ -102,8 +409,8 @@ class DataGenerationPipelineFromFiles(DataGenerationPiepline):
 
         return config
 
-    def generate(self, dbml_file_path: str, config_file_path: str, default_config_file_path: str = None, formatter_type: FormatterType = FormatterType.sql
-                 ):
+    def _load(self, dbml_file_path: str, config_file_path: str, default_config_file_path: str = None
+              ) -> Tuple[str, Dict[str, Any], Dict[str, Any]]:
 
         logger.info(f'reading DBML handler from {dbml_file_path}')
         dbml = self._build_dbml_handler(
@@ -125,6 +432,59 @@ class DataGenerationPipelineFromFiles(DataGenerationPiepline):
                 file_path=default_config_file_path
             )
 
+        return dbml, user_config, default_config
+
+    def generate(self, dbml_file_path: str, config_file_path: str, default_config_file_path: str = None, formatter_type: FormatterType = FormatterType.sql, formatter_config: Dict[str, Any] = None, workers: int = None, shard_size: int = None, seed: int = None
+                 ):
+
+        dbml, user_config, default_config = self._load(
+            dbml_file_path=dbml_file_path, config_file_path=config_file_path, default_config_file_path=default_config_file_path
+        )
+
         return super().generate(
-            dbml=dbml, user_config=user_config, default_config=default_config, formatter_type=formatter_type
+            dbml=dbml, user_config=user_config, default_config=default_config, formatter_type=formatter_type, formatter_config=formatter_config, workers=workers, shard_size=shard_size, seed=seed
+        )
+
+    def iter_generate(self, dbml_file_path: str, config_file_path: str, default_config_file_path: str = None, formatter_type: FormatterType = FormatterType.sql, batch_size: int = 10000, formatter_config: Dict[str, Any] = None, seed: int = None
+                      ) -> Iterator[str]:
+
+        dbml, user_config, default_config = self._load(
+            dbml_file_path=dbml_file_path, config_file_path=config_file_path, default_config_file_path=default_config_file_path
+        )
+
+        return super().iter_generate(
+            dbml=dbml, user_config=user_config, default_config=default_config, formatter_type=formatter_type, batch_size=batch_size, formatter_config=formatter_config, seed=seed
+        )
+
+    def generate_to(self, fp: IO, dbml_file_path: str, config_file_path: str, default_config_file_path: str = None, formatter_type: FormatterType = FormatterType.sql, batch_size: int = None, formatter_config: Dict[str, Any] = None, workers: int = None, shard_size: int = None, seed: int = None
+                    ) -> None:
+
+        dbml, user_config, default_config = self._load(
+            dbml_file_path=dbml_file_path, config_file_path=config_file_path, default_config_file_path=default_config_file_path
+        )
+
+        return super().generate_to(
+            fp=fp, dbml=dbml, user_config=user_config, default_config=default_config, formatter_type=formatter_type, batch_size=batch_size, formatter_config=formatter_config, workers=workers, shard_size=shard_size, seed=seed
+        )
+
+    def generate_to_directory(self, directory: str, dbml_file_path: str, config_file_path: str, default_config_file_path: str = None, formatter_type: FormatterType = FormatterType.sql, batch_size: int = None, formatter_config: Dict[str, Any] = None, workers: int = None, shard_size: int = None, seed: int = None
+                              ) -> List[str]:
+
+        dbml, user_config, default_config = self._load(
+            dbml_file_path=dbml_file_path, config_file_path=config_file_path, default_config_file_path=default_config_file_path
+        )
+
+        return super().generate_to_directory(
+            directory=directory, dbml=dbml, user_config=user_config, default_config=default_config, formatter_type=formatter_type, batch_size=batch_size, formatter_config=formatter_config, workers=workers, shard_size=shard_size, seed=seed
+        )
+
+    def generate_to_database(self, sink: DatabaseSink, dbml_file_path: str, config_file_path: str, default_config_file_path: str = None, batch_size: int = None, workers: int = None, shard_size: int = None, seed: int = None
+                             ) -> Dict[str, int]:
+
+        dbml, user_config, default_config = self._load(
+            dbml_file_path=dbml_file_path, config_file_path=config_file_path, default_config_file_path=default_config_file_path
+        )
+
+        return super().generate_to_database(
+            sink=sink, dbml=dbml, user_config=user_config, default_config=default_config, batch_size=batch_size, workers=workers, shard_size=shard_size, seed=seed
         )
@@ -6,12 +6,12 @@
 
 import enum
 from typing import Any, List
-from datetime import datetime, timedelta
+from datetime import datetime
 
 import numpy as np
-import rstr
 
 from .distribution import DistributionGenerator, DistributionType
+from .regex_sampler import RegexSampler
 
 
 class DataType(enum.Enum):
@@ -84,13 +84,21 @@ class DataTypeGenerator:
     Note: this class must not be instanced directly, the method `DataTypeGenerator:build` method must be used.
     """
 
-    def __init__(self, distribution_generator: DistributionGenerator = None) -> None:
+    # number of rows drawn from each random stream of a seeded generator
+    BLOCK_SIZE = 8192
+
+    def __init__(self, distribution_generator: DistributionGenerator = None, seed_sequence: np.random.SeedSequence = None) -> None:
         self.distribution_generator = distribution_generator
+        self.seed_sequence = seed_sequence
+        self._cached_block = None
 
     @classmethod
-    def build(self, data_type: DataType, start: Any = None, end: Any = None, generable_expression: str = None, collection_values: List[Any] = None, distribution_generator: DistributionGenerator = None
+    def build(self, data_type: DataType, start: Any = None, end: Any = None, generable_expression: str = None, collection_values: List[Any] = None, distribution_generator: DistributionGenerator = None, seed_sequence: np.random.SeedSequence = None
               ) -> 'DataTypeGenerator':
         """Factory method for building different generator types.
+
+        If a seed sequence is given, the generator is seeded: its values only depend on the seed sequence and on the
+        position of the rows (see `DataTypeGenerator.generate_range`).
         """
 
         # build default distribution generator
@@ -102,26 +110,89 @@ class DataTypeGenerator:
 
         if assigned_generator == GeneratorType.base_type:
             generator = BaseTypeDataTypeGenerator(
-                data_type=data_type, start=start, end=end, distribution_generator=distribution_generator
+                data_type=data_type, start=start, end=end, distribution_generator=distribution_generator, seed_sequence=seed_sequence
             )
         elif assigned_generator == GeneratorType.collection:
             generator = CollectionDataTypeGenerator(
-                collection_values=collection_values, distribution_generator=distribution_generator
+                collection_values=collection_values, distribution_generator=distribution_generator, seed_sequence=seed_sequence
             )
         elif assigned_generator == GeneratorType.generable:
             generator = GenerableDataTypeGenerator(
-                generable_expression=generable_expression, distribution_generator=distribution_generator
+                generable_expression=generable_expression, sampler=RegexSampler.build(generable_expression), distribution_generator=distribution_generator, seed_sequence=seed_sequence
             )
         else:
             raise ValueError(f'Unable to instance data generator. The assigned_generator {assigned_generator} has not an implemented instanciation.')
 
         return generator
 
+    def _generate(self, num_samples: int, rng: np.random.Generator = None, fixed_bounds: bool = False
+                  ) -> np.ndarray:
+        raise Exception('This method must not be used in this class, first build a DataTypeGenerator with the DataTypeGenerator.build method.')
+
+    @property
+    def seeded(self) -> bool:
+        return self.seed_sequence is not None
+
     def generate(self, num_samples: int
-                 ) -> List[Any]:
-        """Generates the data
+                 ) -> np.ndarray:
+        """Generates the data as a typed array.
         """
-        raise Exception('This method must not be used in this class, first build a DataTypeGenerator with the DataTypeGenerator.build method.')
+
+        if self.seeded:
+            return self.generate_range(start=0, stop=num_samples, num_rows=num_samples)
+
+        return self._generate(num_samples=num_samples)
+
+    def _generate_block(self, block: int, num_rows: int
+                        ) -> np.ndarray:
+        """Generates the rows of the given block of a seeded generator, drawing them from the stream spawned from the
+        seed sequence for the block. The last generated block is kept, as consecutive ranges usually share it.
+        """
+
+        if self._cached_block is not None and self._cached_block[:2] == (block, num_rows):
+            return self._cached_block[2]
+
+        block_seed_sequence = np.random.SeedSequence(
+            entropy=self.seed_sequence.entropy, spawn_key=self.seed_sequence.spawn_key + (block,)
+        )
+        block_size = min(self.BLOCK_SIZE, num_rows - block * self.BLOCK_SIZE)
+
+        values = self._generate(
+            num_samples=block_size, rng=np.random.default_rng(block_seed_sequence), fixed_bounds=True
+        )
+
+        self._cached_block = (block, num_rows, values)
+
+        return values
+
+    def generate_range(self, start: int, stop: int, rng: np.random.Generator = None, num_rows: int = None
+                       ) -> np.ndarray:
+        """Generates only the rows [start, stop) of the data, as a shard of a bigger generation. The values are drawn
+        from the given random generator and scaled with fixed bounds, so they do not depend on the rest of shards.
+
+        If the generator is seeded, the given random generator is ignored: the rows are split in blocks of
+        `DataTypeGenerator.BLOCK_SIZE` rows, each one drawn from its own stream, so the same rows are generated no
+        matter how the generation is split. In that case num_rows (the total number of rows, by default stop) must be
+        the same for all the ranges.
+        """
+
+        if not self.seeded:
+            return self._generate(num_samples=stop - start, rng=rng, fixed_bounds=True)
+
+        num_rows = stop if num_rows is None else num_rows
+
+        if start >= stop:
+            return self._generate(num_samples=0, rng=np.random.default_rng(self.seed_sequence), fixed_bounds=True)
+
+        first_block = start // self.BLOCK_SIZE
+        last_block = (stop - 1) // self.BLOCK_SIZE
+
+        blocks = [self._generate_block(block=block, num_rows=num_rows) for block in range(first_block, last_block + 1)]
+        values = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+
+        offset = first_block * self.BLOCK_SIZE
+
+        return values[start - offset:stop - offset]
 
 
 class BaseTypeDataTypeGenerator(DataTypeGenerator):
@@ -133,55 +204,55 @@ class BaseTypeDataTypeGenerator(DataTypeGenerator):
         self.start = start
         self.data_type = data_type
 
-    def _generate_ints(self, num_samples: int) -> List[int]:
+    def _generate_ints(self, num_samples: int, rng: np.random.Generator = None, fixed_bounds: bool = False) -> np.ndarray:
 
         # load configuration
         end_value = self.end
         start_value = self.start
 
         # build distribution values
-        values = self.distribution_generator.generate(
-            min_value=start_value, max_value=end_value, num_samples=num_samples
+        values = self.distribution_generator.generate_array(
+            min_value=start_value, max_value=end_value, num_samples=num_samples, rng=rng, fixed_bounds=fixed_bounds
         )
 
-        # build values
-        int_values = [int(value) for value in values]
+        # build values (truncating towards zero, as int does)
+        int_values = values.astype(np.int64)
 
         return int_values
 
-    def _generate_floats(self, num_samples: int) -> List[float]:
+    def _generate_floats(self, num_samples: int, rng: np.random.Generator = None, fixed_bounds: bool = False) -> np.ndarray:
 
         # load configuration
         end_value = self.end
         start_value = self.start
 
         # build distribution values
-        values = self.distribution_generator.generate(
-            min_value=start_value, max_value=end_value, num_samples=num_samples)
+        values = self.distribution_generator.generate_array(
+            min_value=start_value, max_value=end_value, num_samples=num_samples, rng=rng, fixed_bounds=fixed_bounds)
 
         # build values
-        float_values = [float(value) for value in values]
+        float_values = values.astype(np.float64, copy=False)
 
         return float_values
 
-    def _generate_booleans(self, num_samples: int) -> List[int]:
+    def _generate_booleans(self, num_samples: int, rng: np.random.Generator = None, fixed_bounds: bool = False) -> np.ndarray:
 
         # load configuration
         end_value = self.end
         start_value = self.start
 
         # build distribution values
-        values = self.distribution_generator.generate(
-            min_value=start_value, max_value=end_value, num_samples=num_samples
+        values = self.distribution_generator.generate_array(
+            min_value=start_value, max_value=end_value, num_samples=num_samples, rng=rng, fixed_bounds=fixed_bounds
         )
 
-        # build values
-        mean_value = np.mean(values)
-        boolean_values = [(value > mean_value) for value in values]
+        # build values (with fixed bounds the mean of the distribution is used, as the values are only a part of them)
+        mean_value = self.distribution_generator.scaled_mean(start_value, end_value) if fixed_bounds or len(values) == 0 else np.mean(values)
+        boolean_values = values > mean_value
 
         return boolean_values
 
-    def _generate_datetimes(self, num_samples: int) -> List[datetime]:
+    def _generate_datetimes(self, num_samples: int, rng: np.random.Generator = None, fixed_bounds: bool = False) -> np.ndarray:
 
         # load configuration
         end_datetime = datetime.fromisoformat(self.end)
@@ -192,35 +263,38 @@ class BaseTypeDataTypeGenerator(DataTypeGenerator):
         num_seconds = dates_substraction.total_seconds()
 
         # build distribution values
-        values = self.distribution_generator.generate(
-            min_value=0, max_value=num_seconds, num_samples=num_samples)
+        values = self.distribution_generator.generate_array(
+            min_value=0, max_value=num_seconds, num_samples=num_samples, rng=rng, fixed_bounds=fixed_bounds)
 
         # build values
-        fixed_values = [int(value) for value in values]
-        delta_values = [timedelta(seconds=fixed_value) for fixed_value in fixed_values]
-        date_values = [(start_datetime + delta_value) for delta_value in delta_values]
+        delta_values = values.astype(np.int64).astype('timedelta64[s]')
+
+        if start_datetime.tzinfo is None:
+            date_values = np.datetime64(start_datetime, 'us') + delta_values
+        else:
+            # numpy datetimes are naive, so timezone aware dates are kept as datetime objects
+            date_values = start_datetime + delta_values.astype(object)
 
         return date_values
 
-    def generate(self, num_samples: int) -> None:
-        """Generates the data
-        """
+    def _generate(self, num_samples: int, rng: np.random.Generator = None, fixed_bounds: bool = False
+                  ) -> np.ndarray:
 
         if self.data_type == DataType.int_:
             values = self._generate_ints(
-                num_samples=num_samples
+                num_samples=num_samples, rng=rng, fixed_bounds=fixed_bounds
             )
         elif self.data_type == DataType.float_:
             values = self._generate_floats(
-                num_samples=num_samples
+                num_samples=num_samples, rng=rng, fixed_bounds=fixed_bounds
             )
         elif self.data_type == DataType.boolean_:
             values = self._generate_booleans(
-                num_samples=num_samples
+                num_samples=num_samples, rng=rng, fixed_bounds=fixed_bounds
             )
         elif self.data_type == DataType.datetime_:
             values = self._generate_datetimes(
-                num_samples=num_samples
+                num_samples=num_samples, rng=rng, fixed_bounds=fixed_bounds
             )
         else:
             raise ValueError(f'Unable to instance generator for not recognized base data type: "{self.data_type}".')
@@ -235,35 +309,82 @@ class CollectionDataTypeGenerator(DataTypeGenerator):
         super().__init__(*args, **kwargs)
         self.collection_values = collection_values
 
-    def generate(self, num_samples: int
-                 ) -> List[Any]:
+    def _generate(self, num_samples: int, rng: np.random.Generator = None, fixed_bounds: bool = False
+                  ) -> np.ndarray:
 
         # load configuration
         start_value = 0
         end_value = len(self.collection_values)
 
         # build distribution values
-        values = self.distribution_generator.generate(
-            min_value=start_value, max_value=end_value, num_samples=num_samples)
+        values = self.distribution_generator.generate_array(
+            min_value=start_value, max_value=end_value, num_samples=num_samples, rng=rng, fixed_bounds=fixed_bounds)
 
-        # build values
-        index_values = [int(value) for value in values]
-        collection_values = [self.collection_values[i] for i in index_values]
+        # build values (the end of the range is clipped into the last element)
+        index_values = np.minimum(values.astype(np.int64), end_value - 1)
+        collection_values = np.asarray(self.collection_values, dtype=object)[index_values]
 
         return collection_values
 
 
 class GenerableDataTypeGenerator(DataTypeGenerator):
 
-    def __init__(self, generable_expression: str, *args, **kwargs
+    def __init__(self, generable_expression: str, sampler: RegexSampler = None, *args, **kwargs
                  ) -> None:
         super().__init__(*args, **kwargs)
         self.generable_expression = generable_expression
+        self.sampler = sampler if sampler is not None else RegexSampler(generable_expression)
 
-    def generate(self, num_samples: int
-                 ) -> List[Any]:
+    def _generate(self, num_samples: int, rng: np.random.Generator = None, fixed_bounds: bool = False
+                  ) -> np.ndarray:
 
         # build values
-        generable_values = [rstr.xeger(self.generable_expression) for _ in range(num_samples)]
+        generable_values = self.sampler.sample(num_samples=num_samples, rng=rng)
 
         return generable_values
+
+
+class ReferenceDataTypeGenerator(DataTypeGenerator):
+    """Samples the values of a referencing field from the values of the referenced one following the distribution,
+    instead of crossing them with the rest of the dependencies. The referenced values must be bound before generating.
+    """
+
+    def __init__(self, fan_out: float = 1.0, num_rows: int = None, *args, **kwargs
+                 ) -> None:
+        super().__init__(*args, **kwargs)
+        self.fan_out = fan_out
+        self.num_rows = num_rows
+        self.referenced_values = None
+
+    def bind(self, referenced_values: np.ndarray) -> None:
+        self.referenced_values = referenced_values
+
+    def count_rows(self) -> int:
+        """Returns the number of rows of the referencing table: the given one, or the needed to reference each
+        referenced value fan_out times on average.
+        """
+
+        if self.num_rows is not None:
+            return self.num_rows
+
+        return int(round(self.fan_out * len(self.referenced_values)))
+
+    def _generate(self, num_samples: int, rng: np.random.Generator = None, fixed_bounds: bool = False
+                  ) -> np.ndarray:
+
+        if self.referenced_values is None:
+            raise ValueError('Unable to sample the referenced values, as they have not been bound.')
+
+        # load configuration
+        start_value = 0
+        end_value = len(self.referenced_values)
+
+        # build distribution values
+        values = self.distribution_generator.generate_array(
+            min_value=start_value, max_value=end_value, num_samples=num_samples, rng=rng, fixed_bounds=fixed_bounds)
+
+        # build values (the end of the range is clipped into the last referenced value)
+        index_values = np.minimum(values.astype(np.int64), end_value - 1)
+        referenced_values = self.referenced_values[index_values]
+
+        return referenced_values
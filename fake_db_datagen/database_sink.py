@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+# Copyright 2023 Francisco Pinto Santos
+# See LICENSE for details.
+# Author: Francisco Pinto Santos (@GandalFran on GitHub)
+
+
+import io
+import queue
+import sys
+import threading
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from . import logger
+from .data_formatter import CopyDataFormatter
+from .directive_builder import GeneratorDirective
+
+
+class DatabaseSink:
+    """Inserts the generated data of the directives directly into a database, through the DB-API connections built
+    with the given factory.
+
+    The directives are inserted level by level (see `DirectiveBuilder._calculate_sequence`), so the referenced
+    tables are inserted before the ones referencing them, inserting the independent tables of each level in parallel
+    with a pool of `workers` threads. Each thread opens its own connection, used for all the tables it inserts (so
+    drivers whose connections can not be shared among threads, as sqlite3, can be used). Each table is inserted in
+    batches with `executemany` (or with `COPY` for the psycopg drivers), and committed once inserted.
+
+    Note: the tables must already exist in the database.
+    """
+
+    # number of rows inserted at once when the data of the directive is already generated
+    INSERT_BATCH_SIZE = 10000
+
+    PLACEHOLDERS = {'qmark': '?', 'format': '%s', 'pyformat': '%s', 'numeric': ':{position}', 'named': ':{field}'}
+
+    def __init__(self, connection_factory: Callable[[], Any], workers: int = None, paramstyle: str = None
+                 ) -> None:
+        """If paramstyle is not given, the one of the driver of the connections is used.
+        """
+
+        if workers is not None and workers <= 0:
+            raise ValueError(f'The number of workers must be a positive number, but {workers} was given.')
+
+        if paramstyle is not None and paramstyle not in self.PLACEHOLDERS:
+            raise ValueError(f'The parameter style {paramstyle} is not recognized. Please select one of {", ".join(self.PLACEHOLDERS)}.')
+
+        self.connection_factory = connection_factory
+        self.workers = workers if workers is not None else 1
+        self.paramstyle = paramstyle
+
+        self._copy_formatter = CopyDataFormatter()
+
+    def _resolve_paramstyle(self, connection: Any) -> str:
+
+        if self.paramstyle is not None:
+            return self.paramstyle
+
+        driver = sys.modules.get(type(connection).__module__.split('.')[0])
+
+        return getattr(driver, 'paramstyle', 'qmark')
+
+    def _format_insert(self, table_name: str, fields: List[str], paramstyle: str
+                       ) -> str:
+
+        placeholders = [self.PLACEHOLDERS[paramstyle].format(position=i + 1, field=field) for i, field in enumerate(fields)]
+
+        return f'INSERT INTO {table_name}({",".join(fields)}) VALUES ({",".join(placeholders)})'
+
+    def _insert_batch(self, cursor: Any, table_name: str, batch: Dict[str, np.ndarray], paramstyle: str
+                      ) -> None:
+
+        fields = list(batch.keys())
+
+        # the psycopg drivers load the rows in the COPY text format
+
+        if type(cursor).__module__.split('.')[0] in ('psycopg2', 'psycopg'):
+
+            statement = self._copy_formatter.copy_statement(table_name=table_name, fields=fields)
+            rows = self._copy_formatter.format_rows(data=batch)
+
+            if hasattr(cursor, 'copy_expert'):  # psycopg2
+                cursor.copy_expert(statement, io.StringIO(rows))
+            else:  # psycopg 3
+                with cursor.copy(statement) as copy:
+                    copy.write(rows)
+
+            return
+
+        # numpy values into python ones (i.e. datetime64 into datetime), transposed into rows
+        columns = [np.asarray(column).tolist() for column in batch.values()]
+
+        if paramstyle == 'named':
+            rows = [dict(zip(fields, row)) for row in zip(*columns)]
+        else:
+            rows = list(zip(*columns))
+
+        cursor.executemany(self._format_insert(table_name=table_name, fields=fields, paramstyle=paramstyle), rows)
+
+    def write(self, connection: Any, directive: GeneratorDirective, batch_size: int = None
+              ) -> int:
+        """Inserts the directive in batches with the given connection, returning the number of inserted rows. If
+        batch_size is None, the directive is generated at once and inserted in slices.
+        """
+
+        if batch_size is None:
+            directive.fetch()
+            batch_size = self.INSERT_BATCH_SIZE
+
+        paramstyle = self._resolve_paramstyle(connection)
+        cursor = connection.cursor()
+        num_rows = 0
+
+        logger.info(f'inserting directive {directive.name}')
+
+        try:
+
+            for batch in directive.iter_batches(batch_size=batch_size):
+                self._insert_batch(cursor=cursor, table_name=directive.name, batch=batch, paramstyle=paramstyle)
+                num_rows += len(next(iter(batch.values()))) if batch else 0
+
+            connection.commit()
+
+        except Exception as e:
+            connection.rollback()
+            raise Exception(f'Unable to insert the data of the table {directive.name}: {e}') from e
+
+        finally:
+            cursor.close()
+
+        logger.debug(f'inserted {num_rows} rows into {directive.name}')
+
+        return num_rows
+
+    def _work(self, tasks: queue.Queue, results: queue.Queue, batch_size: int = None
+              ) -> None:
+        """Inserts the directives of the tasks queue until a None is received, with a connection opened on the first
+        task and closed at the end.
+        """
+
+        connection = None
+
+        try:
+
+            while True:
+
+                directive = tasks.get()
+
+                if directive is None:
+                    break
+
+                try:
+
+                    if connection is None:
+                        connection = self.connection_factory()
+
+                    results.put((directive, self.write(connection=connection, directive=directive, batch_size=batch_size), None))
+
+                except Exception as e:
+                    results.put((directive, None, e))
+
+        finally:
+
+            if connection is not None:
+                connection.close()
+
+    def write_all(self, directives: List[GeneratorDirective], batch_size: int = None
+                  ) -> Dict[str, int]:
+        """Inserts all the directives level by level, returning the number of inserted rows of each table.
+        """
+
+        levels = {}
+
+        for directive in sorted(directives, key=lambda directive: directive.index):
+
+            if directive.level is None:
+                raise ValueError(f'The directive {directive.name} has no level assigned. Please build the directives with the DirectiveBuilder.')
+
+            levels.setdefault(directive.level, []).append(directive)
+
+        tasks = queue.Queue()
+        results = queue.Queue()
+        workers = [
+            threading.Thread(target=self._work, args=(tasks, results, batch_size), daemon=True)
+            for _ in range(self.workers)
+        ]
+
+        for worker in workers:
+            worker.start()
+
+        inserted_rows = {}
+
+        try:
+
+            for level in sorted(levels):
+
+                logger.info(f'inserting {len(levels[level])} directives of level {level} with {self.workers} connections')
+
+                for directive in levels[level]:
+                    tasks.put(directive)
+
+                errors = []
+
+                for _ in levels[level]:
+
+                    directive, num_rows, error = results.get()
+
+                    if error is not None:
+                        errors.append(error)
+                    else:
+                        inserted_rows[directive.name] = num_rows
+
+                # the next levels are not inserted, as they reference the failed ones
+                if errors:
+                    raise errors[0]
+
+        finally:
+
+            for _ in workers:
+                tasks.put(None)
+
+            for worker in workers:
+                worker.join()
+
+        return inserted_rows
@@ -162,7 +162,7 @@ def serve_default_config():
                 "id": {
                     "pattern": "((.*)?id(.*)?)",
                     "samples": 10,
-                    "generator": "[0-9]{10}", "priority": -2
+                    "generator": "[0-9]{9}", "priority": -2
                 },
                 "uuid": {
                     "pattern": "((.*)?uuid(.*)?)|((.*)?uid(.*)?)",
@@ -4,47 +4,150 @@
 # Author: Francisco Pinto Santos (@GandalFran on GitHub)
 
 
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Tuple
 
-from pydbml import PyDBML
+import numpy as np
 
 from . import logger
-from .data_types_generator import DataTypeGenerator
+from .config_builder import ConfigurationError
+from .dag import DependencyGraph
+from .data_types_generator import DataTypeGenerator, ReferenceDataTypeGenerator
 from .distribution import DistributionGenerator, DistributionType
+from .metrics import Measurement
+from .schema import Schema
 
 
 class GeneratorDirectiveDependency:
+    """Reference of a field to a field of other directive. By default the referenced values are crossed with the rest
+    of the dependencies, but if a generator is given they are sampled by it instead.
+    """
 
-    def __init__(self, referenced_field: str, referenced_directive: 'GeneratorDirective'
+    def __init__(self, referenced_field: str, referenced_directive: 'GeneratorDirective', generator: ReferenceDataTypeGenerator = None
                  ) -> None:
 
         if referenced_field is None or referenced_directive is None:
-            raise Exception('TODO: eliminar. Mala construccion de depenencias')
+            raise ValueError('Unable to build the dependency: both the referenced field and the referenced directive must be given.')
 
         self.referenced_field = referenced_field
         self.referenced_directive = referenced_directive
+        self.generator = generator
+
+    @property
+    def sampled(self) -> bool:
+        return self.generator is not None
+
+
+class DependencyProduct:
+    """Lazy cartesian product of the values of the crossed dependencies, with num_samples rows for each combination.
+
+    The values of each row are computed from its index (the first dependency is the one changing faster), so only the
+    requested rows are built instead of the whole product.
+    """
+
+    def __init__(self, dependencies_values: Dict[str, np.ndarray], num_samples: int
+                 ) -> None:
+
+        self.num_samples = num_samples
+        self.dependencies_values = dependencies_values
+        self.num_combinations = 1
+
+        for dependency_values in dependencies_values.values():
+            self.num_combinations *= len(dependency_values)
+
+    def __len__(self) -> int:
+        return self.num_samples * self.num_combinations
+
+    def take(self, start: int, stop: int
+             ) -> Dict[str, np.ndarray]:
+        """Builds the rows [start, stop) of the dependency columns.
+        """
+
+        if not self.dependencies_values:
+            return {}
+
+        dependency_columns = {}
+        stride = 1
+
+        # the whole product is built repeating and tiling the values, as it is cheaper than indexing each row
+
+        if start == 0 and stop == len(self):
+
+            for field_name, dependency_values in self.dependencies_values.items():
+
+                num_repetitions = self.num_samples * stride
+                num_tiles = self.num_combinations // (stride * len(dependency_values)) if dependency_values.size else 0
+                dependency_columns[field_name] = np.tile(np.repeat(dependency_values, num_repetitions), num_tiles)
+
+                stride *= len(dependency_values)
+
+            return dependency_columns
+
+        combination_indexes = np.arange(start, stop) // self.num_samples
+
+        for field_name, dependency_values in self.dependencies_values.items():
+
+            value_indexes = (combination_indexes // stride) % len(dependency_values)
+            dependency_columns[field_name] = dependency_values[value_indexes]
+
+            stride *= len(dependency_values)
+
+        return dependency_columns
 
 
 class GeneratorDirective:
 
-    def __init__(self, index: int, name: str, num_samples: int, fields: Dict[str, DataTypeGenerator], dependencies: Dict[str, GeneratorDirectiveDependency]):
+    def __init__(self, index: int, name: str, num_samples: int, fields: Dict[str, DataTypeGenerator], dependencies: Dict[str, GeneratorDirectiveDependency], level: int = None, column_types: Dict[str, str] = None):
 
         self.index = index
+        self.level = level
         self.name = name
         self.fields = fields
         self.num_samples = num_samples
         self.dependencies = dependencies if dependencies is not None else {}
+        self.column_types = column_types if column_types is not None else {}
+        self.referenced_fields = set()
+
+        # measurements of the generation of the directive and its fields, accumulated over the batches or shards, and
+        # passed to the listener (if any) as they are added
+        self.measurements = {}
+        self.measurement_listener = None
 
         self._generated_data = None
+        self._retained_data = {}
+
+    @property
+    def generators(self) -> Dict[str, DataTypeGenerator]:
+        """Returns the generators of the fields, including the ones of the sampled dependencies.
+        """
+
+        sampled_generators = {
+            field_name: dependency.generator
+            for field_name, dependency in self.dependencies.items() if dependency.sampled
+        }
+
+        return {**self.fields, **sampled_generators}
+
+    def add_measurements(self, measurements: Dict[str, Measurement]) -> None:
+        """Accumulates the given measurements (i.e. measured by other process) into the ones of the directive.
+        """
+
+        for name, measurement in measurements.items():
 
-    def __generate_dependencies_entries(self) -> List[Dict[str, Any]]:
+            if name not in self.measurements:
+                self.measurements[name] = Measurement(scope=measurement.scope, name=measurement.name)
 
-        # auxiliar functions
+            self.measurements[name].add(measurement)
 
-        def _clone_entries(entries):
-            return [{k: v for k, v in e.items()} for e in entries]
+            if self.measurement_listener is not None:
+                self.measurement_listener(measurement)
+
+    def __build_dependency_product(self) -> DependencyProduct:
+        """Fetches the values of the dependencies: the sampled ones are bound to their generators and the rest are
+        crossed in a lazy product. If all of them are sampled, the number of rows is given by their fan-out.
+        """
 
-        dependency_entries = []
+        dependencies_values = {}
+        sampled_num_rows = []
 
         for field_name, dependency in self.dependencies.items():
 
@@ -55,202 +158,274 @@ class GeneratorDirective:
 
             logger.debug(f'retrieving samples from {dependency_directive.name}.{dependency_field} for field {self.name}.{field_name}')
 
-            dependency_values = dependency_directive.fetch_field(field=dependency_field)
+            dependency_values = np.asarray(dependency_directive.fetch_field(field=dependency_field))
 
-            # calculate new dependency_entries
+            if dependency.sampled:
 
-            dependency_values_entries = [{field_name: value} for value in dependency_values]
+                dependency.generator.bind(dependency_values)
+                num_rows = dependency.generator.count_rows()
 
-            # if dependency_entries is empty, set new dependency_entries as the current ones
-            # if dependency_entries is not empty, cross the existing dependencies with the new ones
+                if num_rows > 0 and len(dependency_values) == 0:
+                    raise ConfigurationError(
+                        config_path=[self.name, field_name, 'sampling'], error=f'Unable to sample {num_rows} rows referencing {dependency_directive.name}.{dependency_field}, as it has no rows.'
+                    )
 
-            if not dependency_entries:
-                dependency_entries = dependency_values_entries
+                sampled_num_rows.append(num_rows)
             else:
+                dependencies_values[field_name] = dependency_values
 
-                new_dependency_entries = []
+        num_samples = max(sampled_num_rows) if sampled_num_rows and not dependencies_values else self.num_samples
 
-                for dependency_entry in dependency_values_entries:
-                    current_dependency_entry_entries = [{**dependency_entry, **entry} for entry in _clone_entries(dependency_entries)]
-                    new_dependency_entries.extend(current_dependency_entry_entries)
+        return DependencyProduct(dependencies_values=dependencies_values, num_samples=num_samples)
 
-                dependency_entries = new_dependency_entries
+    def __generate_value_columns(self, start: int, stop: int, num_rows: int
+                                 ) -> Dict[str, np.ndarray]:
+        """Generates the rows [start, stop) of the value columns, from num_rows rows in total (only needed to place the
+        rows of the seeded fields).
+        """
 
-        return dependency_entries
+        value_columns = {}
 
-    def __generate_value_entries(self, num_samples: int
-                                 ) -> List[Dict[str, Any]]:
+        for field, generator in self.generators.items():
 
-        value_entries_dict = {}
+            logger.debug(f'generating {stop - start} samples for field {self.name}.{field}')
 
-        for field in self.fields:
+            with Measurement.measure(scope=Measurement.FIELD, name=f'{self.name}.{field}') as measurement:
 
-            logger.debug(f'generating {num_samples} samples for field {self.name}.{field}')
+                if generator.seeded:
+                    value_columns[field] = generator.generate_range(start=start, stop=stop, num_rows=num_rows)
+                else:
+                    value_columns[field] = generator.generate(num_samples=stop - start)
 
-            field_values = self.fields.get(field).generate(num_samples=num_samples)
-            value_entries_dict[field] = field_values
+                measurement.rows = stop - start
 
-        # format fields into entries
+            self.add_measurements({measurement.name: measurement})
 
-        logger.debug(f'preparing generated entries of {self.name} to cross with dependency entries')
+        return value_columns
 
-        value_entries = [{k: value_entries_dict[k][i] for k in value_entries_dict} for i in range(num_samples)]
+    def generate(self) -> None:
 
-        return value_entries
+        logger.info(f'generating data for directive {self.name}')
 
-    def __cross_dependency_and_value_entries(self, dependencies_entries: List[Dict[str, Any]], value_entries: List[Dict[str, Any]]
-                                             ) -> List[Dict[str, Any]]:
+        with Measurement.measure(scope=Measurement.DIRECTIVE, name=self.name) as measurement:
 
-        # auxiliar functions
+            # calculate the dependencies
 
-        def _chunk_list(list_, chunk_size):
-            return [list_[i:i + chunk_size] for i in range(0, len(list_), chunk_size)]
+            dependency_product = self.__build_dependency_product()
+            num_rows = len(dependency_product)
 
-        # split the value entries in chunks of size self.num_samples, because there is that number of samples assigned
-        # for each entry of the dependencies entries
+            # generate common fields (and the sampled dependencies)
 
-        chunked_value_entries = _chunk_list(value_entries, self.num_samples)
+            logger.debug(f'generating {num_rows} samples of common fields')
 
-        # merge two lists replicating each dependency_entry
+            value_columns = self.__generate_value_columns(start=0, stop=num_rows, num_rows=num_rows)
 
-        entries = []
+            # cross generated values, as there are self.num_samples samples assigned for each dependencies combination
 
-        for dependency_entry, value_entries_chunk in zip(dependencies_entries, chunked_value_entries):
+            logger.debug('crossing with dependency columns with generated values')
 
-            new_entries = [{**dependency_entry, **value_entry} for value_entry in value_entries_chunk]
-            entries.extend(new_entries)
+            dependency_columns = dependency_product.take(start=0, stop=num_rows)
 
-        return entries
+            measurement.rows = num_rows
 
-    def generate(self) -> List[Dict[str, Any]]:
+        self.add_measurements({measurement.name: measurement})
 
-        logger.info(f'generating data for directive {self.name}')
+        self._generated_data = {**value_columns, **dependency_columns}
 
-        if self.dependencies:
+    def count_rows(self) -> int:
+        """Returns the number of rows of the directive, being num_samples for each combination of the crossed
+        dependencies (or the rows given by the fan-out of the sampled ones, if all of them are sampled).
+        """
 
-            # calculate the dependencies
+        return len(self.__build_dependency_product())
 
-            logger.debug('crossing dependencies entries')
+    def generate_range(self, start: int, stop: int, seed_sequence: np.random.SeedSequence
+                       ) -> Dict[str, np.ndarray]:
+        """Generates the rows [start, stop) of the directive as an independent shard, drawing each field from its own
+        random stream derived from the given seed sequence (or from the own seed sequence of the field, if it is
+        seeded). The generated rows are returned, not stored.
+        """
 
-            dependencies_entries = self.__generate_dependencies_entries()
+        logger.debug(f'generating rows [{start}, {stop}) of directive {self.name}')
 
-            num_samples = self.num_samples * len(dependencies_entries)
+        with Measurement.measure(scope=Measurement.DIRECTIVE, name=self.name) as measurement:
 
-            # generate common fields
+            dependency_product = self.__build_dependency_product()
+            num_rows = len(dependency_product)
 
-            logger.debug(f'generating {num_samples} samples of common fields')
+            generators = self.generators
+            field_seed_sequences = seed_sequence.spawn(len(generators))
+            value_columns = {}
 
-            value_entries = self.__generate_value_entries(num_samples=num_samples)
+            for (field, generator), field_seed_sequence in zip(generators.items(), field_seed_sequences):
 
-            # cross generated values
+                with Measurement.measure(scope=Measurement.FIELD, name=f'{self.name}.{field}') as field_measurement:
+                    value_columns[field] = generator.generate_range(start=start, stop=stop, rng=np.random.default_rng(field_seed_sequence), num_rows=num_rows)
+                    field_measurement.rows = stop - start
 
-            logger.debug('crossing with dependency entries with generated entry values')
+                self.add_measurements({field_measurement.name: field_measurement})
 
-            entries = self.__cross_dependency_and_value_entries(
-                dependencies_entries=dependencies_entries, value_entries=value_entries
-            )
+            dependency_columns = dependency_product.take(start=start, stop=stop)
 
-        else:
+            measurement.rows = stop - start
 
-            # generate common fields directly
+        self.add_measurements({measurement.name: measurement})
 
-            logger.debug(f'no dependencies found, generating ({self.num_samples}) of common fields.')
+        return {**value_columns, **dependency_columns}
 
-            entries = self.__generate_value_entries(num_samples=self.num_samples)
+    def iter_batches(self, batch_size: int
+                     ) -> Iterator[Dict[str, np.ndarray]]:
+        """Generates the data in batches of at most batch_size rows, without keeping them in memory.
 
-        # format entries for its final value
+        Only the fields referenced by other directives are retained, so the dependant directives can be generated
+        (or streamed) afterwards against the already generated keys.
+        """
 
-        logger.debug('formatting generated dependencies.')
+        if batch_size is None or batch_size <= 0:
+            raise ValueError(f'The batch size must be a positive number, but {batch_size} was given.')
 
-        all_fields = list(self.fields) + list(self.dependencies)
+        # if the data is already available, it is served sliced
 
-        self._generated_data = {
-            field: [entry[field] for entry in entries]
-            for field in all_fields
-        }
+        if self._generated_data is not None:
 
-    def fetch(self) -> Dict[str, List[Any]]:
+            num_rows = len(next(iter(self._generated_data.values()))) if self._generated_data else 0
 
-        if self._generated_data is None:
-            self.generate()
+            for start in range(0, num_rows, batch_size):
+                yield {field: column[start:start + batch_size] for field, column in self._generated_data.items()}
 
-        return self._generated_data
+            return
 
-    def fetch_field(self, field: str) -> List[Any]:
+        logger.info(f'generating data for directive {self.name} in batches of {batch_size}')
 
-        if field not in self.fields and field not in self.dependencies:
-            raise ValueError(f'The requested field "{field}" is not available in the directive "{self.name}". Only there is available "{", ".join([f for f in self.fields.keys()])}" and "{", ".join([f for f in self.dependencies.keys()])}".')
+        # the dependencies are resolved against the keys of the referenced directives
 
-        return self.fetch().get(field)
+        with Measurement.measure(scope=Measurement.DIRECTIVE, name=self.name) as measurement:
+            dependency_product = self.__build_dependency_product()
+            num_rows = len(dependency_product)
 
-    def reset(self) -> None:
-        logger.debug(f'reset data from {self.table}')
-        self._generated_data = None
+        self.add_measurements({measurement.name: measurement})
 
+        # generate each batch
 
-class DirectiveBuilder:
+        retained_chunks = {field: [] for field in self.referenced_fields}
 
-    def _calculate_dependencies(self, dbml: PyDBML
-                                ) -> Dict[str, List[str]]:
+        for start in range(0, num_rows, batch_size):
 
-        # extract all dependencies
+            stop = min(start + batch_size, num_rows)
+
+            logger.debug(f'generating rows [{start}, {stop}) of directive {self.name}')
+
+            with Measurement.measure(scope=Measurement.DIRECTIVE, name=self.name) as measurement:
+                value_columns = self.__generate_value_columns(start=start, stop=stop, num_rows=num_rows)
+                dependency_columns = dependency_product.take(start=start, stop=stop)
+                measurement.rows = stop - start
+
+            self.add_measurements({measurement.name: measurement})
+
+            batch = {**value_columns, **dependency_columns}
+
+            for field, chunks in retained_chunks.items():
+                chunks.append(batch[field])
+
+            yield batch
+
+        self._retained_data = {
+            field: np.concatenate(chunks) if chunks else np.array([])
+            for field, chunks in retained_chunks.items()
+        }
+
+    def load_data(self, data: Dict[str, np.ndarray]) -> None:
+        """Sets the generated data of the directive (i.e. generated by other process).
+        """
+
+        self._generated_data = data
+
+    def detach(self) -> 'GeneratorDirective':
+        """Builds a copy of the directive whose dependencies only keep the referenced columns instead of the whole
+        referenced directives, so it is cheap to send it to other processes.
+        """
 
         dependencies = {}
 
-        for table in dbml.tables:
+        for field_name, dependency in self.dependencies.items():
+
+            referenced_field = dependency.referenced_field
+            referenced_directive = dependency.referenced_directive
+
+            detached_referenced_directive = GeneratorDirective(
+                index=referenced_directive.index, name=referenced_directive.name, num_samples=referenced_directive.num_samples, fields={}, dependencies=None, level=referenced_directive.level
+            )
+            detached_referenced_directive.load_data({
+                referenced_field: referenced_directive.fetch_field(field=referenced_field)
+            })
+
+            dependencies[field_name] = GeneratorDirectiveDependency(
+                referenced_field=referenced_field, referenced_directive=detached_referenced_directive, generator=dependency.generator
+            )
+
+        detached_directive = GeneratorDirective(
+            index=self.index, name=self.name, num_samples=self.num_samples, fields=self.fields, dependencies=dependencies, level=self.level, column_types=self.column_types
+        )
+
+        return detached_directive
+
+    def fetch(self) -> Dict[str, np.ndarray]:
 
-            for ref in table.get_refs():
+        if self._generated_data is None:
+            self.generate()
+
+        return self._generated_data
 
-                ref_type = ref.type
+    def fetch_field(self, field: str) -> np.ndarray:
 
-                # note: table1 ref_type table2
+        if field not in self.fields and field not in self.dependencies and (self._generated_data is None or field not in self._generated_data):
+            raise ValueError(f'The requested field "{field}" is not available in the directive "{self.name}". Only there is available "{", ".join([f for f in self.fields.keys()])}" and "{", ".join([f for f in self.dependencies.keys()])}".')
 
-                if ref_type == '>':
+        if self._generated_data is None and field in self._retained_data:
+            return self._retained_data.get(field)
 
-                    referenced_table = ref.table2
-                    referencing_table = ref.table1
+        return self.fetch().get(field)
 
-                    referenced_columns = ref.col2
-                    referencing_columns = ref.col1
+    def reset(self) -> None:
+        logger.debug(f'reset data from {self.name}')
+        self._generated_data = None
+        self._retained_data = {}
+        self.measurements = {}
 
-                elif ref_type == '<':
 
-                    referenced_table = ref.table1
-                    referencing_table = ref.table2
+class DirectiveBuilder:
 
-                    referenced_columns = ref.col1
-                    referencing_columns = ref.col2
+    def _calculate_dependencies(self, schema: Schema
+                                ) -> Dict[str, List[str]]:
 
-                else:  # if is one to one, the main one is understood like the first one
+        # extract all dependencies
 
-                    referenced_table = ref.table2
-                    referencing_table = ref.table1
+        dependencies = {}
 
-                    referenced_columns = ref.col2
-                    referencing_columns = ref.col1
+        for reference in schema.references:
 
-                # get names
-                referenced_table = referenced_table.name
-                referencing_table = referencing_table.name
-                referenced_columns = [c.name for c in referenced_columns]
-                referencing_columns = [c.name for c in referencing_columns]
+            # get names
+            referenced_table = reference.referenced_table
+            referencing_table = reference.referencing_table
+            referenced_columns = reference.referenced_columns
+            referencing_columns = reference.referencing_columns
 
-                # get referenced_colum
-                referenced_column = referenced_columns[0]
+            # get referenced_colum
+            referenced_column = referenced_columns[0]
 
-                if len(referencing_columns) > 1:
-                    raise Exception(f'Generation Error: There is more than one column beign referenced by {referencing_table}.{referenced_column}. Concretelly {len(referencing_columns)} columns: {referencing_columns}.')
+            if len(referencing_columns) > 1:
+                raise Exception(f'Generation Error: There is more than one column beign referenced by {referencing_table}.{referenced_column}. Concretelly {len(referencing_columns)} columns: {referencing_columns}.')
 
-                # register references
+            # register references
 
-                if referencing_table not in dependencies:
+            if referencing_table not in dependencies:
 
-                    dependencies[referencing_table] = {}
+                dependencies[referencing_table] = {}
 
-                for referencing_column in referencing_columns:
-                    dependencies[referencing_table][referencing_column] = {
-                        'table': referenced_table, 'column': referenced_column
-                    }
+            for referencing_column in referencing_columns:
+                dependencies[referencing_table][referencing_column] = {
+                    'table': referenced_table, 'column': referenced_column
+                }
 
         # clean duplicated references
 
@@ -284,22 +459,44 @@ class DirectiveBuilder:
 
         return dependencies
 
-    def __build_directive_for_table(self, table: str, table_config: Dict[str, Dict[str, Any]], table_dependencices: Dict[str, Dict[str, Dict[str, str]]]
-                                    ) -> GeneratorDirective:
+    def __build_directive_for_table(self, table: str, table_config: Dict[str, Dict[str, Any]], table_dependencices: Dict[str, Dict[str, Dict[str, str]]], seed_sequence: np.random.SeedSequence = None
+                                    ) -> Tuple[GeneratorDirective, Dict[str, ReferenceDataTypeGenerator]]:
         """
 
-            Note: does not set dependencies.
+            Note: does not set dependencies, but returns the generators of the referencing fields to sample.
+            Note: if a seed sequence is given, a seed sequence is spawned from it for each field of the table.
         """
 
         fields = {}
+        reference_generators = {}
+        num_samples = None
+        field_seed_sequences = seed_sequence.spawn(len(table_config)) if seed_sequence is not None else [None] * len(table_config)
 
-        for field, field_configuration in table_config.items():
+        for (field, field_configuration), field_seed_sequence in zip(table_config.items(), field_seed_sequences):
 
             # look for depoendencies
             field_dependency = table_dependencices.get(field) if table_dependencices is not None else None
 
             if field_dependency is not None:
-                logger.debug(f'skipping field {table}.{field} due to external reference found to {field_dependency.get("table")}.{field_dependency.get("field")}')
+
+                sampling = field_configuration.get('sampling')
+
+                if sampling is not None:
+
+                    logger.debug(f'building reference sampler for field {table}.{field} referencing {field_dependency.get("table")}.{field_dependency.get("column")}')
+
+                    # the referenced values are sampled uniformly by default
+                    sampling_distribution = sampling.get('distribution') or {'type': 'uniform', 'config': None}
+                    sampling_distribution_generator = DistributionGenerator.build(
+                        distribution_type=DistributionType.from_str(sampling_distribution.get('type')), config=sampling_distribution.get('config')
+                    )
+
+                    reference_generators[field] = ReferenceDataTypeGenerator(
+                        fan_out=sampling.get('fan_out', 1.0), num_rows=sampling.get('rows'), distribution_generator=sampling_distribution_generator, seed_sequence=field_seed_sequence
+                    )
+                else:
+                    logger.debug(f'skipping field {table}.{field} due to external reference found to {field_dependency.get("table")}.{field_dependency.get("field")}')
+
                 continue
 
             # if there is no dependency, then build generator for field
@@ -315,8 +512,8 @@ class DirectiveBuilder:
 
             end = value.get('end') if value is not None else None
             start = value.get('start') if value is not None else None
-            distribution_type = distribution_info.get('start') if distribution_info is not None else None
-            distribution_config = distribution_info.get('start') if distribution_info is not None else None
+            distribution_type = distribution_info.get('type') if distribution_info is not None else None
+            distribution_config = distribution_info.get('config') if distribution_info is not None else None
             distribution_type = DistributionType.from_str(distribution_type)
 
             # instance distribution generator
@@ -327,7 +524,7 @@ class DirectiveBuilder:
             # instance data generator
 
             data_generator = DataTypeGenerator.build(
-                data_type=data_type, start=start, end=end, generable_expression=generable_expression, collection_values=collection_values, distribution_generator=distribution_generator
+                data_type=data_type, start=start, end=end, generable_expression=generable_expression, collection_values=collection_values, distribution_generator=distribution_generator, seed_sequence=field_seed_sequence
             )
 
             # add generator to generator_list
@@ -341,9 +538,9 @@ class DirectiveBuilder:
             index=None, name=table, num_samples=num_samples, fields=fields, dependencies=None
         )
 
-        return directive
+        return directive, reference_generators
 
-    def __build_dependencies_for_table_directive(self, table: str, directives: List[GeneratorDirective], table_dependencices: Dict[str, Dict[str, Dict[str, str]]]
+    def __build_dependencies_for_table_directive(self, table: str, directives: List[GeneratorDirective], table_dependencices: Dict[str, Dict[str, Dict[str, str]]], reference_generators: Dict[str, ReferenceDataTypeGenerator] = None
                                                  ) -> None:
 
         # build dependencies
@@ -359,16 +556,19 @@ class DirectiveBuilder:
             referenced_directive = directives.get(referenced_table)
 
             dependency_directive = GeneratorDirectiveDependency(
-                referenced_field=referenced_field, referenced_directive=referenced_directive
+                referenced_field=referenced_field, referenced_directive=referenced_directive, generator=reference_generators.get(field) if reference_generators is not None else None
             )
 
             dependencies[field] = dependency_directive
 
+            # keep track of the fields needed by other directives
+            referenced_directive.referenced_fields.add(referenced_field)
+
         # update directives in table's directive
 
         directives[table].dependencies = dependencies
 
-    def _build_directives(self, tables_config: Dict[str, Any], dependencies: Dict[str, List[str]]
+    def _build_directives(self, tables_config: Dict[str, Any], dependencies: Dict[str, List[str]], seed: int = None
                           ) -> Dict[str, Dict[str, str]]:
 
         # build directives and data generators for each column
@@ -376,8 +576,16 @@ class DirectiveBuilder:
         logger.debug('building data generators for each field not beign referenced. Also building directives for each table.')
 
         directives = {}
+        reference_generators = {}
+
+        # if there is a seed, a seed sequence is spawned for each table (and then for each field)
 
-        for table, table_config in tables_config.items():
+        if seed is not None:
+            table_seed_sequences = np.random.SeedSequence(seed).spawn(len(tables_config))
+        else:
+            table_seed_sequences = [None] * len(tables_config)
+
+        for (table, table_config), table_seed_sequence in zip(tables_config.items(), table_seed_sequences):
 
             logger.debug(f'building data generators for {table}')
 
@@ -387,11 +595,12 @@ class DirectiveBuilder:
 
             # build directive for table
 
-            directive = self.__build_directive_for_table(
-                table=table, table_config=table_config, table_dependencices=table_dependencices
+            directive, table_reference_generators = self.__build_directive_for_table(
+                table=table, table_config=table_config, table_dependencices=table_dependencices, seed_sequence=table_seed_sequence
             )
 
             directives[table] = directive
+            reference_generators[table] = table_reference_generators
 
         # build dependencies
 
@@ -408,7 +617,7 @@ class DirectiveBuilder:
                 logger.debug(f'populating directives\' dependencies for table {table}')
 
                 self.__build_dependencies_for_table_directive(
-                    table=table, directives=directives, table_dependencices=table_dependencices
+                    table=table, directives=directives, table_dependencices=table_dependencices, reference_generators=reference_generators.get(table)
                 )
 
             else:
@@ -421,89 +630,69 @@ class DirectiveBuilder:
 
         return directives
 
-    def _calculate_sequence(self, directives: List[GeneratorDirective], dependencies: Dict[str, Dict[str, str]]
+    def _calculate_sequence(self, directives: List[GeneratorDirective]
                             ) -> None:
+        """Sets the index and the level of each directive (see `DependencyGraph`), so each directive is after the
+        directives it depends on, and the directives in the same level are independent among them.
+        """
 
-        # format dependencies in the needed format
-
-        references = {}
-
-        for referencing_table, referencing_table_columns in dependencies.items():
-
-            for referencing_table_column, referencing_table_column_dependencies in referencing_table_columns.items():
-
-                referenced_table = referencing_table_column_dependencies.get('table')
-
-                if referenced_table not in references:
-                    references[referenced_table] = []
-
-                references[referenced_table].append(referencing_table)
-
-        # calculate all tables names
-
-        all_tables = [directive.name for directive in directives]
-
-        # calculate the table sequence
-
-        sequence = []
-
-        for table in all_tables:
-
-            # fetch references
-
-            table_referencing_tables = references.get(table)
-            table_referencing_tables = [] if table_referencing_tables is None else table_referencing_tables
-            table_referencing_tables_inserted = [referencing_table for referencing_table in table_referencing_tables if referencing_table in sequence]
-
-            # calculate index to insert
-
-            max_index = len(sequence)  # the maxium index to insert is the maximum
-            referencing_tables_indexes = [sequence.index(referencing_table) for referencing_table in table_referencing_tables_inserted]
-            possible_indexes_to_insert = [max_index] + [index + 1 for index in referencing_tables_indexes]
-
-            # select a position previous to all referencing tables (because the generation of that tables depends directly on current table)
-
-            index_to_insert = min(possible_indexes_to_insert)
-
-            # insert into sequence
+        graph = DependencyGraph({
+            directive.name: [
+                dependency.referenced_directive.name for dependency in directive.dependencies.values()
+                if dependency.referenced_directive is not directive
+            ]
+            for directive in directives
+        })
 
-            sequence.insert(index_to_insert, table)
+        levels = graph.levels()
+        indexes = {}
 
-        logger.debug(f'calculated directive sequence: {sequence}')
+        for level, level_tables in enumerate(levels):
+            for table in level_tables:
+                indexes[table] = (len(indexes), level)
 
-        # update directives
+        logger.debug(f'calculated directive levels: {levels}')
 
         for directive in directives:
+            directive.index, directive.level = indexes[directive.name]
 
-            position_in_sequence = sequence.index(directive.name)
-            directive.index = position_in_sequence
-
-    def build(self, dbml: PyDBML, config: Dict[str, Any]
+    def build(self, schema: Schema, config: Dict[str, Any], seed: int = None
               ) -> List[GeneratorDirective]:
+        """Builds the generation directives of the tables. If a seed is given, each field is seeded with its own
+        stream derived from it, so the generated data is reproducible, no matter how the generation is split.
+        """
 
         # create directives mixing the populate and the dependencies (to avoid multiple data generation)
 
         logger.debug('calculating dependencies')
         dependencies = self._calculate_dependencies(
-            dbml=dbml
+            schema=schema
         )
 
         # create directives mixing the populate and the dependencies (to avoid multiple data generation)
 
         logger.debug('instancing building directives')
         directives = self._build_directives(
-            tables_config=config, dependencies=dependencies
+            tables_config=config, dependencies=dependencies, seed=seed
         )
 
-        # order the tables in a inorder iteration (tree iteration) to generate first the tables with no dependencies
+        # order the tables to generate first the tables with no dependencies, grouping them in levels of independent
+        # tables to generate them in parallel
 
         logger.debug('calculating table sequency')
         self._calculate_sequence(
-            directives=directives, dependencies=dependencies
+            directives=directives
         )
 
+        # keep the DBML types of the columns (in the DBML order) of each table, used by the typed formats
+
+        tables_column_types = {table.name: {column.name: column.type for column in table.columns} for table in schema.tables}
+
+        for directive in directives:
+            directive.column_types = tables_column_types.get(directive.name, {})
+
         # sorty by table sequency
 
-        dependencies = list(sorted(directives, key=lambda x: x.index))
+        directives = list(sorted(directives, key=lambda x: x.index))
 
         return directives
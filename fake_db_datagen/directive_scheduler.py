@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+# Copyright 2023 Francisco Pinto Santos
+# See LICENSE for details.
+# Author: Francisco Pinto Santos (@GandalFran on GitHub)
+
+
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from . import logger
+from .directive_builder import GeneratorDirective
+from .metrics import Measurement
+
+
+def _initialize_worker() -> None:
+    """Reseeds the random generator of the worker, as forked workers inherit the state of the parent process.
+    """
+
+    np.random.seed()
+
+
+def _generate_directive_data(directive: GeneratorDirective
+                             ) -> Tuple[Dict[str, np.ndarray], Dict[str, Measurement]]:
+
+    directive.generate()
+
+    return directive.fetch(), directive.measurements
+
+
+def _generate_directive_shard(directive: GeneratorDirective, start: int, stop: int, seed_sequence: np.random.SeedSequence
+                              ) -> Tuple[Dict[str, np.ndarray], Dict[str, Measurement]]:
+
+    return directive.generate_range(start=start, stop=stop, seed_sequence=seed_sequence), directive.measurements
+
+
+class DirectiveScheduler:
+    """Generates the directives level by level (see `DirectiveBuilder._calculate_sequence`), generating the
+    independent directives of each level in parallel in a process pool.
+
+    If a shard size is given, the directives with more rows are also split into shards of that size, generated in
+    parallel with independent random streams derived from the master seed, and concatenated in order.
+    """
+
+    def __init__(self, workers: int = None, shard_size: int = None, seed: int = None
+                 ) -> None:
+
+        if shard_size is not None and shard_size <= 0:
+            raise ValueError(f'The shard size must be a positive number, but {shard_size} was given.')
+
+        self.workers = workers
+        self.shard_size = shard_size
+        self.seed_sequence = np.random.SeedSequence(seed)
+
+    def _group_by_level(self, directives: List[GeneratorDirective]
+                        ) -> List[List[GeneratorDirective]]:
+
+        levels = {}
+
+        for directive in directives:
+
+            if directive.level is None:
+                raise ValueError(f'The directive {directive.name} has no level assigned. Please build the directives with the DirectiveBuilder.')
+
+            levels.setdefault(directive.level, []).append(directive)
+
+        return [levels[level] for level in sorted(levels)]
+
+    def _split_in_shards(self, num_rows: int
+                         ) -> List[Tuple[int, int]]:
+
+        if self.shard_size is None or num_rows <= self.shard_size:
+            return []
+
+        return [(start, min(start + self.shard_size, num_rows)) for start in range(0, num_rows, self.shard_size)]
+
+    def _submit(self, executor: Executor, directive: GeneratorDirective
+                ) -> List[Future]:
+
+        # only the referenced columns of the dependencies are sent to the workers, and the generated columns are
+        # sent back as arrays (with the measurements of the generation)
+
+        detached_directive = directive.detach()
+        shards = self._split_in_shards(num_rows=directive.count_rows())
+
+        if not shards:
+            return [executor.submit(_generate_directive_data, detached_directive)]
+
+        logger.info(f'generating directive {directive.name} in {len(shards)} shards')
+
+        shard_seed_sequences = self.seed_sequence.spawn(len(shards))
+
+        return [
+            executor.submit(_generate_directive_shard, detached_directive, start, stop, shard_seed_sequence)
+            for (start, stop), shard_seed_sequence in zip(shards, shard_seed_sequences)
+        ]
+
+    def run(self, directives: List[GeneratorDirective]
+            ) -> None:
+
+        levels = self._group_by_level(directives=directives)
+
+        if self.workers is not None and self.workers <= 1:
+
+            logger.debug('generating directives serially')
+
+            for level_directives in levels:
+                for directive in level_directives:
+                    directive.generate()
+
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_initialize_worker) as executor:
+
+            for level, level_directives in enumerate(levels):
+
+                logger.info(f'generating {len(level_directives)} directives of level {level} in parallel')
+
+                futures = [
+                    (directive, self._submit(executor=executor, directive=directive))
+                    for directive in level_directives
+                ]
+
+                for directive, directive_futures in futures:
+
+                    results = []
+
+                    for future in directive_futures:
+                        data, measurements = future.result()
+                        results.append(data)
+                        directive.add_measurements(measurements)
+
+                    if len(results) == 1:
+                        directive.load_data(results[0])
+                    else:
+                        directive.load_data({
+                            field: np.concatenate([result[field] for result in results])
+                            for field in results[0]
+                        })
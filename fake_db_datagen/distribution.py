@@ -14,6 +14,8 @@ class DistributionType(enum.Enum):
 
     normal = 'normal'
     log = 'log'
+    uniform = 'uniform'
+    zipf = 'zipf'
 
     @classmethod
     def from_str(cls, str_: str
@@ -44,6 +46,14 @@ class DistributionGenerator:
             generator = LogDistributionGenerator(
                 config=config
             )
+        elif distribution_type == DistributionType.uniform:
+            generator = UniformDistributionGenerator(
+                config=config
+            )
+        elif distribution_type == DistributionType.zipf:
+            generator = ZipfDistributionGenerator(
+                config=config
+            )
         elif distribution_type is None:
             generator = cls.default()
         else:
@@ -58,65 +68,202 @@ class DistributionGenerator:
 
         return default_generator
 
-    def scale(self, origin_values: List[float], dest_start: float, dest_end: List[float]
-              ) -> float:
+    def scale_array(self, origin_values: np.ndarray, dest_start: float, dest_end: float, origin_start: float = None, origin_end: float = None
+                    ) -> np.ndarray:
+        """Scales the origin values into the [dest_start, dest_end] range, clipping the values out of it.
+
+        Note: if the origin bounds are not given, the minimum and maximum of the origin values are used.
+        """
 
-        origin_end = np.max(origin_values)
-        origin_start = np.min(origin_values)
+        origin_values = np.asarray(origin_values, dtype=np.float64)
 
-        # scale
+        if origin_values.size == 0:
+            return origin_values
+
+        origin_end = np.max(origin_values) if origin_end is None else origin_end
+        origin_start = np.min(origin_values) if origin_start is None else origin_start
+
+        # scale (a degenerated range, as with a single sample, collapses into the start)
+
+        if origin_end == origin_start:
+            return np.full(origin_values.shape, dest_start, dtype=np.float64)
 
         proportion = (dest_end - dest_start) / (origin_end - origin_start)
-        dest_values = [dest_start + (origin_value * proportion) for origin_value in origin_values]
+        dest_values = dest_start + ((origin_values - origin_start) * proportion)
 
         # fix
 
-        dest_values = [(dest_value if dest_value <= dest_end else dest_end) for dest_value in dest_values]
-        dest_values = [(dest_value if dest_value >= dest_start else dest_start) for dest_value in dest_values]
+        np.clip(dest_values, dest_start, dest_end, out=dest_values)
 
         return dest_values
 
-    def generate(self, min_value: Union[int, float], max_value: Union[int, float], num_samples: int
-                 ) -> List[float]:
-        """Builds a distribution of num_samples with values contained between vounds
+    def scale(self, origin_values: List[float], dest_start: float, dest_end: float
+              ) -> List[float]:
+        """List based version of `DistributionGenerator.scale_array`, kept for compatibility.
+        """
+
+        dest_values = self.scale_array(
+            origin_values=origin_values, dest_start=dest_start, dest_end=dest_end
+        )
+
+        return dest_values.tolist()
+
+    def _sample(self, num_samples: int, rng: np.random.Generator = None
+                ) -> np.ndarray:
+        """Draws num_samples values of the distribution, from the given random generator or from the numpy global one.
         """
 
         raise Exception('This method must not be used in this class, first build a DistributionGenerator with the DistributionGenerator.build method.')
 
+    def scaled_mean(self, min_value: Union[int, float], max_value: Union[int, float]
+                    ) -> float:
+        """Returns the mean of the distribution scaled with the fixed bounds into [min_value, max_value].
+        """
 
-class NormalDistributionGenerator(DistributionGenerator):
+        scaled_mean = self.scale_array(
+            origin_values=np.array([self.origin_mean]), dest_start=min_value, dest_end=max_value, origin_start=self.origin_bounds[0], origin_end=self.origin_bounds[1]
+        )
 
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
+        return float(scaled_mean[0])
 
-    def generate(self, min_value: float, max_value: float, num_samples: int
-                 ) -> List[float]:
+    def generate_array(self, min_value: Union[int, float], max_value: Union[int, float], num_samples: int, rng: np.random.Generator = None, fixed_bounds: bool = False
+                       ) -> np.ndarray:
+        """Builds a distribution of num_samples with values contained between bounds, as a float array.
+
+        By default the values are scaled using their minimum and maximum. If fixed_bounds is set, the fixed bounds of
+        the distribution are used instead, so the scaling of the values does not depend on the rest of them (i.e.
+        when generating the samples in several shards).
+        """
 
         # generate
-        values = np.random.normal(size=num_samples)
+        values = self._sample(num_samples=num_samples, rng=rng)
 
         # scale
-        scaled_values = self.scale(
-            origin_values=values, dest_start=min_value, dest_end=max_value
+        origin_start, origin_end = self.origin_bounds if fixed_bounds else (None, None)
+        scaled_values = self.scale_array(
+            origin_values=values, dest_start=min_value, dest_end=max_value, origin_start=origin_start, origin_end=origin_end
         )
 
         return scaled_values
 
+    def generate(self, min_value: Union[int, float], max_value: Union[int, float], num_samples: int
+                 ) -> List[float]:
+        """Builds a distribution of num_samples with values contained between vounds
+        """
+
+        values = self.generate_array(
+            min_value=min_value, max_value=max_value, num_samples=num_samples
+        )
+
+        return values.tolist()
+
+
+class NormalDistributionGenerator(DistributionGenerator):
+
+    # bounds containing nearly all the samples of the standard normal distribution, and its mean
+    origin_bounds = (-4.0, 4.0)
+    origin_mean = 0.0
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+    def _sample(self, num_samples: int, rng: np.random.Generator = None
+                ) -> np.ndarray:
+
+        rng = np.random if rng is None else rng
+
+        return rng.normal(size=num_samples)
+
 
 class LogDistributionGenerator(DistributionGenerator):
 
+    # bounds containing nearly all the samples of the standard log-normal distribution, and its mean
+    origin_bounds = (0.0, float(np.exp(4.0)))
+    origin_mean = float(np.exp(0.5))
+
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
 
-    def generate(self, min_value: float, max_value: float, num_samples: int
-                 ) -> List[float]:
+    def _sample(self, num_samples: int, rng: np.random.Generator = None
+                ) -> np.ndarray:
 
-        # generate
-        values = np.random.lognormal(size=num_samples)
+        rng = np.random if rng is None else rng
 
-        # scale
-        scaled_values = self.scale(
-            origin_values=values, dest_start=min_value, dest_end=max_value
+        return rng.lognormal(size=num_samples)
+
+
+class UniformDistributionGenerator(DistributionGenerator):
+
+    origin_bounds = (0.0, 1.0)
+    origin_mean = 0.5
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+    def _sample(self, num_samples: int, rng: np.random.Generator = None
+                ) -> np.ndarray:
+
+        rng = np.random if rng is None else rng
+
+        return rng.uniform(size=num_samples)
+
+
+class ZipfDistributionGenerator(DistributionGenerator):
+    """Zipf distribution truncated to the range of values: the first value is the most frequent one, and the frequency
+    of the rest decreases as a power of their rank. The exponent is given by the "a" field of the configuration, being
+    greater than 1.
+    """
+
+    DEFAULT_EXPONENT = 1.5
+
+    # maximum number of ranks used to calculate the mean of the distribution
+    MAX_MEAN_RANKS = 1000000
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        exponent = self.config.get('a') if self.config is not None else None
+        self.exponent = exponent if exponent is not None else self.DEFAULT_EXPONENT
+
+        if self.exponent <= 1:
+            raise ValueError(f'The exponent of the zipf distribution must be greater than 1, but {self.exponent} was given.')
+
+    def _num_ranks(self, min_value: Union[int, float], max_value: Union[int, float]
+                   ) -> int:
+        return max(1, int(np.ceil(max_value - min_value)))
+
+    def _sample_ranks(self, num_samples: int, num_ranks: int, rng: np.random.Generator = None
+                      ) -> np.ndarray:
+        """Draws num_samples ranks in [0, num_ranks), redrawing the ones out of the range.
+        """
+
+        rng = np.random if rng is None else rng
+
+        ranks = rng.zipf(self.exponent, size=num_samples) - 1
+        out_of_range = np.flatnonzero(ranks >= num_ranks)
+
+        while out_of_range.size:
+            ranks[out_of_range] = rng.zipf(self.exponent, size=out_of_range.size) - 1
+            out_of_range = out_of_range[ranks[out_of_range] >= num_ranks]
+
+        return ranks
+
+    def scaled_mean(self, min_value: Union[int, float], max_value: Union[int, float]
+                    ) -> float:
+
+        ranks = np.arange(min(self._num_ranks(min_value, max_value), self.MAX_MEAN_RANKS), dtype=np.float64)
+        weights = (ranks + 1) ** -self.exponent
+
+        return float(min_value + np.sum(ranks * weights) / np.sum(weights))
+
+    def generate_array(self, min_value: Union[int, float], max_value: Union[int, float], num_samples: int, rng: np.random.Generator = None, fixed_bounds: bool = False
+                       ) -> np.ndarray:
+        """Builds a distribution of num_samples with values contained between bounds, as a float array. As the values
+        are ranks from min_value, there is no need of scaling them, so fixed_bounds is ignored.
+        """
+
+        ranks = self._sample_ranks(
+            num_samples=num_samples, num_ranks=self._num_ranks(min_value, max_value), rng=rng
         )
 
-        return scaled_values
+        return min_value + ranks.astype(np.float64)
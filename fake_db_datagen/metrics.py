@@ -0,0 +1,233 @@
+#!/usr/bin/python3
+# Copyright 2023 Francisco Pinto Santos
+# See LICENSE for details.
+# Author: Francisco Pinto Santos (@GandalFran on GitHub)
+
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from . import logger
+
+try:
+    import resource
+except ImportError:  # not available in Windows
+    resource = None
+
+
+def peak_memory() -> Optional[int]:
+    """Returns the peak resident memory of the process in bytes since it started, or None if it is not available.
+    """
+
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # bytes in macOS and kilobytes in the rest
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+class _PeakMemoryTracker:
+    """Tracks the peak resident memory of the process during the measured blocks, which may be nested (i.e. the
+    fields in the directives in the stages) or concurrent (i.e. the directives inserted by several threads).
+
+    In Linux the peak of the process (VmHWM) is reset when each block starts, folding the peak reached until then into
+    the open blocks, so each block gets the peak reached while it was open. Elsewhere only the peak of the process
+    since it started is available, which never decreases, so each block only gets how much it raised it.
+    """
+
+    STATUS_PATH = '/proc/self/status'
+    CLEAR_REFS_PATH = '/proc/self/clear_refs'
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.open_blocks = {}
+        self.resettable = None
+
+    def _read_peak(self) -> Optional[int]:
+
+        try:
+            with open(self.STATUS_PATH) as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+
+        return None
+
+    def _reset_peak(self) -> bool:
+
+        try:
+            with open(self.CLEAR_REFS_PATH, 'w') as f:
+                f.write('5')
+        except OSError:
+            return False
+
+        return True
+
+    def _fold_peak(self) -> None:
+
+        peak = self._read_peak()
+
+        for block, (start, block_peak) in self.open_blocks.items():
+            self.open_blocks[block] = (start, max(block_peak, peak))
+
+    def start(self) -> object:
+        """Opens a block, returning its key.
+        """
+
+        block = object()
+
+        with self.lock:
+
+            if self.resettable is None:
+                self.resettable = self._read_peak() is not None and self._reset_peak()
+
+            if self.resettable:
+                self._fold_peak()
+                self._reset_peak()
+
+                # once reset, the peak is the current resident memory
+                start = self._read_peak()
+            else:
+                start = peak_memory()
+
+            self.open_blocks[block] = (start, start)
+
+        return block
+
+    def stop(self, block: object) -> Optional[int]:
+        """Closes the block, returning how much the resident memory grew over the one at its start while it was open,
+        or None if it is not available.
+        """
+
+        with self.lock:
+
+            if self.resettable:
+                self._fold_peak()
+                start, peak = self.open_blocks.pop(block)
+            else:
+                start, _ = self.open_blocks.pop(block)
+                peak = peak_memory()
+
+        return max(peak - start, 0) if start is not None and peak is not None else None
+
+
+_peak_memory_tracker = _PeakMemoryTracker()
+
+
+class Measurement:
+    """Wall time, CPU time (of the whole process) and rows produced by a stage of the pipeline, a directive or a field
+    generator, with its peak memory: the growth of the resident memory of the process over the one at its start (see
+    `_PeakMemoryTracker`). The measurements of the same element (i.e. of each batch or shard of a directive) are
+    accumulated, keeping the biggest peak memory.
+    """
+
+    STAGE = 'stage'
+    DIRECTIVE = 'directive'
+    FIELD = 'field'
+
+    def __init__(self, scope: str, name: str, wall_time: float = 0.0, cpu_time: float = 0.0, rows: int = 0, peak_memory: int = None
+                 ) -> None:
+        self.scope = scope
+        self.name = name
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.rows = rows
+        self.peak_memory = peak_memory
+
+    def add(self, other: 'Measurement') -> None:
+
+        self.wall_time += other.wall_time
+        self.cpu_time += other.cpu_time
+        self.rows += other.rows
+
+        if other.peak_memory is not None:
+            self.peak_memory = other.peak_memory if self.peak_memory is None else max(self.peak_memory, other.peak_memory)
+
+    @classmethod
+    @contextmanager
+    def measure(cls, scope: str, name: str
+                ) -> Iterator['Measurement']:
+        """Measures the times of the block, yielding the measurement so the rows can be set in it.
+        """
+
+        measurement = cls(scope=scope, name=name)
+        memory_block = _peak_memory_tracker.start()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+
+        try:
+            yield measurement
+        finally:
+            measurement.wall_time += time.perf_counter() - wall_start
+            measurement.cpu_time += time.process_time() - cpu_start
+            measurement.peak_memory = _peak_memory_tracker.stop(memory_block)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'wall_time': self.wall_time, 'cpu_time': self.cpu_time, 'rows': self.rows, 'peak_memory': self.peak_memory}
+
+
+class GenerationMetrics:
+    """Metrics of a generation: the measurements of each stage of the pipeline, of each directive and of each field
+    generator (named as table.field). Each recorded measurement is also passed to the hooks, if any, as soon as it is
+    recorded (i.e. the measurement of each batch or shard of a directive).
+    """
+
+    def __init__(self, hooks: Iterable[Callable[[Measurement], None]] = None
+                 ) -> None:
+        self.hooks = list(hooks) if hooks is not None else []
+        self.stages = {}
+        self.directives = {}
+        self.fields = {}
+        self.lock = threading.Lock()
+
+    def record(self, measurement: Measurement) -> None:
+
+        measurements = {Measurement.STAGE: self.stages, Measurement.DIRECTIVE: self.directives, Measurement.FIELD: self.fields}[measurement.scope]
+
+        # the directives may be generated by several threads (i.e. when inserted into a database)
+        with self.lock:
+
+            if measurement.name not in measurements:
+                measurements[measurement.name] = Measurement(scope=measurement.scope, name=measurement.name)
+
+            measurements[measurement.name].add(measurement)
+
+        if measurement.scope == Measurement.STAGE:
+            logger.info(f'completed stage {measurement.name} in {measurement.wall_time:.3f}s')
+
+        for hook in self.hooks:
+            hook(measurement)
+
+    @contextmanager
+    def measure_stage(self, name: str) -> Iterator[Measurement]:
+
+        with Measurement.measure(scope=Measurement.STAGE, name=name) as measurement:
+            yield measurement
+
+        self.record(measurement)
+
+    def watch(self, directives: List[Any]) -> None:
+        """Records the measurements of the directives as they are added to them (also the ones measured by other
+        processes).
+        """
+
+        for directive in directives:
+            directive.measurement_listener = self.record
+
+    def to_dict(self) -> Dict[str, Any]:
+
+        return {
+            'stages': {name: measurement.to_dict() for name, measurement in self.stages.items()},
+            'directives': {name: measurement.to_dict() for name, measurement in self.directives.items()},
+            'fields': {name: measurement.to_dict() for name, measurement in self.fields.items()}
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+# Copyright 2023 Francisco Pinto Santos
+# See LICENSE for details.
+# Author: Francisco Pinto Santos (@GandalFran on GitHub)
+
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+from . import logger
+
+
+def _package_version() -> str:
+
+    # imported when needed, as it is slow to import
+    from importlib import metadata
+
+    try:
+        return metadata.version('fake_db_datagen')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+class TeeStream:
+    """Writable stream forwarding the writes into several streams.
+    """
+
+    def __init__(self, streams: List[IO]
+                 ) -> None:
+        self.streams = streams
+
+    def write(self, data: str) -> int:
+
+        for stream in self.streams:
+            stream.write(data)
+
+        return len(data)
+
+
+class OutputCache:
+    """On disk cache of the generated outputs, keyed by a fingerprint of everything the output depends on (see
+    `OutputCache.fingerprint`).
+
+    Each output is stored as a file in the cache directory. When the size of the stored outputs exceeds max_size
+    bytes, the least recently used ones are removed.
+    """
+
+    DEFAULT_MAX_SIZE = 1024 ** 3
+    ENTRY_EXTENSION = '.out'
+
+    def __init__(self, directory: str, max_size: int = None
+                 ) -> None:
+
+        if max_size is not None and max_size <= 0:
+            raise ValueError(f'The maximum size of the cache must be a positive number, but {max_size} was given.')
+
+        self.directory = directory
+        self.max_size = max_size if max_size is not None else self.DEFAULT_MAX_SIZE
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    @classmethod
+    def fingerprint(cls, dbml: str, config: Dict[str, Any], seed: int, formatter_type: str, formatter_config: Dict[str, Any] = None
+                    ) -> str:
+        """Returns the hash of the DBML, the (merged) configuration, the seed, the formatter and the package version.
+        """
+
+        content = json.dumps({
+            'dbml': dbml, 'config': config, 'seed': seed, 'formatter_type': str(formatter_type).lower(), 'formatter_config': formatter_config, 'version': _package_version()
+        }, sort_keys=True, default=str)
+
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.ENTRY_EXTENSION)
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """Returns the path of the entry if it is stored, marking it as recently used.
+        """
+
+        path = self._entry_path(key)
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            logger.debug(f'cache miss for {key}')
+            return None
+
+        logger.info(f'cache hit for {key}')
+
+        return path
+
+    def read(self, key: str) -> Optional[str]:
+        """Returns the stored output, or None if it is not stored.
+        """
+
+        path = self._lookup(key)
+
+        if path is None:
+            return None
+
+        with open(path) as f:
+            return f.read()
+
+    def copy_to(self, key: str, fp: IO) -> bool:
+        """Copies the stored output into fp, returning if it was stored.
+        """
+
+        path = self._lookup(key)
+
+        if path is None:
+            return False
+
+        with open(path) as f:
+            shutil.copyfileobj(f, fp)
+
+        return True
+
+    @contextmanager
+    def writer(self, key: str) -> Iterator[IO]:
+        """Opens a stream to store the output. The output is only stored if the block finishes without errors.
+        """
+
+        fd, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+        try:
+            with os.fdopen(fd, 'w') as f:
+                yield f
+            os.replace(temporary_path, self._entry_path(key))
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+        logger.debug(f'stored cache entry {key}')
+
+        self._evict(keep=key)
+
+    def write(self, key: str, content: str) -> None:
+
+        with self.writer(key) as f:
+            f.write(content)
+
+    def _evict(self, keep: str = None) -> None:
+        """Removes the least recently used entries until the size of the cache is under the maximum size.
+        """
+
+        entries = []
+
+        for file_name in os.listdir(self.directory):
+
+            if not file_name.endswith(self.ENTRY_EXTENSION) or file_name == f'{keep}{self.ENTRY_EXTENSION}':
+                continue
+
+            try:
+                stat = os.stat(os.path.join(self.directory, file_name))
+            except FileNotFoundError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, file_name))
+
+        keep_path = self._entry_path(keep) if keep is not None else None
+        total_size = sum(size for _, size, _ in entries) + (os.path.getsize(keep_path) if keep_path is not None and os.path.exists(keep_path) else 0)
+
+        for _, size, file_name in sorted(entries):
+
+            if total_size <= self.max_size:
+                break
+
+            logger.debug(f'evicting cache entry {file_name}')
+
+            try:
+                os.remove(os.path.join(self.directory, file_name))
+            except FileNotFoundError:
+                pass
+
+            total_size -= size
@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+# Copyright 2023 Francisco Pinto Santos
+# See LICENSE for details.
+# Author: Francisco Pinto Santos (@GandalFran on GitHub)
+
+
+import cProfile
+import inspect
+import os
+import pstats
+import sys
+from contextlib import contextmanager
+from types import CodeType
+from typing import Dict, Iterator, Tuple
+
+PACKAGE_NAME = __name__.split('.')[0]
+
+
+class GenerationProfiler:
+    """Profiles a generation with the deterministic profiler of the standard library (cProfile), breaking down the
+    time by component: the functions of this package are named by their qualified name (i.e.
+    `DistributionGenerator.scale_array` or `SQLDataFormatter.format`), and the rest by the top level package of their
+    module (i.e. `numpy` or `pydbml`) or, if built in, by their name.
+
+    Note: only the current process is profiled, so the generation in the worker processes is not.
+    """
+
+    def __init__(self) -> None:
+        self.profile = cProfile.Profile()
+
+    @contextmanager
+    def profiling(self) -> Iterator[None]:
+
+        self.profile.enable()
+
+        try:
+            yield
+        finally:
+            self.profile.disable()
+
+    def dump(self, file_path: str) -> None:
+        """Writes the profile as a pstats file (readable with `pstats.Stats` or tools as snakeviz).
+        """
+
+        self.profile.dump_stats(file_path)
+
+    def _qualified_names(self) -> Dict[Tuple[str, int], str]:
+        """Returns the qualified names of the functions and methods of the package (and the functions, lambdas and
+        comprehensions nested in them), by their file and line.
+        """
+
+        qualified_names = {}
+
+        def _add_code(code: CodeType, qualified_name: str) -> None:
+
+            qualified_names[(os.path.normcase(code.co_filename), code.co_firstlineno)] = qualified_name
+
+            for constant in code.co_consts:
+                if isinstance(constant, CodeType):
+                    _add_code(constant, getattr(constant, 'co_qualname', f'{qualified_name}.<locals>.{constant.co_name}'))
+
+        for module_name, module in list(sys.modules.items()):
+
+            if module is None or module_name.split('.')[0] != PACKAGE_NAME:
+                continue
+
+            for value in list(vars(module).values()):
+
+                candidates = [value]
+
+                if inspect.isclass(value) and value.__module__ == module_name:
+                    candidates = list(vars(value).values())
+
+                for candidate in candidates:
+
+                    function = candidate.fget if isinstance(candidate, property) else getattr(candidate, '__func__', candidate)
+                    function = inspect.unwrap(function) if callable(function) else function
+                    code = getattr(function, '__code__', None)
+
+                    if code is not None:
+                        _add_code(code, function.__qualname__)
+
+        return qualified_names
+
+    def _modules_names(self) -> Dict[str, str]:
+
+        return {
+            os.path.normcase(module.__file__): module_name
+            for module_name, module in list(sys.modules.items()) if getattr(module, '__file__', None) is not None
+        }
+
+    def _components(self) -> Iterator[Tuple[str, bool, float, float]]:
+        """Yields the component of each profiled function, if it belongs to the package, and its own and cumulative
+        times.
+        """
+
+        qualified_names = self._qualified_names()
+        modules_names = self._modules_names()
+
+        for (file_name, line, function_name), (_, _, own_time, cumulative_time, _) in pstats.Stats(self.profile).stats.items():
+
+            # built in functions
+            if file_name == '~':
+                yield function_name, False, own_time, cumulative_time
+                continue
+
+            file_name = os.path.normcase(file_name)
+            module_name = modules_names.get(file_name, os.path.splitext(os.path.basename(file_name))[0])
+            in_package = module_name.split('.')[0] == PACKAGE_NAME
+
+            if (file_name, line) in qualified_names:
+                yield qualified_names[(file_name, line)], in_package, own_time, cumulative_time
+            elif in_package:
+                # functions not found in the modules (i.e. built dynamically)
+                yield f'{module_name.split(".")[-1]}.{function_name}', in_package, own_time, cumulative_time
+            else:
+                yield module_name.split('.')[0], in_package, own_time, cumulative_time
+
+    def breakdown(self) -> Dict[str, float]:
+        """Returns the own time of each component (excluding the time of the functions they call), sorted in
+        descending order.
+        """
+
+        times = {}
+
+        for component, _, own_time, _ in self._components():
+            times[component] = times.get(component, 0.0) + own_time
+
+        return dict(sorted(times.items(), key=lambda item: item[1], reverse=True))
+
+    def cumulative(self) -> Dict[str, float]:
+        """Returns the cumulative time of each function of the package (including the time of the functions they
+        call), sorted in descending order.
+        """
+
+        times = {}
+
+        for component, in_package, _, cumulative_time in self._components():
+            if in_package:
+                times[component] = max(times.get(component, 0.0), cumulative_time)
+
+        return dict(sorted(times.items(), key=lambda item: item[1], reverse=True))
+
+    def report(self, top: int = 15) -> str:
+        """Returns a text report with the top components by own time and the top functions of the package by
+        cumulative time.
+        """
+
+        breakdown = self.breakdown()
+        cumulative = self.cumulative()
+        total_time = max([sum(breakdown.values())] + list(cumulative.values()))
+
+        def _format_times(times):
+            return [
+                f'  {time:10.3f}s {100 * time / total_time if total_time > 0 else 0.0:6.1f}%  {name}'
+                for name, time in list(times.items())[:top]
+            ]
+
+        lines = [f'Profiled {total_time:.3f}s', '', 'Own time by component:'] + _format_times(breakdown) + \
+                ['', f'Cumulative time of the {PACKAGE_NAME} functions:'] + _format_times(cumulative)
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,404 @@
+#!/usr/bin/python3
+# Copyright 2023 Francisco Pinto Santos
+# See LICENSE for details.
+# Author: Francisco Pinto Santos (@GandalFran on GitHub)
+
+
+import functools
+import string
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import re._parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+
+# upper bound of the repeats generated for * and + (the same used by rstr.xeger)
+STAR_PLUS_LIMIT = 100
+
+CATEGORIES = {
+    'category_digit': string.digits,
+    'category_not_digit': string.ascii_letters + string.punctuation,
+    'category_space': string.whitespace,
+    'category_not_space': string.printable.strip(),
+    'category_word': string.ascii_letters + string.digits + '_',
+    'category_not_word': ''.join(sorted(set(string.printable).difference(string.ascii_letters + string.digits + '_'))),
+}
+
+
+def _empty(num_samples: int) -> np.ndarray:
+    return np.zeros(num_samples, dtype='U1')
+
+
+def _set(target: np.ndarray, indexes: np.ndarray, values: np.ndarray
+         ) -> np.ndarray:
+    """Sets the values into the given indexes of the target, widening the target if needed.
+    """
+
+    if values.dtype.itemsize > target.dtype.itemsize:
+        target = target.astype(values.dtype)
+
+    target[indexes] = values
+
+    return target
+
+
+class SamplingContext:
+    """State shared by the nodes while sampling: the number of samples and the values of the captured groups.
+    """
+
+    def __init__(self, num_samples: int
+                 ) -> None:
+        self.num_samples = num_samples
+        self.groups = {}
+
+
+class SamplingNode:
+    """Node of a compiled sampling plan. Each node samples the strings of a group of rows at once.
+    """
+
+    def sample(self, rows: np.ndarray, rng: np.random.Generator, context: 'SamplingContext'
+               ) -> np.ndarray:
+        """Samples a string for each one of the given rows (indexes of the rows in the whole sample, used to keep
+        track of the values of the groups).
+        """
+
+        raise Exception('This method must not be used in this class.')
+
+
+class EmptyNode(SamplingNode):
+
+    def sample(self, rows: np.ndarray, rng: np.random.Generator, context: 'SamplingContext'
+               ) -> np.ndarray:
+        return _empty(len(rows))
+
+
+class CharacterSetNode(SamplingNode):
+    """Uniformly chooses one character of the set (candidates can be repeated, as in rstr.xeger).
+    """
+
+    def __init__(self, characters: List[str]
+                 ) -> None:
+        self.characters = np.array(list(characters), dtype='U1')
+
+    def sample_matrix(self, num_samples: int, num_characters: int, rng: np.random.Generator
+                      ) -> np.ndarray:
+
+        if len(self.characters) == 1:
+            return np.full((num_samples, num_characters), self.characters[0], dtype='U1')
+
+        indexes = rng.integers(len(self.characters), size=(num_samples, num_characters))
+
+        return self.characters[indexes]
+
+    def sample(self, rows: np.ndarray, rng: np.random.Generator, context: 'SamplingContext'
+               ) -> np.ndarray:
+        return self.sample_matrix(num_samples=len(rows), num_characters=1, rng=rng).reshape(len(rows))
+
+
+class SequenceNode(SamplingNode):
+
+    def __init__(self, nodes: List[SamplingNode]
+                 ) -> None:
+        self.nodes = nodes
+
+    def sample(self, rows: np.ndarray, rng: np.random.Generator, context: 'SamplingContext'
+               ) -> np.ndarray:
+
+        values = _empty(len(rows))
+
+        for node in self.nodes:
+            values = np.char.add(values, node.sample(rows, rng, context))
+
+        return values
+
+
+class BranchNode(SamplingNode):
+    """Uniformly chooses one of the alternatives for each row.
+    """
+
+    def __init__(self, alternatives: List[SamplingNode]
+                 ) -> None:
+        self.alternatives = alternatives
+
+    def sample(self, rows: np.ndarray, rng: np.random.Generator, context: 'SamplingContext'
+               ) -> np.ndarray:
+
+        values = _empty(len(rows))
+        choices = rng.integers(len(self.alternatives), size=len(rows))
+
+        for i, alternative in enumerate(self.alternatives):
+
+            indexes = np.nonzero(choices == i)[0]
+
+            if len(indexes):
+                values = _set(values, indexes, alternative.sample(rows[indexes], rng, context))
+
+        return values
+
+
+class RepeatNode(SamplingNode):
+    """Repeats the node a number of times uniformly chosen in [min_count, max_count] for each row.
+    """
+
+    def __init__(self, min_count: int, max_count: int, node: SamplingNode
+                 ) -> None:
+        self.min_count = min_count
+        self.max_count = max_count
+        self.node = node
+
+    def sample(self, rows: np.ndarray, rng: np.random.Generator, context: 'SamplingContext'
+               ) -> np.ndarray:
+
+        num_samples = len(rows)
+
+        if self.max_count == 0 or num_samples == 0:
+            return _empty(num_samples)
+
+        counts = np.full(num_samples, self.max_count) if self.min_count == self.max_count else rng.integers(self.min_count, self.max_count + 1, size=num_samples)
+
+        # repeated characters are drawn as a matrix of characters, discarding the ones over the count of the row,
+        # and viewed as strings (the discarded characters are trailing, so they are ignored)
+
+        if isinstance(self.node, CharacterSetNode):
+
+            matrix = self.node.sample_matrix(num_samples=num_samples, num_characters=self.max_count, rng=rng)
+
+            if self.min_count != self.max_count:
+                matrix[np.arange(self.max_count) >= counts[:, None]] = ''
+
+            return np.ascontiguousarray(matrix).view(f'U{self.max_count}').reshape(num_samples)
+
+        # other nodes are appended repetition by repetition to the rows which have not reached their count
+
+        values = _empty(num_samples)
+
+        for repetition in range(self.max_count):
+
+            indexes = np.nonzero(counts > repetition)[0]
+
+            if not len(indexes):
+                break
+
+            values = _set(values, indexes, np.char.add(values[indexes], self.node.sample(rows[indexes], rng, context)))
+
+        return values
+
+
+class GroupNode(SamplingNode):
+    """Samples the inner node, keeping its values if it is a capturing group to be referenced later.
+    """
+
+    def __init__(self, group: int, node: SamplingNode
+                 ) -> None:
+        self.group = group
+        self.node = node
+
+    def sample(self, rows: np.ndarray, rng: np.random.Generator, context: 'SamplingContext'
+               ) -> np.ndarray:
+
+        values = self.node.sample(rows, rng, context)
+
+        if self.group is not None:
+            group_values = context.groups.get(self.group, _empty(context.num_samples))
+            context.groups[self.group] = _set(group_values, rows, values)
+
+        return values
+
+
+class GroupReferenceNode(SamplingNode):
+
+    def __init__(self, group: int
+                 ) -> None:
+        self.group = group
+
+    def sample(self, rows: np.ndarray, rng: np.random.Generator, context: 'SamplingContext'
+               ) -> np.ndarray:
+
+        if self.group not in context.groups:
+            return _empty(len(rows))
+
+        return context.groups[self.group][rows]
+
+
+class RegexSampler:
+    """Generates strings matching a regular expression, with the same distribution as `rstr.xeger`.
+
+    The expression is parsed once into a sampling plan, which generates all the requested strings at once drawing
+    the random choices of each node of the plan as numpy arrays.
+    """
+
+    def __init__(self, expression: str
+                 ) -> None:
+        self.expression = expression
+        self.plan = self._compile(sre_parse.parse(expression))
+
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def build(cls, expression: str
+              ) -> 'RegexSampler':
+        """Factory method for building the fastest sampler suitable for the expression: a `FixedWidthRegexSampler`
+        for the fixed width expressions only made of character sets, and a `RegexSampler` for the rest.
+
+        As the samplers are stateless, each expression is only compiled once and its sampler is shared.
+        """
+
+        sampler = RegexSampler(expression)
+        segments = FixedWidthRegexSampler.extract_segments(sampler.plan)
+
+        if segments is not None:
+            sampler = FixedWidthRegexSampler(expression=expression, segments=segments)
+
+        return sampler
+
+    def _compile(self, parsed: Any) -> SamplingNode:
+
+        nodes = [self._compile_state(opcode, value) for opcode, value in parsed]
+
+        return nodes[0] if len(nodes) == 1 else SequenceNode(nodes=nodes)
+
+    def _compile_characters(self, opcode: str, value: Any) -> List[str]:
+
+        if opcode == 'literal':
+            return [chr(value)]
+        elif opcode == 'range':
+            return [chr(i) for i in range(value[0], value[1] + 1)]
+        elif opcode == 'category':
+            return list(CATEGORIES[value.name.lower()])
+        else:
+            raise ValueError(f'Unable to compile the regular expression "{self.expression}": unsupported set item {opcode}.')
+
+    def _compile_state(self, opcode: Any, value: Any) -> SamplingNode:
+
+        opcode = opcode.name.lower()
+
+        if opcode == 'literal':
+            node = CharacterSetNode(characters=[chr(value)])
+
+        elif opcode == 'not_literal':
+            node = CharacterSetNode(characters=string.printable.replace(chr(value), ''))
+
+        elif opcode == 'any':
+            node = CharacterSetNode(characters=string.printable.replace('\n', ''))
+
+        elif opcode == 'category':
+            node = CharacterSetNode(characters=CATEGORIES[value.name.lower()])
+
+        elif opcode == 'in':
+
+            negated = len(value) > 0 and value[0][0].name.lower() == 'negate'
+            items = value[1:] if negated else value
+
+            characters = []
+            for item_opcode, item_value in items:
+                characters.extend(self._compile_characters(item_opcode.name.lower(), item_value))
+
+            if negated:
+                characters = sorted(set(string.printable).difference(characters))
+
+            node = CharacterSetNode(characters=characters)
+
+        elif opcode == 'branch':
+            node = BranchNode(alternatives=[self._compile(alternative) for alternative in value[1]])
+
+        elif opcode in ('max_repeat', 'min_repeat', 'possessive_repeat'):
+            min_count, max_count, repeated = value
+            node = RepeatNode(min_count=min_count, max_count=max(min_count, min(max_count, STAR_PLUS_LIMIT)), node=self._compile(repeated))
+
+        elif opcode == 'subpattern':
+            node = GroupNode(group=value[0], node=self._compile(value[-1]))
+
+        elif opcode in ('assert', 'atomic_group'):
+            node = self._compile(value[-1] if opcode == 'assert' else value)
+
+        elif opcode == 'groupref':
+            node = GroupReferenceNode(group=value)
+
+        elif opcode in ('at', 'assert_not'):
+            node = EmptyNode()
+
+        else:
+            raise ValueError(f'Unable to compile the regular expression "{self.expression}": unsupported operation {opcode}.')
+
+        return node
+
+    def sample(self, num_samples: int, rng: np.random.Generator = None
+               ) -> np.ndarray:
+        """Generates num_samples strings matching the expression. If no random generator is given, one is seeded from
+        the numpy global random state.
+        """
+
+        if rng is None:
+            rng = np.random.default_rng(np.random.randint(0, 2 ** 32, size=4))
+
+        context = SamplingContext(num_samples=num_samples)
+
+        return self.plan.sample(np.arange(num_samples), rng, context)
+
+
+class FixedWidthRegexSampler(RegexSampler):
+    """Sampler for the expressions only made of character sets (or literals) repeated a fixed number of times, as the
+    ids or the codes.
+
+    The strings are generated as a matrix of character codes, drawing every position at once, which is directly viewed
+    as an array of fixed width strings.
+    """
+
+    def __init__(self, expression: str, segments: List[Tuple[np.ndarray, int]]
+                 ) -> None:
+        self.expression = expression
+        self.segments = segments
+        self.width = sum(count for _, count in segments)
+
+    @classmethod
+    def extract_segments(cls, plan: SamplingNode
+                         ) -> Optional[List[Tuple[np.ndarray, int]]]:
+        """Returns the segments (character codes and count) of the plan, or None if the plan is not only made of
+        character sets repeated a fixed number of times.
+        """
+
+        nodes = plan.nodes if isinstance(plan, SequenceNode) else [plan]
+        segments = []
+
+        for node in nodes:
+
+            if isinstance(node, CharacterSetNode):
+                characters, count = node.characters, 1
+            elif isinstance(node, RepeatNode) and isinstance(node.node, CharacterSetNode) and node.min_count == node.max_count:
+                characters, count = node.node.characters, node.min_count
+            else:
+                return None
+
+            codes = np.array([ord(character) for character in characters.tolist()], dtype=np.uint32)
+            segments.append((codes, count))
+
+        return segments
+
+    def sample(self, num_samples: int, rng: np.random.Generator = None
+               ) -> np.ndarray:
+
+        if rng is None:
+            rng = np.random.default_rng(np.random.randint(0, 2 ** 32, size=4))
+
+        if self.width == 0:
+            return _empty(num_samples)
+
+        matrix = np.empty((num_samples, self.width), dtype=np.uint32)
+        position = 0
+
+        for codes, count in self.segments:
+
+            block = matrix[:, position:position + count]
+
+            if len(codes) == 1:
+                block[:] = codes[0]
+            else:
+                index_dtype = np.uint8 if len(codes) <= 256 else np.uint32
+                block[:] = codes[rng.integers(len(codes), size=(num_samples, count), dtype=index_dtype)]
+
+            position += count
+
+        return matrix.view(f'U{self.width}').reshape(num_samples)
@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+# Copyright 2023 Francisco Pinto Santos
+# See LICENSE for details.
+# Author: Francisco Pinto Santos (@GandalFran on GitHub)
+
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from . import logger
+
+if TYPE_CHECKING:  # pydbml is imported when parsing, so it is not imported along with the package
+    from pydbml import PyDBML
+
+
+class ColumnSchema:
+
+    def __init__(self, name: str, type: str
+                 ) -> None:
+        self.name = name
+        self.type = type
+
+
+class TableSchema:
+    """Table of the schema, keeping its DBML definition (used to detect the changes of the table).
+    """
+
+    def __init__(self, name: str, columns: List[ColumnSchema], definition: str
+                 ) -> None:
+        self.name = name
+        self.columns = columns
+        self.definition = definition
+
+
+class EnumSchema:
+
+    def __init__(self, name: str, values: List[str]
+                 ) -> None:
+        self.name = name
+        self.values = values
+
+
+class ReferenceSchema:
+    """Reference between the columns of two tables, already resolved to the referencing and the referenced sides (in
+    one to one references, the first table is understood as the referencing one).
+    """
+
+    def __init__(self, referencing_table: str, referencing_columns: List[str], referenced_table: str, referenced_columns: List[str]
+                 ) -> None:
+        self.referencing_table = referencing_table
+        self.referencing_columns = referencing_columns
+        self.referenced_table = referenced_table
+        self.referenced_columns = referenced_columns
+
+
+class Schema:
+    """Compact model of the DBML with the tables, columns, enumerations and references used to build the configuration
+    and the directives. Unlike the PyDBML object, it can be serialized, so the DBML is not parsed again in each run
+    (see `SchemaCache`).
+    """
+
+    def __init__(self, tables: List[TableSchema], enums: List[EnumSchema], references: List[ReferenceSchema]
+                 ) -> None:
+        self.tables = tables
+        self.enums = enums
+        self.references = references
+
+    @classmethod
+    def from_dbml(cls, dbml: 'PyDBML'
+                  ) -> 'Schema':
+        """Factory method for building the schema from a parsed DBML.
+        """
+
+        tables = [
+            TableSchema(
+                name=table.name, columns=[ColumnSchema(name=column.name, type=column.type if isinstance(column.type, str) else column.type.name) for column in table.columns], definition=table.dbml
+            )
+            for table in dbml.tables
+        ]
+
+        enums = [
+            EnumSchema(name=dbml_enum.name, values=[item.name for item in dbml_enum.items])
+            for dbml_enum in dbml.enums
+        ]
+
+        references = []
+
+        for table in dbml.tables:
+            for ref in table.get_refs():
+
+                # note: table1 ref_type table2
+
+                if ref.type == '<':
+                    referenced_table, referenced_columns, referencing_table, referencing_columns = ref.table1, ref.col1, ref.table2, ref.col2
+                else:
+                    referenced_table, referenced_columns, referencing_table, referencing_columns = ref.table2, ref.col2, ref.table1, ref.col1
+
+                references.append(ReferenceSchema(
+                    referencing_table=referencing_table.name, referencing_columns=[c.name for c in referencing_columns], referenced_table=referenced_table.name, referenced_columns=[c.name for c in referenced_columns]
+                ))
+
+        return cls(tables=tables, enums=enums, references=references)
+
+    @classmethod
+    def from_str(cls, dbml: str
+                 ) -> 'Schema':
+        """Factory method for building the schema parsing the DBML content.
+        """
+
+        # imported when parsing, as it is slow to import and not needed if the schema is cached
+        from pydbml import PyDBML
+
+        try:
+            parsed_dbml = PyDBML(dbml)
+        except:
+            raise Exception('Unable to parse the DBML content due to an unknown reason. Please check the syntax.')
+
+        return cls.from_dbml(parsed_dbml)
+
+    @classmethod
+    def from_dict(cls, content: Dict[str, Any]
+                  ) -> 'Schema':
+
+        return cls(
+            tables=[
+                TableSchema(name=table['name'], columns=[ColumnSchema(**column) for column in table['columns']], definition=table['definition'])
+                for table in content['tables']
+            ],
+            enums=[EnumSchema(**dbml_enum) for dbml_enum in content['enums']],
+            references=[ReferenceSchema(**reference) for reference in content['references']]
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+
+        return {
+            'tables': [
+                {'name': table.name, 'columns': [vars(column) for column in table.columns], 'definition': table.definition}
+                for table in self.tables
+            ],
+            'enums': [vars(dbml_enum) for dbml_enum in self.enums],
+            'references': [vars(reference) for reference in self.references]
+        }
+
+
+class SchemaCache:
+    """Cache of the schemas of the parsed DBMLs, keyed by the hash of the DBML content, so each DBML is only parsed
+    once.
+
+    The schemas are kept in memory and, if a directory is given, stored in it as JSON files, so they are reused
+    across runs.
+    """
+
+    FORMAT_VERSION = 1
+    ENTRY_EXTENSION = '.schema.json'
+
+    def __init__(self, directory: str = None
+                 ) -> None:
+        self.directory = directory
+        self.schemas = {}
+
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @classmethod
+    def fingerprint(cls, dbml: str) -> str:
+        return hashlib.sha256(f'{cls.FORMAT_VERSION}:{dbml}'.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.ENTRY_EXTENSION)
+
+    def _read(self, key: str) -> Optional[Schema]:
+
+        if self.directory is None:
+            return None
+
+        try:
+            with open(self._entry_path(key)) as f:
+                content = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (ValueError, OSError):
+            logger.warning(f'ignoring unreadable schema cache entry {key}')
+            return None
+
+        return Schema.from_dict(content)
+
+    def _write(self, key: str, schema: Schema) -> None:
+
+        if self.directory is None:
+            return
+
+        fd, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(schema.to_dict(), f)
+            os.replace(temporary_path, self._entry_path(key))
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+        logger.debug(f'stored schema cache entry {key}')
+
+    def load(self, dbml: str) -> Schema:
+        """Returns the schema of the DBML, only parsing it if it is not cached.
+        """
+
+        key = self.fingerprint(dbml)
+        schema = self.schemas.get(key)
+
+        if schema is None:
+            schema = self._read(key)
+
+            if schema is not None:
+                logger.info(f'reusing parsed DBML {key}')
+            else:
+                logger.info('parsing DBML')
+                schema = Schema.from_str(dbml)
+                self._write(key, schema)
+
+            self.schemas[key] = schema
+
+        return schema
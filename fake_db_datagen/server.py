@@ -0,0 +1,287 @@
+#!/usr/bin/python3
+# Copyright 2023 Francisco Pinto Santos
+# See LICENSE for details.
+# Author: Francisco Pinto Santos (@GandalFran on GitHub)
+
+
+import json
+import os
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, Iterator, List, Tuple
+
+from . import logger
+from .config_builder import ConfigBuilder
+from .data_formatter import DataFormatter, FormatterType
+from .data_generation_pipeline import DataGenerationPiepline
+from .default_config import serve_default_config
+from .schema import SchemaCache
+
+
+class GenerationRequestError(Exception):
+    """Raised when a generation request is not valid, keeping the HTTP status of the response.
+    """
+
+    def __init__(self, status: int, message: str
+                 ) -> None:
+        self.status = status
+        super().__init__(message)
+
+
+class GenerationServer:
+    """Long running generation service, keeping warm the state shared among generations: the parsed schemas (see
+    `SchemaCache`), the type matchers (see `TypeMatcher.build`) and the regex samplers (see `RegexSampler.build`).
+
+    The schemas are registered once, and then generated by their id with the given configuration overrides (merged
+    into the configuration of the server), seed and format, streaming the output in batches of batch_size rows.
+
+    Note: the formats outputting a file for each table can not be streamed, so they are not served.
+    """
+
+    def __init__(self, config: Dict[str, Any] = None, default_config: Dict[str, Any] = None, schema_cache: SchemaCache = None, batch_size: int = 10000
+                 ) -> None:
+        self.config = config if config is not None else {}
+        self.default_config = default_config if default_config is not None else serve_default_config()
+        self.schema_cache = schema_cache if schema_cache is not None else SchemaCache()
+        self.batch_size = batch_size
+        self.schemas = {}
+
+    def register_schema(self, dbml: str) -> Tuple[str, List[str]]:
+        """Parses the DBML (if not already parsed), returning its id and the names of its tables.
+        """
+
+        schema_id = self.schema_cache.fingerprint(dbml)
+
+        try:
+            schema = self.schema_cache.load(dbml)
+        except Exception as e:
+            raise GenerationRequestError(status=400, message=str(e))
+
+        self.schemas[schema_id] = dbml
+
+        logger.info(f'registered schema {schema_id}')
+
+        return schema_id, [table.name for table in schema.tables]
+
+    def generate(self, request: Dict[str, Any]
+                 ) -> Iterator[Any]:
+        """Generates the schema of the request with the given `config` overrides, `seed`, `format` (SQL by default),
+        `formatter_config` and `batch_size`, returning an iterator over the formatted chunks.
+
+        The first chunk is generated before returning, so the errors of the configuration are raised here (as a
+        `GenerationRequestError`) instead of while streaming.
+        """
+
+        if not isinstance(request, dict):
+            raise GenerationRequestError(status=400, message='The request must be a JSON object.')
+
+        for key in ['config', 'formatter_config']:
+            if request.get(key) is not None and not isinstance(request[key], dict):
+                raise GenerationRequestError(status=400, message=f'The {key} of the request must be a JSON object.')
+
+        schema_id = request.get('schema_id')
+        dbml = self.schemas.get(schema_id) if isinstance(schema_id, str) else None
+
+        if dbml is None:
+            raise GenerationRequestError(status=404, message=f'The schema {schema_id} is not registered. Please register it first.')
+
+        format_name = request.get('format', 'sql')
+        formatter_type = FormatterType.from_str(format_name) if isinstance(format_name, str) else None
+
+        if formatter_type is None:
+            raise GenerationRequestError(status=400, message=f'The format {format_name} is not recognized. Please select one of {", ".join(e.value for e in FormatterType)}.')
+
+        if DataFormatter.from_type(formatter_type=formatter_type).FILE_PER_DIRECTIVE:
+            raise GenerationRequestError(status=400, message=f'The format {formatter_type.value} outputs a file for each table, so it can not be streamed.')
+
+        try:
+            user_config = ConfigBuilder().merge_config(user_config=request.get('config') or {}, default_config=self.config)
+        except Exception as e:
+            raise GenerationRequestError(status=400, message=f'Unable to merge the configuration of the request: {e}')
+
+        user_config.setdefault('schema', {})
+
+        # each request has its own pipeline (as it keeps the metrics of its generation), sharing the parsed schemas
+        pipeline = DataGenerationPiepline(schema_cache=self.schema_cache)
+
+        chunks = pipeline.iter_generate(
+            dbml=dbml, user_config=user_config, default_config=self.default_config, formatter_type=formatter_type, batch_size=request.get('batch_size', self.batch_size), formatter_config=request.get('formatter_config'), seed=request.get('seed')
+        )
+
+        try:
+            first_chunk = next(chunks, None)
+        except Exception as e:
+            raise GenerationRequestError(status=400, message=str(e))
+
+        def _iter_chunks():
+
+            if first_chunk is not None:
+                yield first_chunk
+
+            yield from chunks
+
+        return _iter_chunks()
+
+    def build_http_server(self, host: str = '127.0.0.1', port: int = 8080, unix_socket: str = None, workers: int = 4
+                          ) -> socketserver.BaseServer:
+        """Builds the HTTP server (listening in the host and port, or in the unix socket if given), handling the
+        requests in a pool of workers threads.
+        """
+
+        if unix_socket is not None:
+
+            if not hasattr(socketserver, 'UnixStreamServer'):
+                raise ValueError('The unix sockets are not available in this platform. Please serve in a host and port.')
+
+            if os.path.exists(unix_socket):
+                os.remove(unix_socket)
+
+            server = _UnixGenerationHTTPServer(unix_socket, _GenerationRequestHandler, workers=workers)
+
+        else:
+            server = _GenerationHTTPServer((host, port), _GenerationRequestHandler, workers=workers)
+
+        server.generation_server = self
+
+        return server
+
+    def serve(self, host: str = '127.0.0.1', port: int = 8080, unix_socket: str = None, workers: int = 4) -> None:
+
+        server = self.build_http_server(host=host, port=port, unix_socket=unix_socket, workers=workers)
+
+        logger.info(f'serving at {unix_socket if unix_socket is not None else f"http://{host}:{server.server_address[1]}"} with {workers} workers')
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+class _PooledMixIn(socketserver.ThreadingMixIn):
+    """Handles the requests in a bounded pool of threads (instead of a thread for each request).
+    """
+
+    def __init__(self, *args, workers: int = 4, **kwargs) -> None:
+
+        if workers <= 0:
+            raise ValueError(f'The number of workers must be a positive number, but {workers} was given.')
+
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        super().__init__(*args, **kwargs)
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+class _GenerationHTTPServer(_PooledMixIn, HTTPServer):
+    pass
+
+
+if hasattr(socketserver, 'UnixStreamServer'):  # not available in Windows
+
+    class _UnixGenerationHTTPServer(_PooledMixIn, socketserver.UnixStreamServer):
+        pass
+
+
+class _GenerationRequestHandler(BaseHTTPRequestHandler):
+    """Handles the requests of the generation server:
+
+        - `POST /schemas` with the DBML as body, responding the id of the schema and its tables.
+        - `GET /schemas`, responding the ids of the registered schemas.
+        - `POST /generate` with the generation request as JSON body (see `GenerationServer.generate`), streaming the
+          output with chunked transfer encoding.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'fakedatagen'
+
+    # seconds waiting for the client, so idle clients do not hold the workers
+    timeout = 60
+
+    def address_string(self) -> str:
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.info(f'{self.address_string()} {format % args}')
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _send_json(self, status: int, content: Dict[str, Any]) -> None:
+
+        body = json.dumps(content).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, chunk: bytes) -> None:
+        self.wfile.write(f'{len(chunk):X}\r\n'.encode('ascii') + chunk + b'\r\n')
+
+    def do_GET(self) -> None:
+
+        self.close_connection = True
+
+        if self.path == '/schemas':
+            self._send_json(200, {'schemas': list(self.server.generation_server.schemas)})
+        else:
+            self._send_json(404, {'error': f'Unknown path {self.path}.'})
+
+    def do_POST(self) -> None:
+
+        self.close_connection = True
+        generation_server = self.server.generation_server
+
+        try:
+
+            if self.path == '/schemas':
+                schema_id, tables = generation_server.register_schema(self._read_body().decode('utf-8'))
+                self._send_json(201, {'schema_id': schema_id, 'tables': tables})
+                return
+
+            if self.path != '/generate':
+                self._send_json(404, {'error': f'Unknown path {self.path}.'})
+                return
+
+            try:
+                request = json.loads(self._read_body())
+            except ValueError:
+                raise GenerationRequestError(status=400, message='Unable to parse the request JSON body.')
+
+            chunks = generation_server.generate(request)
+
+        except GenerationRequestError as e:
+            self._send_json(e.status, {'error': str(e)})
+            return
+
+        except Exception as e:
+            logger.error(f'unable to handle the request: {e}')
+            self._send_json(500, {'error': 'Unable to handle the request.'})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        # once streaming, the errors can only be notified closing the connection without the last chunk
+        try:
+            for chunk in chunks:
+                if chunk:
+                    self._send_chunk(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        except Exception as e:
+            logger.error(f'generation failed while streaming: {e}')
+            return
+
+        self.wfile.write(b'0\r\n\r\n')
@@ -54,6 +54,7 @@ setup(
     python_requires='>=3',
     extras_require={
         "tests": requirements(filename='tests/requirements.txt'),
+        "arrow": ['pyarrow'],
     },
     keywords=', '.join([
         'DBML', 'Data generation'
@@ -4,9 +4,76 @@
 # Author: Francisco Pinto Santos (@GandalFran on GitHub)
 
 
+import csv
+import io
+import json
 import os
+import pstats
+import re
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
-from fake_db_datagen import DataGenerationPipelineFromFiles
+import numpy as np
+from fake_db_datagen import DataGenerationPiepline, DataGenerationPipelineFromFiles
+from fake_db_datagen.artifact_store import ArtifactStore
+from fake_db_datagen.config_builder import ConfigurationError, TypeMatcher
+from fake_db_datagen.dag import CycleError, DependencyGraph
+from fake_db_datagen.data_formatter import BinaryCopyDataFormatter
+from fake_db_datagen.data_types_generator import DataType, DataTypeGenerator
+from fake_db_datagen.database_sink import DatabaseSink
+from fake_db_datagen.default_config import serve_default_config
+from fake_db_datagen.distribution import DistributionGenerator
+from fake_db_datagen.metrics import Measurement
+from fake_db_datagen.output_cache import OutputCache
+from fake_db_datagen.profiler import GenerationProfiler
+from fake_db_datagen.regex_sampler import RegexSampler
+from fake_db_datagen.schema import Schema, SchemaCache
+from fake_db_datagen.server import GenerationServer
+
+
+def _count_rows(data):
+    return len([line for line in data.split('\n') if line.startswith('\t')])
+
+
+def _headers(data):
+    return [line for line in data.split('\n') if line.startswith('INSERT INTO')]
+
+
+def _parse_copy_binary(data):
+
+    assert(data.startswith(b'PGCOPY\n\xff\r\n\x00'))
+
+    rows = []
+    position = 19
+
+    while True:
+
+        num_fields, = struct.unpack('>h', data[position:position + 2])
+        position += 2
+
+        if num_fields == -1:
+            break
+
+        row = []
+
+        for _ in range(num_fields):
+            length, = struct.unpack('>i', data[position:position + 4])
+            row.append(data[position + 4:position + 4 + length] if length >= 0 else None)
+            position += 4 + max(length, 0)
+
+        rows.append(row)
+
+    assert(position == len(data))
+
+    return rows
 
 
 def test_generation():
@@ -23,6 +90,992 @@ def test_generation():
     )
 
 
+def test_batch_generation():
+
+    # base generation_info
+    dbml_file = 'db.md'
+    config_file = 'config.json'
+    format_type = 'sql'
+
+    # generate data at once and in batches
+    generator = DataGenerationPipelineFromFiles()
+    generated_data = generator.generate(
+        dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type
+    )
+    generated_chunks = generator.iter_generate(
+        dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type, batch_size=7
+    )
+    batched_generated_data = ''.join(generated_chunks)
+
+    # check both have the same tables and rows
+    assert(_headers(generated_data) == _headers(batched_generated_data))
+    assert(_count_rows(generated_data) == _count_rows(batched_generated_data))
+
+
+def test_rows_per_insert():
+
+    dbml = 'Table numeros {\n  numero int [pk]\n  nombre varchar\n}'
+
+    generator = DataGenerationPiepline()
+    num_rows = _count_rows(generator.generate(dbml=dbml, user_config={'schema': {}}, seed=42))
+
+    for rows_per_insert in [1, 3, 4, num_rows, 1000]:
+
+        # generate at once and in batches (the statements continue across the batches)
+        generated_data = generator.generate(
+            dbml=dbml, user_config={'schema': {}}, formatter_config={'rows_per_insert': rows_per_insert}, seed=42
+        )
+        batch_generated_data = ''.join(generator.iter_generate(
+            dbml=dbml, user_config={'schema': {}}, formatter_config={'rows_per_insert': rows_per_insert}, batch_size=4, seed=42
+        ))
+
+        assert(generated_data == batch_generated_data)
+
+        # check each statement has rows_per_insert rows (the last one the remaining ones) separated by commas
+        assert(generated_data.endswith(';'))
+        statements = generated_data[:-1].split(';\n')
+        num_statements = -(-num_rows // rows_per_insert)
+
+        assert(len(statements) == num_statements)
+        assert([_count_rows(statement) for statement in statements] == [rows_per_insert] * (num_statements - 1) + [num_rows - rows_per_insert * (num_statements - 1)])
+
+        for statement in statements:
+            header, *rows = statement.split('\n\t')
+            assert(header == 'INSERT INTO numeros(numero,nombre) VALUES ')
+            assert(rows[0].startswith('(') and all(row.startswith(',(') for row in rows[1:]))
+
+
+def test_parallel_generation():
+
+    # base generation_info
+    dbml_file = 'db.md'
+    config_file = 'config.json'
+    format_type = 'sql'
+
+    # generate data serially and in parallel
+    generator = DataGenerationPipelineFromFiles()
+    generated_data = generator.generate(
+        dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type
+    )
+    parallel_generated_data = generator.generate(
+        dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type, workers=2, shard_size=1000
+    )
+
+    # check both have the same tables and rows
+    assert(_headers(generated_data) == _headers(parallel_generated_data))
+    assert(_count_rows(generated_data) == _count_rows(parallel_generated_data))
+
+    # check the options which would be ignored are rejected: the batches are not generated in parallel, and the
+    # shards are only generated in parallel
+    for options in [{'batch_size': 7, 'workers': 2}, {'shard_size': 1000}, {'shard_size': 1000, 'workers': 1}]:
+        try:
+            generator.generate_to(
+                fp=io.StringIO(), dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type, **options
+            )
+            assert(False)
+        except ValueError:
+            pass
+
+
+def test_seeded_generation():
+
+    # base generation_info
+    dbml_file = 'db.md'
+    config_file = 'config.json'
+    format_type = 'sql'
+
+    # generate data with the same seed serially, in parallel and in batches
+    generator = DataGenerationPipelineFromFiles()
+    generated_data = generator.generate(
+        dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type, seed=42
+    )
+    parallel_generated_data = generator.generate(
+        dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type, workers=2, shard_size=1000, seed=42
+    )
+    batch_generated_data = ''.join(generator.iter_generate(
+        dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type, batch_size=7, seed=42
+    ))
+    other_seed_generated_data = generator.generate(
+        dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type, seed=43
+    )
+
+    # check the same data is generated with the same seed
+    assert(generated_data == parallel_generated_data)
+    assert(generated_data == batch_generated_data)
+    assert(generated_data != other_seed_generated_data)
+
+
+def test_sampled_dependencies():
+
+    # base generation_info
+    with open('db.md') as f:
+        dbml = f.read()
+
+    with open('config.json') as f:
+        user_config = json.load(f)
+
+    # sample the references of a table instead of crossing them
+    user_config['schema']['registros'] = {
+        'paciente': {'sampling': {'fan_out': 2}}, 'tipo_registro': {'sampling': {}}, 'responsable': {'sampling': {}}
+    }
+
+    generator = DataGenerationPiepline()
+    directives, _ = generator._build(
+        dbml=dbml, user_config=user_config, default_config=None, formatter_type='sql', seed=42
+    )
+    generator._generate_directives(
+        directives=directives
+    )
+
+    # check the number of rows is given by the fan out, and the sampled values are referenced ones
+    directives = {directive.name: directive for directive in directives}
+    registros = directives['registros'].fetch()
+    pacientes = directives['pacientes'].fetch()
+
+    assert(len(registros['paciente']) == 2 * len(pacientes['id']))
+    assert(set(registros['paciente'].tolist()) <= set(pacientes['id'].tolist()))
+    assert(set(registros['responsable'].tolist()) <= set(directives['usuarios'].fetch()['id'].tolist()))
+
+    # sample the references with a given distribution and number of rows
+    user_config['schema']['registros'] = {
+        'paciente': {'sampling': {'rows': 5000, 'distribution': {'type': 'zipf', 'config': {'a': 2}}}}, 'tipo_registro': {'sampling': {}}, 'responsable': {'sampling': {}}
+    }
+
+    directives, _ = generator._build(
+        dbml=dbml, user_config=user_config, default_config=None, formatter_type='sql', seed=42
+    )
+    generator._generate_directives(
+        directives=directives
+    )
+
+    # check the number of rows is the given one, and the first referenced value is the most frequent one
+    directives = {directive.name: directive for directive in directives}
+    registros = directives['registros'].fetch()
+    pacientes = directives['pacientes'].fetch()
+
+    pacientes_ids, pacientes_counts = np.unique(registros['paciente'], return_counts=True)
+
+    assert(len(registros['paciente']) == 5000)
+    assert(pacientes_ids[np.argmax(pacientes_counts)] == pacientes['id'][0])
+
+    # check sampling rows referencing a table without rows is rejected, naming the referencing field
+    dbml = 'Table a {\n  id int [pk]\n}\n\nTable b {\n  a_id int [ref: > a.id]\n  valor float\n}'
+    user_config = {'schema': {'a': {'id': {'type': 'int', 'samples': 0}}, 'b': {'a_id': {'sampling': {'rows': 3}}}}}
+
+    try:
+        generator.generate(dbml=dbml, user_config=user_config)
+        assert(False)
+    except ConfigurationError as e:
+        assert(e.config_path == ['b', 'a_id', 'sampling'])
+
+    # check sampling a field which does not reference other table is rejected instead of ignored
+    user_config = {'schema': {'b': {'valor': {'type': 'float', 'sampling': {'rows': 3}}}}}
+
+    try:
+        generator.generate(dbml=dbml, user_config=user_config)
+        assert(False)
+    except ConfigurationError as e:
+        assert(e.config_path == ['schema', 'b', 'valor', 'sampling'])
+
+
+def test_copy_generation():
+
+    # base generation_info
+    dbml_file = 'db.md'
+    config_file = 'config.json'
+
+    # generate data as INSERT statements and in the PostgreSQL COPY text format
+    generator = DataGenerationPipelineFromFiles()
+    generated_data = generator.generate(
+        dbml_file_path=dbml_file, config_file_path=config_file, formatter_type='sql', seed=42
+    )
+    copy_data = generator.generate(
+        dbml_file_path=dbml_file, config_file_path=config_file, formatter_type='copy', seed=42
+    )
+
+    # check both have the same tables and rows
+    copy_lines = copy_data.split('\n')
+    copy_headers = [line for line in copy_lines if line.startswith('COPY ')]
+    copy_rows = [line for line in copy_lines if line and not line.startswith('COPY ') and line != '\\.']
+
+    assert([re.sub(r'INSERT INTO (\w+)\((.*)\) VALUES ', r'COPY \1 (\2) FROM STDIN;', header) for header in dict.fromkeys(_headers(generated_data))] == copy_headers)
+    assert(len(copy_rows) == _count_rows(generated_data))
+
+    # generate data in the PostgreSQL COPY binary format, whose values are encoded as the types of the DBML
+    dbml = """
+        Table clientes {
+          numero int [pk]
+          nombre varchar(50)
+          altura float
+          activo boolean
+          alta datetime
+        }
+
+        Table pedidos {
+          numero int [pk]
+          cliente int [ref: > clientes.numero]
+        }
+    """
+
+    with tempfile.TemporaryDirectory() as output_dir:
+
+        generator = DataGenerationPiepline()
+        paths = generator.generate_to_directory(
+            directory=output_dir, dbml=dbml, user_config={'schema': {}}, formatter_type='copy_binary', seed=42
+        )
+        copy_data = generator.generate(
+            dbml=dbml, user_config={'schema': {}}, formatter_type='copy', seed=42
+        )
+
+        assert([os.path.basename(path) for path in paths] == ['clientes.bin', 'pedidos.bin'])
+
+        with open(paths[0], 'rb') as f:
+            binary_rows = _parse_copy_binary(f.read())
+
+    text_rows = [line.split('\t') for line in copy_data.split('\n')[1:len(binary_rows) + 1]]
+
+    for binary_row, text_row in zip(binary_rows, text_rows):
+        assert(struct.unpack('>i', binary_row[0])[0] == int(text_row[0]))
+        assert(binary_row[1].decode('utf-8') == text_row[1])
+        assert(struct.unpack('>d', binary_row[2])[0] == float(text_row[2]))
+        assert(binary_row[3] == (b'\x01' if text_row[3] == 't' else b'\x00'))
+
+    # check the values out of the range of the types are rejected instead of wrapped
+    formatter = BinaryCopyDataFormatter()
+
+    for column in [np.array([1, 10 ** 10]), np.array(['1', '7419444497'], dtype=object)]:
+        try:
+            formatter._format_rows(table_name='clientes', data={'numero': column}, column_types={'numero': 'int'})
+            assert(False)
+        except ValueError as e:
+            assert('clientes.numero' in str(e) and 'out of the range' in str(e))
+
+    # check the test DBML is written in the binary format with the same rows and integers of the text format
+    with open(dbml_file) as f:
+        schema = Schema.from_str(f.read())
+
+    copy_data = DataGenerationPipelineFromFiles().generate(
+        dbml_file_path=dbml_file, config_file_path=config_file, formatter_type='copy', seed=42
+    )
+    text_tables = {}
+
+    for block in copy_data.split('\\.\n'):
+        lines = [line for line in block.split('\n') if line]
+        if lines:
+            text_tables[lines[0].split(' ')[1]] = [dict(zip(lines[0].split('(')[1].split(')')[0].split(','), line.split('\t'))) for line in lines[1:]]
+
+    with tempfile.TemporaryDirectory() as output_dir:
+
+        paths = DataGenerationPipelineFromFiles().generate_to_directory(
+            directory=output_dir, dbml_file_path=dbml_file, config_file_path=config_file, formatter_type='copy_binary', seed=42
+        )
+
+        for path in paths:
+
+            table = next(table for table in schema.tables if table.name == os.path.splitext(os.path.basename(path))[0])
+
+            with open(path, 'rb') as f:
+                binary_rows = _parse_copy_binary(f.read())
+
+            text_rows = text_tables[table.name]
+
+            assert(len(binary_rows) == len(text_rows))
+
+            for binary_row, text_row in zip(binary_rows, text_rows):
+                for i, column in enumerate(table.columns):
+                    if column.type == 'int' and text_row[column.name] != '\\N':
+                        assert(struct.unpack('>i', binary_row[i])[0] == int(text_row[column.name]))
+
+
+def test_csv_generation():
+
+    # base generation_info
+    dbml_file = 'db.md'
+    config_file = 'config.json'
+
+    generator = DataGenerationPipelineFromFiles()
+    copy_data = generator.generate(
+        dbml_file_path=dbml_file, config_file_path=config_file, formatter_type='copy', seed=42
+    )
+
+    with tempfile.TemporaryDirectory() as output_dir:
+
+        # generate data as CSV and TSV files
+        csv_paths = generator.generate_to_directory(
+            directory=output_dir, dbml_file_path=dbml_file, config_file_path=config_file, formatter_type='csv', seed=42
+        )
+        tsv_paths = generator.generate_to_directory(
+            directory=output_dir, dbml_file_path=dbml_file, config_file_path=config_file, formatter_type='tsv', batch_size=7, seed=42
+        )
+
+        csv_tables = []
+        for path in csv_paths:
+            with open(path, newline='') as f:
+                csv_tables.append(list(csv.reader(f)))
+
+        tsv_tables = []
+        for path in tsv_paths:
+            with open(path, newline='') as f:
+                tsv_tables.append(list(csv.reader(f, dialect='excel-tab')))
+
+    # check both have the same tables, columns and rows as the COPY output
+    copy_lines = copy_data.split('\n')
+    copy_headers = [line for line in copy_lines if line.startswith('COPY ')]
+    copy_rows = [line for line in copy_lines if line and not line.startswith('COPY ') and line != '\\.']
+
+    assert([f'COPY {os.path.basename(path)[:-4]} ({",".join(table[0])}) FROM STDIN;' for path, table in zip(csv_paths, csv_tables)] == copy_headers)
+    assert(sum(len(table) - 1 for table in csv_tables) == len(copy_rows))
+    assert(csv_tables == tsv_tables)
+
+
+def test_columnar_generation():
+
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        # the columnar formats are optional
+        return
+
+    # base generation_info
+    dbml_file = 'db.md'
+    config_file = 'config.json'
+
+    generator = DataGenerationPipelineFromFiles()
+    copy_data = generator.generate(
+        dbml_file_path=dbml_file, config_file_path=config_file, formatter_type='copy', seed=42
+    )
+
+    with tempfile.TemporaryDirectory() as output_dir:
+
+        # generate data at once as parquet and in batches as arrow
+        parquet_paths = generator.generate_to_directory(
+            directory=output_dir, dbml_file_path=dbml_file, config_file_path=config_file, formatter_type='parquet', seed=42
+        )
+        arrow_paths = generator.generate_to_directory(
+            directory=output_dir, dbml_file_path=dbml_file, config_file_path=config_file, formatter_type='arrow', batch_size=7, seed=42
+        )
+
+        # check both have the same tables and rows as the COPY output
+        copy_lines = copy_data.split('\n')
+        copy_rows = [line for line in copy_lines if line and not line.startswith('COPY ') and line != '\\.']
+
+        parquet_tables = [pyarrow.parquet.read_table(path) for path in parquet_paths]
+        arrow_tables = [pyarrow.ipc.open_file(path).read_all() for path in arrow_paths]
+
+        assert([os.path.basename(path).rsplit('.', 1)[0] for path in parquet_paths] == [line.split(' ')[1] for line in copy_lines if line.startswith('COPY ')])
+        assert(sum(table.num_rows for table in parquet_tables) == len(copy_rows))
+        assert(all(parquet_table.equals(arrow_table) for parquet_table, arrow_table in zip(parquet_tables, arrow_tables)))
+
+
+def test_database_generation():
+
+    # base generation_info
+    dbml_file = 'db.md'
+    config_file = 'config.json'
+
+    with open(dbml_file) as f:
+        schema = Schema.from_str(f.read())
+
+    generator = DataGenerationPipelineFromFiles()
+    copy_data = generator.generate(
+        dbml_file_path=dbml_file, config_file_path=config_file, formatter_type='copy', seed=42
+    )
+
+    for batch_size in [None, 7]:
+
+        with tempfile.TemporaryDirectory() as database_dir:
+
+            # create the tables and insert the data with several connections
+            database_path = os.path.join(database_dir, 'test.db')
+
+            with sqlite3.connect(database_path) as connection:
+                for table in schema.tables:
+                    connection.execute(f'CREATE TABLE {table.name} ({",".join(column.name for column in table.columns)})')
+
+            sink = DatabaseSink(connection_factory=lambda: sqlite3.connect(database_path, timeout=60), workers=3)
+            inserted_rows = generator.generate_to_database(
+                sink=sink, dbml_file_path=dbml_file, config_file_path=config_file, batch_size=batch_size, seed=42
+            )
+
+            connection = sqlite3.connect(database_path)
+            stored_rows = {table.name: connection.execute(f'SELECT COUNT(*) FROM {table.name}').fetchone()[0] for table in schema.tables}
+            connection.close()
+
+        # check the inserted rows are the ones of the COPY output
+        copy_rows = {}
+        for block in copy_data.split('\\.\n'):
+            lines = [line for line in block.split('\n') if line]
+            if lines:
+                copy_rows[lines[0].split(' ')[1]] = len(lines) - 1
+
+        assert(inserted_rows == stored_rows == copy_rows)
+
+
+def test_database_levels():
+
+    # a chain of references, and an independent table inserted in parallel with the first one
+    dbml = """
+        Table paises {
+          id int [pk]
+          nombre varchar
+        }
+
+        Table ciudades {
+          id int [pk]
+          pais int [ref: > paises.id]
+        }
+
+        Table personas {
+          id int [pk]
+          ciudad int [ref: > ciudades.id]
+        }
+
+        Table monedas {
+          id int [pk]
+          nombre varchar
+        }
+    """
+
+    with tempfile.TemporaryDirectory() as database_dir:
+
+        database_path = os.path.join(database_dir, 'test.db')
+
+        # the referencing tables can only be inserted once the referenced ones are committed
+        with sqlite3.connect(database_path) as connection:
+
+            for table in Schema.from_str(dbml).tables:
+                connection.execute(f'CREATE TABLE {table.name} ({",".join(column.name for column in table.columns)})')
+
+            for table, referenced in [('ciudades', 'paises'), ('personas', 'ciudades')]:
+                connection.execute(f"CREATE TRIGGER check_{table} BEFORE INSERT ON {table} WHEN (SELECT COUNT(*) FROM {referenced}) = 0 BEGIN SELECT RAISE(ABORT, '{referenced} not inserted'); END")
+
+        sink = DatabaseSink(connection_factory=lambda: sqlite3.connect(database_path, timeout=60), workers=3)
+        inserted_rows = DataGenerationPiepline().generate_to_database(sink=sink, dbml=dbml, user_config={'schema': {}}, seed=42)
+
+        with sqlite3.connect(database_path) as connection:
+            assert(inserted_rows == {table: connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in inserted_rows})
+            assert(all(num_rows > 0 for num_rows in inserted_rows.values()))
+
+            # a failing level stops the insertion of the next ones
+            for table in inserted_rows:
+                connection.execute(f'DELETE FROM {table}')
+
+            connection.execute('DROP TABLE ciudades')
+
+        try:
+            DataGenerationPiepline().generate_to_database(sink=sink, dbml=dbml, user_config={'schema': {}}, seed=42)
+            assert(False)
+        except Exception as e:
+            assert('ciudades' in str(e) and e.__cause__ is not None)
+
+        with sqlite3.connect(database_path) as connection:
+            counts = {table: connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in ['paises', 'personas', 'monedas']}
+
+        assert(counts['paises'] > 0 and counts['monedas'] > 0 and counts['personas'] == 0)
+
+
+def test_generation_metrics():
+
+    # base generation_info
+    dbml_file = 'db.md'
+    config_file = 'config.json'
+    format_type = 'sql'
+
+    with open(dbml_file) as f:
+        schema = Schema.from_str(f.read())
+
+    tables = [table.name for table in schema.tables]
+
+    for workers, batch_size in [(None, None), (2, None), (None, 7)]:
+
+        measurements = []
+        generator = DataGenerationPipelineFromFiles(hooks=[measurements.append])
+
+        if batch_size is None:
+            generated_data = generator.generate(
+                dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type, workers=workers, shard_size=1000 if workers is not None else None, seed=42
+            )
+        else:
+            chunks = generator.iter_generate(
+                dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type, batch_size=batch_size, seed=42
+            )
+            generated_data = next(chunks)
+
+            # check the hooks received the measurements of the first batches while the generation goes on
+            assert(any(measurement.scope == Measurement.DIRECTIVE for measurement in measurements))
+
+            generated_data += ''.join(chunks)
+
+        metrics = generator.metrics.to_dict()
+
+        # check there are metrics of each stage, table and field, and the hooks received them
+        assert(set(['parse', 'config', 'directives']) <= set(metrics['stages']))
+        assert(sorted(metrics['directives']) == sorted(tables))
+        assert(all(field.split('.')[0] in tables for field in metrics['fields']))
+        assert(set(measurement.name for measurement in measurements) == set(metrics['stages']) | set(metrics['directives']) | set(metrics['fields']))
+
+        # check the hooks received the measurements of the directives (of each batch or shard) as they were recorded,
+        # before the stages generating them finished
+        directive_measurements = [measurement for measurement in measurements if measurement.scope == Measurement.DIRECTIVE]
+        assert(sum(measurement.rows for measurement in directive_measurements) == _count_rows(generated_data))
+
+        if batch_size is None:
+            assert(measurements.index(directive_measurements[-1]) < [measurement.name for measurement in measurements].index('generate'))
+        assert(all(measurement.peak_memory is None or measurement.peak_memory >= 0 for measurement in measurements))
+
+        # check the rows of the directives are the generated ones
+        assert(sum(directive['rows'] for directive in metrics['directives'].values()) == _count_rows(generated_data))
+        assert(all(measurement['wall_time'] >= 0 and measurement['cpu_time'] >= 0 for measurement in metrics['fields'].values()))
+
+        if batch_size is None:
+            assert(metrics['stages']['generate']['rows'] == metrics['stages']['format']['rows'] == _count_rows(generated_data))
+
+
+def test_generation_profiler():
+
+    # base generation_info
+    dbml_file = 'db.md'
+    config_file = 'config.json'
+    format_type = 'sql'
+
+    # profile a generation
+    profiler = GenerationProfiler()
+    generator = DataGenerationPipelineFromFiles()
+
+    with profiler.profiling():
+        generator.generate(
+            dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type, seed=42
+        )
+
+    # check the package functions are named by their qualified names, including the nested ones
+    breakdown = profiler.breakdown()
+    cumulative = profiler.cumulative()
+
+    assert('SQLDataFormatter.format' in cumulative)
+    assert('DataGenerationPiepline.generate' in cumulative)
+    assert(any(name.startswith('SQLDataFormatter._format_rows.<locals>.') for name in breakdown))
+    assert(list(breakdown.values()) == sorted(breakdown.values(), reverse=True))
+    assert('Own time by component:' in profiler.report())
+
+    # check the profile is written as a pstats file
+    with tempfile.TemporaryDirectory() as profile_dir:
+        profile_path = os.path.join(profile_dir, 'profile.pstats')
+        profiler.dump(profile_path)
+        assert(pstats.Stats(profile_path).total_tt > 0)
+
+
+def test_generation_server():
+
+    # base generation_info
+    dbml_file = 'db.md'
+    config_file = 'config.json'
+
+    with open(dbml_file) as f:
+        dbml = f.read()
+
+    with open(config_file) as f:
+        config = json.load(f)
+
+    # serve in a random port
+    server = GenerationServer(config=config, batch_size=7).build_http_server(port=0, workers=2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    def _post(path, body):
+        with urllib.request.urlopen(urllib.request.Request(url + path, data=body, method='POST')) as response:
+            return response.read().decode('utf-8')
+
+    def _post_error(path, body):
+        try:
+            _post(path, body)
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    try:
+
+        # register the schema
+        schema_id = json.loads(_post('/schemas', dbml.encode('utf-8')))['schema_id']
+        assert(schema_id == SchemaCache.fingerprint(dbml))
+
+        # generate concurrently, checking the output is the one of the pipeline with the same seed and batches
+        request = json.dumps({'schema_id': schema_id, 'seed': 42, 'format': 'copy'}).encode('utf-8')
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            outputs = list(executor.map(lambda _: _post('/generate', request), range(3)))
+
+        expected_output = ''.join(DataGenerationPipelineFromFiles().iter_generate(
+            dbml_file_path=dbml_file, config_file_path=config_file, formatter_type='copy', batch_size=7, seed=42
+        ))
+
+        assert(outputs == [expected_output] * 3)
+
+        # check the invalid requests are rejected
+        assert(_post_error('/generate', json.dumps({'schema_id': 'unknown'}).encode('utf-8')) == 404)
+        assert(_post_error('/generate', json.dumps({'schema_id': schema_id, 'format': 'parquet'}).encode('utf-8')) == 400)
+        assert(_post_error('/generate', json.dumps({'schema_id': schema_id, 'config': {'schema': {'unknown': {}}}}).encode('utf-8')) == 400)
+        assert(_post_error('/schemas', b'Table {') == 400)
+
+        for body in [[], 'text', {'schema_id': schema_id, 'config': []}, {'schema_id': schema_id, 'config': {'data_types': 'text'}}, {'schema_id': schema_id, 'formatter_config': 5}, {'schema_id': schema_id, 'format': 5}, {'schema_id': [schema_id]}]:
+            assert(_post_error('/generate', json.dumps(body).encode('utf-8')) in (400, 404))
+
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_generation_server_isolation():
+
+    # two schemas, the second one with an enumeration matching the field of the first one
+    dbml = 'Table persona {\n  id int [pk]\n  estado_civil varchar\n}'
+    enum_dbml = 'Enum estado {\n  activo\n  inactivo\n}\n\nTable cuenta {\n  id int [pk]\n  estado estado\n}'
+
+    server = GenerationServer()
+    schema_id, _ = server.register_schema(dbml)
+    enum_schema_id, _ = server.register_schema(enum_dbml)
+
+    def _generate(request_schema_id):
+        return ''.join(server.generate({'schema_id': request_schema_id, 'seed': 1}))
+
+    # check the enumerations of a request do not leak into the configuration of the next ones
+    output = _generate(schema_id)
+    enum_output = _generate(enum_schema_id)
+
+    assert('activo' in enum_output)
+    assert(_generate(schema_id) == output)
+    assert('activo' not in output)
+
+
+def test_directive_columns():
+
+    dbml = """
+        Table clientes {
+          id int [pk]
+          nombre varchar
+        }
+
+        Table pedidos {
+          cliente int [ref: > clientes.id]
+          importe float
+        }
+    """
+
+    generator = DataGenerationPiepline()
+    directives, _ = generator._build(
+        dbml=dbml, user_config={'schema': {}}, default_config=None, formatter_type='sql', seed=42
+    )
+    clientes, pedidos = sorted(directives, key=lambda directive: directive.index)
+
+    # check the data is kept as a column for each field, each one fetched directly
+    data = clientes.fetch()
+
+    assert(set(data) == {'id', 'nombre'})
+    assert(all(isinstance(column, np.ndarray) and len(column) == clientes.num_samples for column in data.values()))
+    assert(clientes.fetch_field('id') is data['id'])
+
+    # check the referencing rows are the referenced values crossed with the samples of each one
+    pedidos_data = pedidos.fetch()
+    num_clientes = len(data['id'])
+
+    assert(set(pedidos_data) == {'cliente', 'importe'})
+    assert(len(pedidos_data['cliente']) == len(pedidos_data['importe']) == pedidos.num_samples * num_clientes)
+    assert(set(pedidos_data['cliente'].tolist()) <= set(data['id'].tolist()))
+
+    try:
+        clientes.fetch_field('unknown')
+        assert(False)
+    except ValueError:
+        pass
+
+    # check the batches of the referenced directive are the fetched data, and only the referenced field is retained
+    for directive in directives:
+        directive.reset()
+
+    batches = list(clientes.iter_batches(batch_size=3))
+
+    assert(all(len(batch['id']) <= 3 for batch in batches))
+    assert(np.array_equal(np.concatenate([batch['id'] for batch in batches]), data['id']))
+    assert(clientes._generated_data is None and set(clientes._retained_data) == {'id'})
+
+    # check the referencing directive is generated against the retained field, without generating the referenced again
+    assert(clientes.fetch_field('id') is clientes._retained_data['id'])
+    assert(all(np.array_equal(column, pedidos_data[field]) for field, column in pedidos.fetch().items()))
+    assert(clientes._generated_data is None)
+
+
+def test_output_cache():
+
+    # base generation_info
+    dbml_file = 'db.md'
+    config_file = 'config.json'
+    format_type = 'sql'
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+
+        # generate data twice with the same seed, the second one from the cache
+        generator = DataGenerationPipelineFromFiles(cache=OutputCache(directory=cache_dir))
+        generated_data = generator.generate(
+            dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type, seed=42
+        )
+        cached_data = generator.generate(
+            dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type, seed=42
+        )
+
+        cached_stream = io.StringIO()
+        generator.generate_to(
+            fp=cached_stream, dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type, seed=42
+        )
+
+        # check the cached output is the generated one, and that the unseeded generations are not cached
+        assert(cached_data == generated_data)
+        assert(cached_stream.getvalue() == generated_data)
+        assert(len(os.listdir(cache_dir)) == 1)
+
+        _ = generator.generate(
+            dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type
+        )
+        assert(len(os.listdir(cache_dir)) == 1)
+
+        # check the least recently used outputs are evicted when the cache is full
+        generator = DataGenerationPipelineFromFiles(cache=OutputCache(directory=cache_dir, max_size=1))
+        _ = generator.generate(
+            dbml_file_path=dbml_file, config_file_path=config_file, formatter_type=format_type, seed=43
+        )
+        assert(len(os.listdir(cache_dir)) == 1)
+
+
+def test_incremental_generation():
+
+    # base generation_info
+    with open('db.md') as f:
+        dbml = f.read()
+
+    with open('config.json') as f:
+        user_config = json.load(f)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+
+        # generate data storing the artifacts of each table
+        generator = DataGenerationPiepline(artifact_store=ArtifactStore(directory=work_dir))
+        generated_data = generator.generate(
+            dbml=dbml, user_config=user_config, formatter_type='sql', seed=42
+        )
+        artifacts = set(os.listdir(work_dir))
+
+        # check the artifacts are reused if nothing changed
+        regenerated_data = generator.generate(
+            dbml=dbml, user_config=user_config, formatter_type='sql', seed=42
+        )
+
+        assert(regenerated_data == generated_data)
+        assert(set(os.listdir(work_dir)) == artifacts)
+
+        # change a table, and check only it and the tables depending on it (even through one to one references) are
+        # generated again
+        user_config['schema']['usuarios'] = {'codigo': {'type': 'nss'}}
+
+        regenerated_data = generator.generate(
+            dbml=dbml, user_config=user_config, formatter_type='sql', seed=42
+        )
+        changed_tables = {artifact.rsplit('-', 1)[0] for artifact in set(os.listdir(work_dir)) - artifacts}
+
+        assert(changed_tables == {'usuarios', 'pacientes', 'registros', 'seguimiento', 'formulario', 'estudios'})
+        assert(regenerated_data == DataGenerationPiepline().generate(dbml=dbml, user_config=user_config, formatter_type='sql', seed=42))
+
+        # check the data generated in batches is not stored, so it is rejected
+        try:
+            generator.generate_to(fp=io.StringIO(), dbml=dbml, user_config=user_config, formatter_type='sql', batch_size=7, seed=42)
+            assert(False)
+        except ValueError:
+            pass
+
+    # remove only the artifact of a referenced table of an unseeded generation, and check the tables referencing it
+    # are generated again (instead of reloading references to the values no longer generated)
+    dbml = """
+        Table clientes {
+          codigo varchar [pk]
+        }
+
+        Table pedidos {
+          cliente varchar [ref: > clientes.codigo]
+          importe float
+        }
+    """
+
+    with tempfile.TemporaryDirectory() as work_dir:
+
+        generator = DataGenerationPiepline(artifact_store=ArtifactStore(directory=work_dir))
+
+        for remove_artifact in [False, True]:
+
+            if remove_artifact:
+                os.remove(next(os.path.join(work_dir, artifact) for artifact in os.listdir(work_dir) if artifact.startswith('clientes-')))
+
+            directives, _ = generator._build(dbml=dbml, user_config={'schema': {}}, default_config=None, formatter_type='sql')
+            generator._generate_directives(directives=directives)
+
+            clientes, pedidos = sorted(directives, key=lambda directive: directive.index)
+
+            assert(set(pedidos.fetch_field('cliente').tolist()) <= set(clientes.fetch_field('codigo').tolist()))
+
+
+def test_schema_cache():
+
+    # base generation_info
+    with open('db.md') as f:
+        dbml = f.read()
+
+    with open('config.json') as f:
+        user_config = json.load(f)
+
+    with tempfile.TemporaryDirectory() as schema_cache_dir:
+
+        # generate data storing the parsed DBML
+        generator = DataGenerationPiepline(schema_cache=SchemaCache(directory=schema_cache_dir))
+        generated_data = generator.generate(
+            dbml=dbml, user_config=user_config, formatter_type='sql', seed=42
+        )
+
+        assert(len(os.listdir(schema_cache_dir)) == 1)
+
+        # check the stored schema is the parsed one, and that it is reused by other pipelines
+        schema = Schema.from_str(dbml)
+        stored_schema = SchemaCache(directory=schema_cache_dir).load(dbml)
+
+        assert(stored_schema.to_dict() == schema.to_dict())
+        assert([table.name for table in schema.tables] == [table.name for table in stored_schema.tables])
+
+        generator = DataGenerationPiepline(schema_cache=SchemaCache(directory=schema_cache_dir))
+        regenerated_data = generator.generate(
+            dbml=dbml, user_config=user_config, formatter_type='sql', seed=42
+        )
+
+        assert(regenerated_data == generated_data)
+        assert(len(os.listdir(schema_cache_dir)) == 1)
+
+
+def test_dependency_graph():
+
+    # check the nodes are grouped in levels after the nodes they depend on, even in deep chains
+    graph = DependencyGraph({'d': ['c'], 'c': ['b', 'a'], 'b': ['a'], 'a': [], 'e': []})
+
+    assert(graph.levels() == [['a', 'e'], ['b'], ['c'], ['d']])
+    assert(graph.sequence() == ['a', 'e', 'b', 'c', 'd'])
+
+    # check the cycles are reported
+    graph = DependencyGraph({'a': [], 'b': ['a', 'd'], 'c': ['b'], 'd': ['c']})
+
+    try:
+        graph.levels()
+        assert(False)
+    except CycleError as e:
+        assert(e.cycle == ['b', 'd', 'c', 'b'])
+
+
+def test_type_matcher():
+
+    type_configs = {
+        'code': {'pattern': '.*code.*'}, 'zip_code': {'pattern': '.*zip.*', 'priority': 10}, 'name': {'pattern': 'name', 'priority': 5}
+    }
+    type_matcher = TypeMatcher(type_configs)
+
+    # check the type with more priority matching the field name or type (or named as them) is found
+    assert(type_matcher.match(field_name='zip_code', field_type='varchar') == 'zip_code')
+    assert(type_matcher.match(field_name='country_code', field_type='varchar') == 'code')
+    assert(type_matcher.match(field_name='other', field_type='code') == 'code')
+    assert(type_matcher.match(field_name='other', field_type='varchar') is None)
+
+    # check the memoized results are the same
+    assert(type_matcher.match(field_name='country_code', field_type='varchar') == 'code')
+
+
+def test_data_types_generator():
+
+    # check each base type is generated as a typed array within its bounds
+    start_date, end_date = np.datetime64('2020-01-01T00:00:00', 'us'), np.datetime64('2021-01-01T00:00:00', 'us')
+    base_types = [
+        (DataType.int_, 0, 10, np.int64, 0, 10),
+        (DataType.float_, 0.5, 2.5, np.float64, 0.5, 2.5),
+        (DataType.boolean_, 0, 1, np.bool_, False, True),
+        (DataType.datetime_, '2020-01-01T00:00:00', '2021-01-01T00:00:00', np.dtype('datetime64[us]'), start_date, end_date),
+    ]
+
+    for data_type, start, end, dtype, min_value, max_value in base_types:
+        for seed_sequence in [None, np.random.SeedSequence(42)]:
+
+            generator = DataTypeGenerator.build(data_type=data_type, start=start, end=end, seed_sequence=seed_sequence)
+
+            for num_samples in [0, 1, 1000]:
+
+                values = generator.generate(num_samples)
+
+                assert(isinstance(values, np.ndarray) and values.dtype == dtype and values.shape == (num_samples,))
+                assert(num_samples == 0 or (values.min() >= min_value and values.max() <= max_value))
+
+            # check the rows of the seeded generators do not depend on how the generation is split
+            if seed_sequence is not None:
+                values = generator.generate(20000)
+                ranges = [generator.generate_range(start=offset, stop=min(offset + 3000, 20000), num_rows=20000) for offset in range(0, 20000, 3000)]
+                assert(np.array_equal(values, np.concatenate(ranges)))
+
+    # the timezone aware datetimes are kept as datetime objects
+    values = DataTypeGenerator.build(data_type=DataType.datetime_, start='2020-01-01T00:00:00+02:00', end='2021-01-01T00:00:00+02:00').generate(100)
+    assert(values.dtype == object and all(value.utcoffset() == timedelta(hours=2) for value in values))
+
+    # the collections and generables are generated as arrays of their values
+    values = DataTypeGenerator.build(data_type=DataType.collection, collection_values=['a', 'b', 'c']).generate(100)
+    assert(values.shape == (100,) and set(values.tolist()) <= {'a', 'b', 'c'})
+
+    values = DataTypeGenerator.build(data_type=DataType.generable, generable_expression='[0-9]{4}').generate(100)
+    assert(values.dtype.kind == 'U' and values.shape == (100,) and all(re.fullmatch('[0-9]{4}', value) for value in values.tolist()))
+
+    # the list based scaling is kept
+    scaled = DistributionGenerator.default().scale([0.0, 5.0, 10.0], dest_start=0, dest_end=1)
+    assert(scaled == [0.0, 0.5, 1.0])
+
+
+def test_regex_sampler():
+
+    # check the generated values of each default generable match its expression
+    generables = serve_default_config()['data_types']['generables']
+
+    for generable in generables.values():
+
+        expression = generable['generator']
+
+        for sampler in [RegexSampler(expression), RegexSampler.build(expression)]:
+
+            values = sampler.sample(num_samples=1000)
+
+            assert(len(values) == 1000)
+            assert(all(re.fullmatch(expression, value) for value in values.tolist()))
+
+    # check the repeats over the limit of * and + are generated with their minimum count
+    for expression in ['[a-f]{150}', '[a-f]{120,130}', '(ab){150}', 'x{150,}']:
+
+        values = RegexSampler.build(expression).sample(num_samples=100)
+
+        assert(all(re.fullmatch(expression, value) for value in values.tolist()))
+
+
+def test_lazy_imports():
+
+    # check the command line interface and the package are imported without the generation modules
+    code = 'import sys; import fake_db_datagen.cli; print(",".join(m for m in ["numpy", "pydbml", "fake_db_datagen.data_generation_pipeline"] if m in sys.modules))'
+    assert(subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout.strip() == '')
+
+    # check the schema cache hits do not import the DBML parser
+    with open('db.md') as f:
+        dbml = f.read()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+
+        SchemaCache(directory=cache_dir).load(dbml)
+
+        code = f'import sys; from fake_db_datagen.schema import SchemaCache; SchemaCache(directory={cache_dir!r}).load(open("db.md").read()); print("pydbml" in sys.modules)'
+        assert(subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout.strip() == 'False')
+
+
 def test_command_cli():
 
     # base generation_info
@@ -53,4 +1106,27 @@ def test_command_cli():
 if __name__ == '__main__':
 
     test_generation()
+    test_batch_generation()
+    test_rows_per_insert()
+    test_parallel_generation()
+    test_seeded_generation()
+    test_sampled_dependencies()
+    test_copy_generation()
+    test_csv_generation()
+    test_columnar_generation()
+    test_database_generation()
+    test_database_levels()
+    test_generation_metrics()
+    test_generation_profiler()
+    test_generation_server()
+    test_generation_server_isolation()
+    test_directive_columns()
+    test_output_cache()
+    test_incremental_generation()
+    test_schema_cache()
+    test_dependency_graph()
+    test_type_matcher()
+    test_data_types_generator()
+    test_regex_sampler()
+    test_lazy_imports()
     test_command_cli()